@@ -17,11 +17,29 @@ from bpy.path import display_name_from_filepath
 from bpy.types import Operator, OperatorFileListElement, AddonPreferences, PropertyGroup, Panel
 from bpy.props import StringProperty, BoolProperty, IntProperty, CollectionProperty, EnumProperty, PointerProperty, FloatProperty
 from bpy_extras.io_utils import ImportHelper, ExportHelper
+from bpy.app.handlers import persistent
+from mathutils import Matrix, Quaternion, Vector
 
+import functools
+import numpy as np
 import os
 import subprocess
+import time
 import re
 
+from . import actions
+from . import cache
+from . import collada
+from . import converter
+from . import curves
+from . import datablocks
+from . import dds
+from . import granny
+from . import images
+from . import mesh_builder
+from . import skeletons
+from . import texture_index
+
 class DivinityImporterAddonPreferences(AddonPreferences):
     bl_idname = "io_scene_gr2"
     divine_path : StringProperty(
@@ -33,7 +51,71 @@ class DivinityImporterAddonPreferences(AddonPreferences):
     extracted_assets_dir : StringProperty(
         name="Shared Assets",
         description="The path to extracted assets from Shared.pak. This should be Public/Shared/Assets.\nThis is used to automatically fetch conforming skeletons",
-        subtype="DIR_PATH"
+        subtype="DIR_PATH",
+        update=lambda self, context: update_extracted_assets_dir(self, context)
+    )
+
+    conversion_workers : IntProperty(
+        name="Conversion Processes",
+        description="How many divine.exe conversions may run at the same time when importing several gr2 files",
+        default=max(1, min(8, (os.cpu_count() or 2) // 2)),
+        min=1,
+        max=64
+    )
+
+    staging_mode : EnumProperty(
+        name="Temp Files",
+        description="Where intermediate dae files are written while converting",
+        items=(
+            ("TEMP", "Temporary Folder", "A private temp folder, on a RAM disk (/dev/shm) where available"),
+            ("SOURCE", "Next to Source", "Write <name>-temp.dae next to the gr2 file. Dae files that are kept after the import are always written there"),
+            ("CUSTOM", "Custom Folder", "A private folder inside the staging directory below")
+        ),
+        default="TEMP"
+    )
+
+    staging_dir : StringProperty(
+        name="Staging Directory",
+        description="Folder used for intermediate files when 'Temp Files' is set to Custom Folder",
+        subtype="DIR_PATH",
+        default=""
+    )
+
+    texture_loading : EnumProperty(
+        name="Textures",
+        description="How .dds textures are loaded when building materials",
+        items=(
+            ("BLENDER", "Blender", "Load textures with Blender's image loader"),
+            ("DECODE", "Decode", "Decode textures on background threads. The images keep their .dds path, the blend file links the .dds files when saved"),
+            ("PREVIEW", "Preview", "Decode the half-size mip level of each texture, for faster, lower quality previews")
+        ),
+        default="BLENDER"
+    )
+
+    use_batch_conversion : BoolProperty(
+        name="Batch Conversion",
+        description="When importing several gr2 files, convert them with one divine.exe process per batch instead of one process per file",
+        default=True
+    )
+
+    use_conversion_cache : BoolProperty(
+        name="Cache Conversions",
+        description="Keep converted dae files in a cache and reuse them when the same gr2 file is imported again with the same options",
+        default=True
+    )
+
+    conversion_cache_dir : StringProperty(
+        name="Cache Directory",
+        description="Where cached conversions are stored. Defaults to a folder in the system temp directory",
+        subtype="DIR_PATH",
+        default=""
+    )
+
+    conversion_cache_size : IntProperty(
+        name="Cache Size (MB)",
+        description="Least recently used conversions are removed once the cache grows past this size",
+        default=512,
+        min=1
     )
 
     def draw(self, context):
@@ -45,47 +127,124 @@ class DivinityImporterAddonPreferences(AddonPreferences):
         row.prop(self, "divine_path")
         row = box.row()
         row.prop(self, "extracted_assets_dir")
+        row = box.row()
+        row.prop(self, "conversion_workers")
+        row = box.row()
+        row.prop(self, "use_batch_conversion")
+        row = box.row()
+        row.prop(self, "texture_loading")
+        row = box.row()
+        row.prop(self, "staging_mode")
+        if self.staging_mode == "CUSTOM":
+            row = box.row()
+            row.prop(self, "staging_dir")
+
+        box = layout.box()
+        row = box.row()
+        row.label(text="Conversion Cache:", icon="FILE_CACHE")
+        row = box.row()
+        row.prop(self, "use_conversion_cache")
+        if self.use_conversion_cache:
+            row = box.row()
+            row.prop(self, "conversion_cache_dir")
+            row = box.row()
+            row.prop(self, "conversion_cache_size")
+            row = box.row()
+            if cache.conversion_cache is not None:
+                row.label(text="Hits: {}  Misses: {}".format(cache.conversion_cache.hits, cache.conversion_cache.misses))
+            row.operator(DOS2DEImporter_OT_clear_conversion_cache.bl_idname, icon="TRASH")
+
+def get_preferences(context):
+    if "io_scene_gr2" in context.preferences.addons:
+        return context.preferences.addons["io_scene_gr2"].preferences
+    return None
+
+def get_conversion_cache(context):
+    preferences = get_preferences(context)
+    if preferences is None or not preferences.use_conversion_cache:
+        return None
+    return cache.get_cache(preferences.conversion_cache_dir, preferences.conversion_cache_size)
+
+def release_conversion_cache():
+    # Pins of jobs that never reached finish_granny_conversion, after an error
+    if cache.conversion_cache is not None:
+        cache.conversion_cache.release_all()
+
+converter_backend = None
+
+def get_converter_backend(context):
+    global converter_backend
+    if converter_backend is None:
+        converter_backend = converter.SubprocessBackend()
+    return converter_backend
+
+staging_area = None
+
+def get_staging_area(context):
+    global staging_area
+    preferences = get_preferences(context)
+    mode = preferences.staging_mode if preferences is not None else "TEMP"
+    if mode == "SOURCE":
+        return None
+    root = converter.default_staging_root()
+    if mode == "CUSTOM" and preferences.staging_dir != "":
+        root = os.path.abspath(bpy.path.abspath(preferences.staging_dir))
+    if staging_area is None or staging_area.root != root:
+        if staging_area is not None:
+            staging_area.cleanup()
+        staging_area = converter.StagingArea(root)
+    return staging_area
+
+def cleanup_staging_area():
+    global staging_area
+    if staging_area is not None:
+        staging_area.cleanup()
+        staging_area = None
+
+def close_converter_backend():
+    global converter_backend
+    if converter_backend is not None:
+        converter_backend.close()
+        converter_backend = None
+
+class DOS2DEImporter_OT_clear_conversion_cache(Operator):
+    """Delete all cached gr2 conversions"""
+    bl_idname = "dos2deimporter.op_clear_conversion_cache"
+    bl_label = "Clear Cache"
+
+    def execute(self, context):
+        preferences = get_preferences(context)
+        if preferences is not None:
+            cache.get_cache(preferences.conversion_cache_dir, preferences.conversion_cache_size).clear()
+        return {'FINISHED'}
 
 
 base_skeleton_directories = ["Dwarves", "Elves", "Humans", "Lizards"]
-base_skeleton_dict = {}
+skeleton_catalog = skeletons.SkeletonCatalog(base_skeleton_directories)
+
+def get_assets_dir(context):
+    preferences = get_preferences(context)
+    if preferences is not None and "extracted_assets_dir" in preferences:
+        return preferences.extracted_assets_dir
+    return ""
+
+def get_skeleton_catalog(context, wait=False):
+    assets_dir = get_assets_dir(context)
+    if skeleton_catalog.assets_dir != assets_dir:
+        skeleton_catalog.refresh(assets_dir, background=not wait)
+    if wait:
+        skeleton_catalog.wait()
+    return skeleton_catalog
 
 def get_base_skeletons(scene, context):
-    assets_dir = ""
-    if "io_scene_gr2" in context.preferences.addons:
-        preferences = context.preferences.addons["io_scene_gr2"].preferences
-        if preferences is not None:
-            if "extracted_assets_dir" in preferences:
-                assets_dir = preferences.extracted_assets_dir
-    
     skeletons = [("DISABLED", "Disabled", "")]
     skeletons.append(("AUTO", "Auto", "Auto-select a base skeleton to conform to, based on the file name.\nThis happens when importing, to support multiple imports"))
-
-    if assets_dir != "" and os.path.isdir(assets_dir):
-        characters_dir = os.path.join(assets_dir, "Characters")
-        if os.path.isdir(characters_dir):
-            for race in base_skeleton_directories:
-                race_dir = os.path.join(characters_dir, race)
-                if os.path.isdir(race_dir):
-                    base_skeleton_f = os.path.join(race_dir, race + "_Female_Base.gr2")
-                    base_skeleton_m = os.path.join(race_dir, race + "_Male_Base.gr2")
-
-                    global base_skeleton_dict
-
-                    if os.path.isfile(base_skeleton_f):
-                        key = race + "_Female"
-                        display = race + " Female"
-                        skeletons.append((key, display, base_skeleton_f))
-                        base_skeleton_dict[key] = (base_skeleton_f, race, "Female")
-
-                    if os.path.isfile(base_skeleton_m):
-                        key = race + "_Male"
-                        display = race + " Male"
-                        skeletons.append((key, display, base_skeleton_m))
-                        base_skeleton_dict[key] = (base_skeleton_m, race, "Male")
-
+    skeletons.extend(get_skeleton_catalog(context).items)
     return skeletons
 
+def update_extracted_assets_dir(self, context):
+    skeleton_catalog.refresh(self.extracted_assets_dir)
+
 rename_race_patterns = [
     ("Dwarves_Female", "DF"), 
     ("Dwarves_Male", "DM"),
@@ -103,12 +262,6 @@ rename_patterns = [
 
 hero_pattern = re.compile(r'.*(Dwarves|Elves|Humans|Lizards)_(Male|Female)')
 
-texture_pattern_basecolor = "{}.*?_(BM|BMA).dds"
-texture_pattern_mskcloth = "{}.*?_(MSKcloth).dds"
-texture_pattern_mskskin = "{}.*?_(MSKskin).dds"
-texture_pattern_normalmap = "{}.*?_(NM).dds"
-texture_pattern_physical = "{}.*?_(PM).dds"
-
 class DOS2_Material_Textures():
     def __init__(self, bm=None, nm=None, pm=None):
         self.basecolor = bm
@@ -125,23 +278,11 @@ def get_textures(obj, filename, context, assets_dir):
         racegender = "{}_{}".format(race, gender)
         textures_dir = os.path.join(assets_dir, "Textures/Characters/{}/{}".format(race, racegender))
         if os.path.isdir(textures_dir):
-            bm_pattern = re.compile(texture_pattern_basecolor.format(filename))
-            nm_pattern = re.compile(texture_pattern_normalmap.format(filename))
-            pm_pattern = re.compile(texture_pattern_physical.format(filename))
-            files = list([f for f in os.listdir(textures_dir) if f.endswith(".dds")])
-            basemap_texture = next(iter([f for f in files if bm_pattern.match(f)]), None)
-            normalmap_texture = next(iter([f for f in files if nm_pattern.match(f)]), None)
-            physicalmap_texture = next(iter([f for f in files if pm_pattern.match(f)]), None)
-            if basemap_texture != None:
-                basemap_texture = os.path.join(textures_dir, basemap_texture)
-            if normalmap_texture != None:
-                normalmap_texture = os.path.join(textures_dir, normalmap_texture)
-            if physicalmap_texture != None:
-                physicalmap_texture = os.path.join(textures_dir, physicalmap_texture)
+            index = texture_index.directory_index
             textures = DOS2_Material_Textures(
-                bm=basemap_texture, 
-                nm=normalmap_texture, 
-                pm=physicalmap_texture
+                bm=index.find(textures_dir, filename, "BM"),
+                nm=index.find(textures_dir, filename, "NM"),
+                pm=index.find(textures_dir, filename, "PM")
             )
     else:
         textures = DOS2_Material_Textures()
@@ -240,23 +381,90 @@ def arrange_nodes(node_array, calc_priority, horiz_padding=0.125, vert_padding=0
             half_h = 0.5 * node.height
             node.location.xy = (x - half_w, y - half_h)
 
+image_index = images.ImageIndex(bpy.path.abspath)
+image_preloader = None
+
+# Blender's own loader reads the files itself, only decoding is worth doing ahead of time
+texture_loaders = {
+    "DECODE": dds.load,
+    "PREVIEW": functools.partial(dds.load, level=1),
+}
+
+def get_texture_loading(context):
+    preferences = get_preferences(context)
+    return preferences.texture_loading if preferences is not None else "BLENDER"
+
+def get_image_preloader(context):
+    """Preloader for the texture loading mode, None when textures are loaded by Blender"""
+    global image_preloader
+    mode = get_texture_loading(context)
+    if mode not in texture_loaders:
+        close_image_preloader()
+        return None
+    if image_preloader is None or image_preloader[0] != mode:
+        close_image_preloader()
+        image_preloader = (mode, images.ImagePreloader(max(1, min(4, os.cpu_count() or 1)), texture_loaders[mode]))
+    return image_preloader[1]
+
+def close_image_preloader():
+    global image_preloader
+    if image_preloader is not None:
+        image_preloader[1].shutdown()
+        image_preloader = None
+
+def preload_textures(context, filepaths, **args):
+    """Start reading the textures of the given model files before their materials are built"""
+    if not args["use_build_material"]:
+        return
+    preloader = get_image_preloader(context)
+    assets_dir = get_assets_dir(context)
+    if preloader is None or assets_dir == "":
+        return
+    texture_paths = []
+    for filepath in filepaths:
+        findname = os.path.splitext(os.path.basename(filepath))[0].replace("-temp", "")
+        textures = get_textures(None, findname, context, assets_dir)
+        if textures is not None:
+            texture_paths.extend(textures.textures)
+    preloader.preload(texture_paths)
+
+def clear_preloaded_textures(context):
+    if image_preloader is not None:
+        image_preloader[1].clear()
+
+# Decoded images are generated images until the blend file is saved, then they switch to their .dds file
+decoded_image_property = "dos2de_decoded"
+
+@persistent
+def link_decoded_images(*args):
+    for img in bpy.data.images:
+        if img.get(decoded_image_property):
+            del img[decoded_image_property]
+            img.source = "FILE"
+
 def get_image(file, context):
     if file != "" and file != None:
-        for img in bpy.data.images:
-            if img.filepath != "" and img.filepath != None:
-                if img.filepath == file:
-                    return img
-                elif bpy.path.basename(img.filepath) == bpy.path.basename(file):
-                    img.filepath = file
-                    return img
-        print("Loading image: " + file)
-        img = bpy.data.images.load(file, check_existing=True)
+        img, exact = image_index.find(bpy.data.images, file)
+        if img is not None:
+            if not exact:
+                image_index.relink(img, file)
+            return img
+        preloader = get_image_preloader(context)
+        preloaded = preloader.take(file) if preloader is not None else None
+        if isinstance(preloaded, dds.DecodedImage):
+            img = bpy.data.images.new(os.path.basename(file), preloaded.width, preloaded.height, alpha=True)
+            img.pixels.foreach_set(preloaded.pixels)
+            img.filepath_raw = file
+            img[decoded_image_property] = True
+        else:
+            print("Loading image: " + file)
+            img = bpy.data.images.load(file, check_existing=True)
+        image_index.loaded(bpy.data.images, img)
         return img
     return None
 
 def get_node_type(nodes, name):
     for x in nodes:
-        print("{} ? {}".format(x.bl_idname, name))
         if name in x.bl_idname:
             return x
     return None
@@ -269,81 +477,96 @@ def offset_node_y(node, bynode, padding=200):
     node.location[1] = (bynode.location[1] - bynode.height) - padding
     node.location[0] = bynode.location[0]
 
+pbr_group_name = "DOS2DE_PBR"
+
+def create_pbr_group():
+    """Shader node group with the PBR setup shared by every DOS2DE material"""
+    group = bpy.data.node_groups.new(pbr_group_name, "ShaderNodeTree")
+    group.inputs.new("NodeSocketColor", "BaseColor")
+    group.inputs.new("NodeSocketColor", "PhysicalMap")
+    group.inputs.new("NodeSocketColor", "NormalMap")
+    group.inputs.new("NodeSocketFloat", "NormalMap Alpha")
+    group.outputs.new("NodeSocketShader", "BSDF")
+    nodes = group.nodes
+    links = group.links
+
+    inputs = nodes.new("NodeGroupInput")
+    inputs.location = (10,0)
+    shader = nodes.new("ShaderNodeBsdfPrincipled")
+
+    pmsep_node = nodes.new("ShaderNodeSeparateXYZ")
+    offset_node_x(pmsep_node, inputs)
+    links.new(inputs.outputs["PhysicalMap"], pmsep_node.inputs[0])
+    links.new(pmsep_node.outputs[0], shader.inputs["Metallic"])
+    links.new(pmsep_node.outputs[1], shader.inputs["Roughness"])
+
+    sep_node = nodes.new("ShaderNodeSeparateXYZ")
+    offset_node_y(sep_node, pmsep_node)
+    invert_node = nodes.new("ShaderNodeInvert")
+    offset_node_x(invert_node, sep_node)
+    combine_node = nodes.new("ShaderNodeCombineXYZ")
+    offset_node_x(combine_node, invert_node)
+    vector_node = nodes.new("ShaderNodeNormalMap")
+    offset_node_x(vector_node, combine_node)
+    links.new(inputs.outputs["NormalMap"], sep_node.inputs[0])
+    links.new(inputs.outputs["NormalMap Alpha"], combine_node.inputs[0]) # Alpha to Red Channel
+    links.new(sep_node.outputs[1], invert_node.inputs[1]) # Invert Green for OpenGL
+    links.new(sep_node.outputs[2], combine_node.inputs[2]) # Blue to Blue Channel
+    links.new(invert_node.outputs[0], combine_node.inputs[1]) # Inverted Green to Green Channel
+    links.new(combine_node.outputs[0], vector_node.inputs[1]) # Combined XYZ to Normal Map
+    links.new(vector_node.outputs[0], shader.inputs["Normal"])
+
+    links.new(inputs.outputs["BaseColor"], shader.inputs["Base Color"])
+    offset_node_x(shader, vector_node)
+    shader.location[1] = inputs.location[1]
+
+    output = nodes.new("NodeGroupOutput")
+    offset_node_x(output, shader)
+    links.new(shader.outputs[0], output.inputs["BSDF"])
+    return group
+
+def get_pbr_group():
+    group = bpy.data.node_groups.get(pbr_group_name)
+    if group is None or group.bl_idname != "ShaderNodeTree":
+        group = create_pbr_group()
+    return group
+
+def set_non_color(image):
+    if image is not None and image.colorspace_settings.name != "Non-Color":
+        image.colorspace_settings.name = "Non-Color"
+
 def create_dos2de_nodes(mat, context, textures=None):
     nodes = mat.node_tree.nodes
     links = mat.node_tree.links
 
     diffuse = get_node_type(nodes, "ShaderNodeBsdfDiffuse")
     if diffuse is not None:
-        #diffuse = nodes.new("ShaderNodeBsdfDiffuse")
         nodes.remove(diffuse)
-    shader = nodes.new("ShaderNodeBsdfPrincipled")
-    #diffuse.location = (50,0)
-
-    bm_input = 0
-    nm_input = 17
-    metal_input = 4
-    roughness_input = 7
-
-    index = 0
-    for inputnode in shader.inputs:
-        if inputnode.name == "Normal":
-            nm_input = index
-        elif inputnode.name == "Roughness":
-            roughness_input = index
-        elif inputnode.name == "Metalness":
-            metal_input = index
-        elif inputnode.name == "Base Color":
-            bm_input = index
-        index = index + 1
 
     bm_node = nodes.new("ShaderNodeTexImage")
     bm_node.location = (10,0)
     bm_node.label = "BaseColor"
-    if textures != None:
-        bm_tex = get_image(textures.basecolor, context)
-        bm_node.image = bm_tex
-    links.new(bm_node.outputs[0], shader.inputs[bm_input])
-
     pm_node = nodes.new("ShaderNodeTexImage")
     offset_node_y(pm_node, bm_node)
     pm_node.label = "PhysicalMap"
-    if textures != None:
-        pm_tex = get_image(textures.physicalmap, context)
-        pm_node.image = pm_tex
-    pm_node.color_space = "NONE"
-    pmsep_node = nodes.new("ShaderNodeSeparateXYZ")
-    offset_node_x(pmsep_node, pm_node)
-    links.new(pm_node.outputs[0], pmsep_node.inputs[0])
-    links.new(pmsep_node.outputs[0], shader.inputs[metal_input])
-    links.new(pmsep_node.outputs[1], shader.inputs[roughness_input])
-
     nm_node = nodes.new("ShaderNodeTexImage")
     offset_node_y(nm_node, pm_node)
     nm_node.label = "NormalMap"
     if textures != None:
-        nm_tex = get_image(textures.normalmap, context)
-        nm_node.image = nm_tex
-    nm_node.color_space = "NONE"
-
-    sep_node = nodes.new("ShaderNodeSeparateXYZ")
-    offset_node_x(sep_node, nm_node)
-    invert_node = nodes.new("ShaderNodeInvert")
-    offset_node_x(invert_node, sep_node)
-    combine_node = nodes.new("ShaderNodeCombineXYZ")
-    offset_node_x(combine_node, invert_node)
-    vector_node = nodes.new("ShaderNodeNormalMap")
-    offset_node_x(vector_node, combine_node)
-    links.new(nm_node.outputs[0], sep_node.inputs[0])
-    links.new(nm_node.outputs[1], combine_node.inputs[0]) # Alpha to Red Channel
-    links.new(sep_node.outputs[1], invert_node.inputs[1]) # Invert Green for OpenGL
-    links.new(sep_node.outputs[2], combine_node.inputs[2]) # Blue to Blue Channel
-    links.new(invert_node.outputs[0], combine_node.inputs[1]) # Inverted Green to Green Channel
-    links.new(combine_node.outputs[0], vector_node.inputs[0]) # Combined XYZ to Normal Map
-    links.new(vector_node.outputs[0], shader.inputs[nm_input])
-
-    offset_node_x(shader, vector_node)
-    shader.location[1] = bm_node.location[1]
+        bm_node.image = get_image(textures.basecolor, context)
+        pm_node.image = get_image(textures.physicalmap, context)
+        nm_node.image = get_image(textures.normalmap, context)
+        set_non_color(pm_node.image)
+        set_non_color(nm_node.image)
+
+    shader = nodes.new("ShaderNodeGroup")
+    shader.node_tree = get_pbr_group()
+    shader.label = "DOS2DE PBR"
+    offset_node_x(shader, bm_node, 150)
+    links.new(bm_node.outputs[0], shader.inputs["BaseColor"])
+    links.new(pm_node.outputs[0], shader.inputs["PhysicalMap"])
+    links.new(nm_node.outputs[0], shader.inputs["NormalMap"])
+    links.new(nm_node.outputs[1], shader.inputs["NormalMap Alpha"])
 
     output = get_node_type(nodes, "ShaderNodeOutputMaterial")
     if output is None:
@@ -351,19 +574,36 @@ def create_dos2de_nodes(mat, context, textures=None):
     offset_node_x(output, shader)
     links.new(shader.outputs[0], output.inputs[0])
 
-def create_material(mat_name, obj, file, context, assets_dir):
-    textures = get_textures(obj, file, context, assets_dir)
-    if textures != None:
-        mat = bpy.data.materials.new(mat_name)
+def assign_material(obj, mat):
+    if obj.data.users > 1:
+        # Shared mesh data, each object keeps its own material in an object linked slot
+        if len(obj.material_slots) == 0:
+            obj.data.materials.append(None)
+        slot = obj.material_slots[0]
+        slot.link = "OBJECT"
+        slot.material = mat
+    else:
         obj.data.materials.append(mat)
-        mat.use_nodes = True
-        create_dos2de_nodes(mat, context, textures)
 
-            #arrange_nodes(nodes, calc_priority_by_socket)
+def create_material(mat_name, obj, file, context, assets_dir, textures=None):
+    if textures is None:
+        textures = get_textures(obj, file, context, assets_dir)
+    if textures != None:
+        index = get_material_index()
+        key = datablocks.texture_key(textures, file)
+        mat = index.get(key)
+        if mat is None:
+            mat = bpy.data.materials.new(mat_name)
+            mat.use_nodes = True
+            # Only the output is kept from the default node tree
+            for node in list(mat.node_tree.nodes):
+                if node.bl_idname != "ShaderNodeOutputMaterial":
+                    mat.node_tree.nodes.remove(node)
+            create_dos2de_nodes(mat, context, textures)
+            index.add(key, mat)
+        assign_material(obj, mat)
         return True
-    #except Exception as e:
-    #    print("[DOS2DE-Importer:create_material] Error creating material for '{}':\n    {}".format(obj.name, e))
-    #    return False
+    return False
 
 class DOS2DE_IMPORTER_OT_nodes_create_material(Operator):
     """Insert a basic PBR node setup for DOS2DE textures"""
@@ -444,6 +684,16 @@ class DOS2DEImporterSettings(PropertyGroup):
 		description="Apply all object transformations on imported objects. Useful if the model is y-up, which comes with a X 90 rotation",
 		default=True)
 			
+    mesh_deduplicate : BoolProperty(
+		name="Share Identical Meshes",
+		description="Link new objects to an existing mesh with the same vertices, faces and UVs instead of keeping a duplicate. Materials of shared meshes are set on the object",
+		default=False)
+
+    mesh_deduplicate_saved : BoolProperty(
+		name="Include Saved Meshes",
+		description="Also share meshes created by earlier imports in this .blend file, not only the ones imported together",
+		default=False)
+
     delete_objects : EnumProperty(
 		name="Delete",
 		description="Delete imported objects of type",
@@ -522,6 +772,16 @@ class DOS2DEImporterSettings(PropertyGroup):
 		description="Store Bindpose information in custom bone properties for later use during Collada export",
 		default=True)
 
+    skin_normalize_weights : BoolProperty(
+		name="Normalize Weights",
+		description="Scale the bone weights of each vertex to add up to 1",
+		default=True)
+
+    skin_limit_influences : BoolProperty(
+		name="Limit to 4 Influences",
+		description="Keep only the four largest bone weights of each vertex",
+		default=False)
+
     # Animation Options
     action_autorename : BoolProperty(
 		name="Rename Imported Actions",
@@ -554,7 +814,51 @@ class DOS2DEImporterSettings(PropertyGroup):
 		description="Clean channels along with keyframes",
 		default=False)
 
+    action_resample_enabled : BoolProperty(
+		name="Resample",
+		description="Replace the keyframes of imported actions with linear keyframes at a fixed frame step",
+		default=False)
+
+    action_resample_step : FloatProperty(
+		name="Step",
+		description="Frames between resampled keyframes",
+        min=0.01,
+		default=1.0)
+
+    action_animation_only : BoolProperty(
+		name="Animation Only",
+		description="Read only the skeleton and animations, without building meshes. For GR2 files read natively, actions go to the active armature when its bones match the animation, otherwise to a new armature",
+		default=False)
+
+    action_library_mode : BoolProperty(
+		name="Animation Library",
+		description="Bind the actions of all files imported together to one shared armature per skeleton, stacked as NLA strips. Files are read as animation only",
+		default=False)
+
+    dae_native_reader : BoolProperty(
+		name="Streaming DAE Reader",
+		description="Read .dae files, and the ones divine.exe converts GR2 files to, with the built-in streaming reader instead of Blender's Collada importer. Blender's importer is still used when Fix Leaf Bones, Auto Connect, Find Bone Chains or Import Units is enabled",
+		default=True)
+
     # GR2 Options
+    gr2_native_reader : BoolProperty(
+		name="Native Reader",
+		description="Read GR2 files with uncompressed sections directly, without converting them to dae with divine.exe",
+		default=True)
+
+    gr2_log_level : EnumProperty(
+		name="Converter Log",
+		description="How much divine.exe logs while converting. Output is streamed, only the last lines are kept for error reports",
+		items=(
+			("all", "All", ""),
+			("debug", "Debug", ""),
+			("info", "Info", ""),
+			("warn", "Warnings", ""),
+			("error", "Errors", ""),
+			("off", "Off", "")
+		),
+		default="all")
+
     gr2_delete_dae : BoolProperty(
 		name="Delete DAE",
 		description="When importing from gr2, delete the temporary .dae file that gets created",
@@ -590,6 +894,8 @@ class DOS2DEImporterSettings(PropertyGroup):
         keywords["filter_search"] = self.filter_search
         keywords["apply_transformation"] = self.apply_transformation
         keywords["delete_objects"] = self.delete_objects
+        keywords["mesh_deduplicate"] = self.mesh_deduplicate
+        keywords["mesh_deduplicate_saved"] = self.mesh_deduplicate_saved
         keywords["rename_armatures"] = self.rename_armatures
         keywords["rename_meshes"] = self.rename_meshes
         keywords["use_rename_junk"] = self.use_rename_junk
@@ -600,9 +906,14 @@ class DOS2DEImporterSettings(PropertyGroup):
         keywords["fix_orientation"] = self.fix_orientation
         keywords["import_units"] = self.import_units
         keywords["keep_bind_info"] = self.keep_bind_info
+        keywords["skin_normalize_weights"] = self.skin_normalize_weights
+        keywords["skin_limit_influences"] = self.skin_limit_influences
         keywords["action_autorename"] = self.action_autorename
         keywords["action_set_fake_user"] = self.action_set_fake_user
         keywords["action_offset_zero"] = self.action_offset_zero
+        keywords["dae_native_reader"] = self.dae_native_reader
+        keywords["gr2_native_reader"] = self.gr2_native_reader
+        keywords["gr2_log_level"] = self.gr2_log_level
         keywords["gr2_delete_dae"] = self.gr2_delete_dae
         keywords["gr2_conform_enabled"] = self.gr2_conform_enabled
         keywords["gr2_set_skeleton"] = self.gr2_set_skeleton
@@ -612,6 +923,10 @@ class DOS2DEImporterSettings(PropertyGroup):
         keywords["action_clean_enabled"] = self.action_clean_enabled
         keywords["action_clean_threshold"] = self.action_clean_threshold
         keywords["action_clean_channels"] = self.action_clean_channels
+        keywords["action_resample_enabled"] = self.action_resample_enabled
+        keywords["action_resample_step"] = self.action_resample_step
+        keywords["action_animation_only"] = self.action_animation_only
+        keywords["action_library_mode"] = self.action_library_mode
         #keywords["conform_path_changed"] = "conform_path_changed" in self
         return keywords
 
@@ -626,6 +941,11 @@ class DOS2DEImporterSettings(PropertyGroup):
         row = box.row()
         row.prop(self, "delete_objects")
         row = box.row()
+        row.prop(self, "mesh_deduplicate")
+        if self.mesh_deduplicate:
+            row = box.row()
+            row.prop(self, "mesh_deduplicate_saved")
+        row = box.row()
         row.prop(self, "use_build_material")
 
         box = layout.box()
@@ -642,7 +962,13 @@ class DOS2DEImporterSettings(PropertyGroup):
         row = box.row(align=False)
         row.label(text="GR2 Import Options:", icon="MESH_DATA")
         row = box.row()
+        row.prop(self, "dae_native_reader")
+        row = box.row()
+        row.prop(self, "gr2_native_reader")
+        row = box.row()
         row.prop(self, "gr2_delete_dae")
+        row = box.row()
+        row.prop(self, "gr2_log_level")
 
         row = box.row()
         row.prop(self, "gr2_conform_enabled", text="Enable Conforming", toggle=True)
@@ -686,6 +1012,15 @@ class DOS2DEImporterSettings(PropertyGroup):
             row.prop(self, "action_clean_threshold")
             row = box.row()
             row.prop(self, "action_clean_channels")
+        row = box.row()
+        row.prop(self, "action_resample_enabled")
+        if self.action_resample_enabled:
+            row = box.row()
+            row.prop(self, "action_resample_step")
+        row = box.row()
+        row.prop(self, "action_animation_only")
+        row = box.row()
+        row.prop(self, "action_library_mode")
 
         box = layout.box()
         row = box.row(align=False)
@@ -698,6 +1033,10 @@ class DOS2DEImporterSettings(PropertyGroup):
         row.prop(self, "auto_connect")
         row = box.row()
         row.prop(self, "min_chain_length")
+        row = box.row()
+        row.prop(self, "skin_normalize_weights")
+        row = box.row()
+        row.prop(self, "skin_limit_influences")
 
         box = layout.box()
         row = box.row(align=False)
@@ -715,63 +1054,447 @@ class DOS2DEImporterSettings(PropertyGroup):
             row.prop(self, "directory")
 
 
-def transform_apply(self, context, obj, location=False, rotation=False, scale=False, children=False):
-    last_active = getattr(bpy.context.scene.objects, "active", None)
-    recurse_targets = []
-    try:
-        bpy.ops.object.mode_set(mode="OBJECT")
-        bpy.ops.object.select_all(action='DESELECT')
-        bpy.context.scene.objects.active = obj
-        obj.select = True
-        bpy.ops.object.transform_apply(location=location, rotation=rotation, scale=scale)
-
-        if children:
-            for childobj in obj.children:
-                childobj.select = True
-                if childobj.children is not None:
-                    recurse_targets.append(childobj)
-            bpy.ops.object.mode_set(mode="OBJECT")
-            bpy.ops.object.transform_apply(location=location, rotation=rotation, scale=scale)
-            bpy.ops.object.select_all(action='DESELECT')
-        obj.select = False
-    except:
-        pass
-
-    if last_active is not None:
-        bpy.context.scene.objects.active = last_active
-    if len(recurse_targets) > 0:
-        for recobj in recurse_targets:
-            transform_apply(self, context, recobj, location, rotation, scale, children)
+def apply_transforms(objects):
+    """Bake the world matrix of each object into its mesh or armature data and reset its transform"""
+    objects = list(objects)
+    targets = set(obj.as_pointer() for obj in objects)
+    world_matrices = {obj.as_pointer(): obj.matrix_world.copy() for obj in objects}
+
+    def depth(obj):
+        d = 0
+        while obj.parent is not None:
+            obj = obj.parent
+            d += 1
+        return d
+
+    # Parents first, so children are placed relative to the parent's new matrix
+    for obj in sorted(objects, key=depth):
+        matrix = world_matrices[obj.as_pointer()]
+        baked = False
+        data = obj.data
+        if data is not None and obj.type in ("MESH", "ARMATURE"):
+            if data.users == 1:
+                if obj.type == "MESH":
+                    mesh_builder.transform_mesh(data, matrix)
+                else:
+                    data.transform(matrix)
+                baked = True
+            else:
+                print("[DOS2DE-Importer] Skipped applying the transformation of '{}', its data is shared.".format(obj.name))
+        if obj.parent is not None and obj.parent.as_pointer() in targets:
+            obj.matrix_parent_inverse = Matrix.Identity(4)
+        obj.matrix_world = Matrix.Identity(4) if baked else matrix
 
 def can_delete(objtype, delete_objects):
     return (delete_objects == "ALL" or (delete_objects == "ARMATURE" and objtype == "ARMATURE") 
                 or (delete_objects == "MESH" and objtype == "MESH"))
 
-lastNum = re.compile(r'(?:[^\d]*(\d+)[^\d]*)+')
-
-def increment_string(s):
-    m = lastNum.search(s)
-    if m:
-        next = str(int(m.group(1))+1)
-        start, end = m.span(1)
-        s = s[:max(end-len(next), start)] + next + s[end:]
-    else:
-        s = s + "_1"
-    return s
+def armature_hash(armature_obj):
+    return skeletons.skeleton_hash((b.name, b.parent.name if b.parent is not None else None) for b in armature_obj.data.bones)
+
+def granny_skeleton_hash(skeleton):
+    bones = skeleton["Bones"]
+    return skeletons.skeleton_hash((b["Name"], bones[b["ParentIndex"]]["Name"] if b["ParentIndex"] >= 0 else None) for b in bones)
+
+class AnimationLibrary():
+    """Shared armatures of an animation library import, keyed by skeleton hash. Actions are stacked on them as NLA strips"""
+
+    def __init__(self):
+        self.armatures = {}
+
+    def get(self, key):
+        armature_obj = self.armatures.get(key)
+        if armature_obj is not None:
+            try:
+                armature_obj.name
+            except ReferenceError:
+                # Deleted since it was added
+                del self.armatures[key]
+                return None
+        return armature_obj
+
+    def bind(self, armature_obj, actions=None):
+        """Move actions, by default the action of armature_obj, onto the shared armature of its skeleton
+        as one NLA track each. Returns the shared armature"""
+        key = armature_hash(armature_obj)
+        shared = self.get(key)
+        if shared is None:
+            shared = armature_obj
+            self.armatures[key] = shared
+        if actions is None:
+            actions = [armature_obj.animation_data.action]
+        armature_obj.animation_data.action = None
+        if shared.animation_data is None:
+            shared.animation_data_create()
+        for action in actions:
+            track = shared.animation_data.nla_tracks.new()
+            track.name = action.name
+            track.strips.new(action.name, int(action.frame_range[0]), action)
+        return shared
+
+class MeshIndex():
+    """Mesh datablocks by geometry hash. The hash is kept on the mesh, so saved meshes can be indexed again"""
+
+    hash_property = "dos2de_geometry_hash"
+
+    def __init__(self, meshes=()):
+        self.meshes = {}
+        for mesh_data in meshes:
+            key = mesh_data.get(self.hash_property)
+            if key is not None:
+                self.meshes.setdefault(key, mesh_data)
+
+    def get(self, key):
+        mesh_data = self.meshes.get(key)
+        if mesh_data is not None:
+            try:
+                mesh_data.name
+            except ReferenceError:
+                del self.meshes[key]
+                return None
+        return mesh_data
+
+    def share(self, obj):
+        """Link obj to the indexed mesh with the same geometry, returns the mesh it replaced or None"""
+        mesh_data = obj.data
+        key = mesh_builder.geometry_hash(mesh_data, sorted(group.name for group in obj.vertex_groups))
+        existing = self.get(key)
+        if existing is None or existing == mesh_data:
+            mesh_data[self.hash_property] = key
+            self.meshes[key] = mesh_data
+            return None
+        obj.data = existing
+        return mesh_data
+
+import_session = None
+name_allocators = None
+animation_library = None
+mesh_index = None
+material_index = None
+
+def get_import_session(context):
+    global import_session
+    if import_session is None:
+        import_session = datablocks.ImportSession(context)
+    return import_session
+
+def reset_import_batch():
+    """Start a new import batch, the next import snapshots the scene objects and datablock names again"""
+    global import_session, name_allocators, animation_library, mesh_index, material_index
+    import_session = None
+    name_allocators = None
+    animation_library = None
+    mesh_index = None
+    material_index = None
+
+def get_animation_library():
+    global animation_library
+    if animation_library is None:
+        animation_library = AnimationLibrary()
+    return animation_library
+
+def get_mesh_index(saved=False):
+    global mesh_index
+    if mesh_index is None:
+        mesh_index = MeshIndex(bpy.data.meshes if saved else ())
+    return mesh_index
+
+def get_material_index():
+    global material_index
+    if material_index is None:
+        material_index = datablocks.MaterialIndex(bpy.data.materials)
+    return material_index
+
+def get_name_allocator(objtype):
+    global name_allocators
+    if name_allocators is None:
+        name_allocators = {
+            "ARMATURE": datablocks.NameAllocator(a.name for a in bpy.data.armatures),
+            "MESH": datablocks.NameAllocator(m.name for m in bpy.data.meshes),
+        }
+    return name_allocators.get(objtype)
 
 def safe_rename(obj, context, next_name):
-    if obj.type == "ARMATURE":
-        for check in bpy.data.armatures:
-            if check != obj.data and check.name == next_name:
-                next_name = increment_string(next_name)
-    elif obj.type == "MESH":
-        for check in bpy.data.meshes:
-            if check != obj.data and check.name == next_name:
-                next_name = increment_string(next_name)
+    allocator = get_name_allocator(obj.type)
+    if allocator is not None and obj.data.users == 1:
+        allocator.release(obj.data.name)
+        next_name = allocator.allocate(next_name)
     obj.name = next_name
-    obj.data.name = next_name
+    # Shared mesh data keeps the name of its first object
+    if obj.data.users == 1:
+        obj.data.name = next_name
+
+def animation_only(**args):
+    return args["action_animation_only"] or args["action_library_mode"]
+
+def use_native_collada(**args):
+    # Bone reshaping and unit scaling are only done by Blender's importer
+    return args["dae_native_reader"] and not (args["fix_orientation"] or args["auto_connect"] or
+        args["find_chains"] or args["import_units"])
+
+def matrix_property(matrix):
+    # Column by column, the layout Blender's Collada importer stores bind info in
+    return [float(v) for v in np.asarray(matrix).T.ravel()]
+
+def read_collada_native(context, load_filepath, keep_bind_info=False, normalize=True, max_influences=None):
+    """Import a .dae with the streaming reader, returns False when Blender's importer has to take over"""
+    created_meshes = []
+
+    def on_geometry(geometry):
+        mesh_data = mesh_builder.create_mesh(geometry.name, geometry.positions, geometry.indices,
+            material_indices=geometry.material_indices, flip_uv=False,
+            loop_normals=geometry.normals, loop_uvs=geometry.uvs)
+        for _ in geometry.materials:
+            mesh_data.materials.append(None)
+        created_meshes.append(mesh_data)
+        return mesh_data, geometry.materials
+
+    try:
+        document = collada.read(load_filepath, on_geometry)
+    except collada.ColladaError as e:
+        print("[DOS2DE-Importer] Streaming DAE reader skipped '{}': {}".format(load_filepath, e))
+        for mesh_data in created_meshes:
+            bpy.data.meshes.remove(mesh_data)
+        return False
 
-def import_collada(operator, context, load_filepath, rename_temp=False, **args):
+    known_objects = {obj.as_pointer() for obj in context.scene.objects}
+    known_actions = {action.as_pointer() for action in bpy.data.actions}
+    try:
+        build_collada_scene(context, document, keep_bind_info, normalize, max_influences)
+    except Exception as e:
+        # Remove the half-built scene, Blender's importer starts over
+        print("[DOS2DE-Importer] Streaming DAE reader failed on '{}': {}".format(load_filepath, e))
+        traceback.print_exc()
+        remove_new_data(context, known_objects, known_actions, created_meshes)
+        return False
+    return True
+
+def remove_new_data(context, known_objects, known_actions, created_meshes=()):
+    for obj in [obj for obj in context.scene.objects if obj.as_pointer() not in known_objects]:
+        data, is_armature = obj.data, obj.type == "ARMATURE"
+        bpy.data.objects.remove(obj)
+        if is_armature and data.users == 0:
+            bpy.data.armatures.remove(data)
+    for action in [action for action in bpy.data.actions if action.as_pointer() not in known_actions]:
+        bpy.data.actions.remove(action)
+    for mesh_data in created_meshes:
+        if mesh_data.users == 0:
+            bpy.data.meshes.remove(mesh_data)
+
+def read_collada_animations(context, load_filepath, library_mode=False):
+    """Animation only import of a .dae with the streaming reader. Returns the animated armatures,
+    or None when Blender's importer has to take over"""
+    try:
+        document = collada.read(load_filepath, meshes=False)
+    except collada.ColladaError as e:
+        print("[DOS2DE-Importer] Streaming DAE reader skipped '{}': {}".format(load_filepath, e))
+        return None
+    if len(document.channels) == 0 and document.skipped_channels > 0:
+        print("[DOS2DE-Importer] Streaming DAE reader skipped '{}': {} animation channels don't animate whole joint matrices.".format(
+            load_filepath, document.skipped_channels))
+        return None
+
+    known_objects = {obj.as_pointer() for obj in context.scene.objects}
+    known_actions = {action.as_pointer() for action in bpy.data.actions}
+    try:
+        armature_obj = build_collada_animations(context, document, library_mode)
+    except Exception as e:
+        print("[DOS2DE-Importer] Streaming DAE reader failed on '{}': {}".format(load_filepath, e))
+        traceback.print_exc()
+        remove_new_data(context, known_objects, known_actions)
+        return None
+    return [armature_obj] if armature_obj is not None else []
+
+def collada_joints(nodes):
+    """Indices of the joint nodes and the position of each joint's parent joint in that list"""
+    joints = [i for i, node in enumerate(nodes) if node.type == "JOINT"]
+    # A bone's parent is its closest joint ancestor
+    parents = []
+    for i in joints:
+        parent = nodes[i].parent
+        while parent >= 0 and nodes[parent].type != "JOINT":
+            parent = nodes[parent].parent
+        parents.append(joints.index(parent) if parent >= 0 else -1)
+    return joints, parents
+
+def build_collada_animations(context, document, library_mode=False):
+    """Actions straight from the animation channels, onto the library or active armature when one matches.
+    Only a bare armature is created otherwise, meshes are never built"""
+    nodes = document.nodes
+    worlds = collada.world_matrices(nodes)
+    joints, parents = collada_joints(nodes)
+    if len(joints) == 0 or len(document.channels) == 0:
+        return None
+    names = [nodes[i].name for i in joints]
+
+    armature_obj = None
+    if library_mode:
+        armature_obj = get_animation_library().get(skeletons.skeleton_hash(
+            (name, names[parent] if parent >= 0 else None) for name, parent in zip(names, parents)))
+    if armature_obj is None:
+        targets = {node.id: node.name for node in nodes}
+        armature_obj = find_animation_armature(context, set(targets.get(channel.target) for channel in document.channels))
+    if armature_obj is not None:
+        bones = armature_obj.data.bones
+        joint_bones = {i: nodes[i].name for i in joints if nodes[i].name in bones}
+    else:
+        root = nodes[joints[0]]
+        name = nodes[root.parent].name if root.parent >= 0 else root.name
+        armature_obj, bone_names = create_armature(context, name, names, parents, [Matrix(worlds[i].tolist()) for i in joints])
+        joint_bones = dict(zip(joints, bone_names))
+        axis_fix = collada.up_axis_matrix(document.up_axis)
+        if not np.allclose(axis_fix, np.eye(4)):
+            armature_obj.matrix_world = Matrix(axis_fix.tolist()) @ armature_obj.matrix_world
+
+    if create_collada_action(context, armature_obj, document, worlds, joint_bones) is None:
+        print("[DOS2DE-Importer] No animation channel of the file matches a bone of '{}'.".format(armature_obj.name))
+        return None
+    return armature_obj
+
+def build_collada_scene(context, document, keep_bind_info=False, normalize=True, max_influences=None):
+    nodes = document.nodes
+    worlds = collada.world_matrices(nodes)
+
+    armature_obj = None
+    joints, parents = collada_joints(nodes)
+    joint_bones = {}
+    bone_lookup = {}
+    if len(joints) > 0:
+        root = nodes[joints[0]]
+        name = nodes[root.parent].name if root.parent >= 0 else root.name
+        armature_obj, bone_names = create_armature(context, name, [nodes[i].name for i in joints], parents,
+            [Matrix(worlds[i].tolist()) for i in joints])
+        for i, bone_name in zip(joints, bone_names):
+            joint_bones[i] = bone_name
+            for key in (nodes[i].sid, nodes[i].id, nodes[i].name):
+                if key is not None:
+                    bone_lookup.setdefault(key, bone_name)
+            if keep_bind_info:
+                armature_obj.data.bones[bone_name]["rest_mat"] = matrix_property(nodes[i].matrix)
+
+    root_objects = [armature_obj] if armature_obj is not None else []
+    bound_meshes = set()
+    for node_index, node in enumerate(nodes):
+        for kind, url, bindings in node.instances:
+            skin = document.skins.get(url) if kind == "instance_controller" else None
+            entry = document.geometries.get(skin.source if skin is not None else url)
+            if entry is None:
+                continue
+            mesh_data, symbols = entry
+            for slot, symbol in enumerate(symbols):
+                material_id = bindings.get(symbol)
+                if material_id is not None:
+                    material_name = document.materials.get(material_id, material_id)
+                    mesh_data.materials[slot] = bpy.data.materials.get(material_name) or bpy.data.materials.new(material_name)
+
+            obj = bpy.data.objects.new(node.name, mesh_data)
+            context.collection.objects.link(obj)
+            obj.matrix_world = Matrix(worlds[node_index].tolist())
+            if skin is None or armature_obj is None:
+                root_objects.append(obj)
+                continue
+
+            if mesh_data.as_pointer() not in bound_meshes:
+                bound_meshes.add(mesh_data.as_pointer())
+                if not np.allclose(skin.bind_shape, np.eye(4)):
+                    mesh_builder.transform_mesh(mesh_data, skin.bind_shape)
+            assign_skin_weights(obj, [bone_lookup.get(joint, joint) for joint in skin.joints],
+                skin.vertices, skin.joint_indices, skin.weights, normalize=normalize, max_influences=max_influences)
+            if keep_bind_info:
+                for joint, inverse_bind in zip(skin.joints, skin.inverse_bind):
+                    bone = armature_obj.data.bones.get(bone_lookup.get(joint, joint))
+                    if bone is not None:
+                        bone["bind_mat"] = matrix_property(np.linalg.inv(inverse_bind))
+            obj.parent = armature_obj
+            modifier = obj.modifiers.new(name="Armature", type="ARMATURE")
+            modifier.object = armature_obj
+
+    if armature_obj is not None and len(document.channels) > 0:
+        create_collada_action(context, armature_obj, document, worlds, joint_bones)
+    if document.skipped_channels > 0:
+        print("[DOS2DE-Importer] Skipped {} animation channels that don't animate whole joint matrices.".format(document.skipped_channels))
+
+    axis_fix = collada.up_axis_matrix(document.up_axis)
+    if not np.allclose(axis_fix, np.eye(4)):
+        axis_fix = Matrix(axis_fix.tolist())
+        for obj in root_objects:
+            obj.matrix_world = axis_fix @ obj.matrix_world
+
+def create_collada_action(context, armature_obj, document, worlds, joint_bones):
+    nodes = document.nodes
+    node_indices = {node.id: i for i, node in enumerate(nodes)}
+    channels = {}
+    for channel in document.channels:
+        node_index = node_indices.get(channel.target)
+        if node_index in joint_bones:
+            channels.setdefault(joint_bones[node_index], (node_index, channel))
+    if len(channels) == 0:
+        return None
+
+    bones = list(armature_obj.data.bones)
+    bone_indices = {bone.name: i for i, bone in enumerate(bones)}
+    parents = [bone_indices[bone.parent.name] if bone.parent is not None else -1 for bone in bones]
+    bind = np.array([bone.matrix_local for bone in bones], dtype=np.float64)
+    rest_by_name = {bone_name: worlds[i] for i, bone_name in joint_bones.items()}
+    rest = np.array([rest_by_name.get(bone.name, matrix) for bone, matrix in zip(bones, bind)])
+
+    times = np.unique(np.concatenate([channel.times for _, channel in channels.values()]))
+    render = context.scene.render
+    # Key times are stored as 32 bit floats, keep the frames they meant
+    frames = np.round(times * (render.fps / render.fps_base), 3)
+
+    animated = np.empty((len(bones), len(times), 4, 4), dtype=np.float64)
+    for i in range(len(bones)):
+        animated[i] = np.linalg.inv(rest[parents[i]]) @ rest[i] if parents[i] >= 0 else rest[i]
+    tracked = [bone_indices[name] for name in channels]
+    sampled = collada.sample_channels([channel for _, channel in channels.values()], times)
+    for row, (name, (node_index, _)) in enumerate(channels.items()):
+        # Channels animate the node relative to its parent node, which isn't always the parent joint
+        i = bone_indices[name]
+        parent_node = nodes[node_index].parent
+        to_parent = worlds[parent_node] if parent_node >= 0 else np.eye(4)
+        if parents[i] >= 0:
+            to_parent = np.linalg.inv(rest[parents[i]]) @ to_parent
+        animated[i] = to_parent @ sampled[row]
+
+    bases = curves.pose_bases(parents, bind, rest, animated)
+    action = create_pose_action(armature_obj.name + "Action", list(channels), frames, bases[tracked])
+    if armature_obj.animation_data is None:
+        armature_obj.animation_data_create()
+    armature_obj.animation_data.action = action
+    return action
+
+def import_collada(operator, context, load_filepath, rename_temp=False, source_filepath=None, **args):
+    fix_orientation = args["fix_orientation"]
+    auto_connect = args["auto_connect"]
+    find_chains = args["find_chains"]
+    min_chain_length = args["min_chain_length"]
+    import_units = args["import_units"]
+    keep_bind_info = args["keep_bind_info"]
+
+    session = get_import_session(context)
+
+    print("[DOS2DE-Importer] Importing collada file: '{}'".format(load_filepath))
+
+    imported = False
+    animated_objects = None
+    if use_native_collada(**args):
+        if animation_only(**args):
+            animated_objects = read_collada_animations(context, load_filepath, args["action_library_mode"])
+            imported = animated_objects is not None
+        else:
+            imported = read_collada_native(context, load_filepath, keep_bind_info, **skin_options(**args))
+    if not imported:
+        bpy.ops.wm.collada_import(filepath=load_filepath, fix_orientation=fix_orientation, import_units=import_units, 
+            find_chains=find_chains, auto_connect=auto_connect, min_chain_length=min_chain_length, keep_bind_info=keep_bind_info)
+
+    if source_filepath is not None:
+        load_filepath = source_filepath
+    return finish_import(operator, context, load_filepath, session.new_objects(context), rename_temp,
+        animated_objects=animated_objects or (), **args)
+
+def finish_import(operator, context, load_filepath, new_objects, rename_temp=False, animated_objects=(), extra_actions=(), **args):
+    """extra_actions are further actions of the file that couldn't be assigned, they belong to the armature in animated_objects"""
     rename_actions = args["action_autorename"]
     use_build_material = args["use_build_material"]
 
@@ -780,32 +1503,35 @@ def import_collada(operator, context, load_filepath, rename_temp=False, **args):
     action_clean_enabled = args["action_clean_enabled"]
     action_clean_threshold = args["action_clean_threshold"]
     action_clean_channels = args["action_clean_channels"]
+    action_resample_enabled = args["action_resample_enabled"]
+    action_resample_step = args["action_resample_step"]
 
-    gr2_conform_enabled = args["gr2_conform_enabled"]
     delete_objects_options = args["delete_objects"]
     rename_armatures = args["rename_armatures"]
     rename_meshes = args["rename_meshes"]
     use_rename_junk = args["use_rename_junk"]
-
-    fix_orientation = args["fix_orientation"]
-    auto_connect = args["auto_connect"]
-    find_chains = args["find_chains"]
-    min_chain_length = args["min_chain_length"]
-    import_units = args["import_units"]
     apply_transformation = args["apply_transformation"]
-    keep_bind_info = args["keep_bind_info"]
 
-    #ignored_objects = list(filter(lambda obj: obj.type == "ARMATURE", context.scene.objects.values()))
-    ignored_objects = context.scene.objects.values()
-
-    print("[DOS2DE-Importer] Importing collada file: '{}'".format(load_filepath))
-
-    bpy.ops.wm.collada_import(filepath=load_filepath, fix_orientation=fix_orientation, import_units=import_units, 
-        find_chains=find_chains, auto_connect=auto_connect, min_chain_length=min_chain_length, keep_bind_info=keep_bind_info)
-
-    parse_actions = action_offset_zero or rename_actions or action_set_fake_user
+    if animation_only(**args):
+        # Blender's importer always builds meshes, only the armatures and their actions are kept
+        meshes = [obj for obj in new_objects if obj.type == "MESH"]
+        if len(meshes) > 0:
+            print("[DOS2DE-Importer] Animation only import, removing {} imported meshes.".format(len(meshes)))
+            session = get_import_session(context)
+            for obj in meshes:
+                mesh_data = obj.data
+                session.forget(obj)
+                bpy.data.objects.remove(obj)
+                if mesh_data.users == 0:
+                    bpy.data.meshes.remove(mesh_data)
+            new_objects = [obj for obj in new_objects if obj.type != "MESH"]
+
+    parse_actions = action_offset_zero or rename_actions or action_set_fake_user or action_clean_enabled or action_resample_enabled
     if parse_actions:
-        new_armatures = list(filter(lambda obj: obj.type == "ARMATURE" and obj.animation_data != None and not obj in ignored_objects, context.scene.objects.values()))
+        processed_actions = set()
+        # Existing armatures that this import gave an action count as new ones here
+        animated = list(new_objects) + [obj for obj in animated_objects if obj not in new_objects]
+        new_armatures = [obj for obj in animated if obj.type == "ARMATURE" and obj.animation_data != None]
         if len(new_armatures) > 0:
             print("[DOS2DE-Importer] New Armature Objects: ({}). Parsing actions".format(len(new_armatures)))
             for ob in new_armatures:
@@ -829,54 +1555,82 @@ def import_collada(operator, context, load_filepath, rename_temp=False, **args):
                         action.use_fake_user = True
                         print("[DOS2DE-Importer] Enabled fake user for action '{}'.".format(action_name))
 
-                    if action_offset_zero:
-                        fcurves = ob.animation_data.action.fcurves
-                        for fc in fcurves:
-                            for keyframe in fc.keyframe_points:
-                                keyframe.co.x += 1
-
-                    # if action_clean_enabled:
-                    #     print("[DOS2DE-Importer] Cleaning action. Threshold '{}' Channels '{}'.".format(action_clean_threshold, action_clean_channels))
-                    #     bpy.ops.object.select_all(action='DESELECT')
-                    #     last = bpy.context.scene.objects.active
-                    #     bpy.context.scene.objects.active = ob
-                    #     ob.select = True
-                    #     bpy.ops.object.mode_set(mode="POSE")
-                    #     bpy.ops.action.clean(threshold=action_clean_threshold, channels=action_clean_channels)
-                    #     #bpy.ops.action.clean(0.001, True)
-                    #     bpy.ops.object.mode_set(mode="OBJECT")
-                    #     ob.select = False
-                    #     bpy.context.scene.objects.active = last
+                    process = action_offset_zero or action_clean_enabled or action_resample_enabled
+                    file_actions = [action] + (list(extra_actions) if ob in animated_objects else [])
+                    for file_action in file_actions:
+                        if process and file_action.as_pointer() not in processed_actions:
+                            processed_actions.add(file_action.as_pointer())
+                            stats = actions.process_action(file_action,
+                                offset=1.0 if action_offset_zero else 0.0,
+                                clean_threshold=action_clean_threshold if action_clean_enabled else None,
+                                clean_channels=action_clean_channels,
+                                resample_step=action_resample_step if action_resample_enabled else None)
+                            print("[DOS2DE-Importer] Processed action '{}'. Keyframes: {} => {}. Removed channels: {}.".format(
+                                file_action.name, stats.keys_before, stats.keys_after, stats.removed_curves))
 
         else:
             #operator.report({'INFO'}, "[DOS2DE-Importer] No new actions to rename.")
             pass
 
     if apply_transformation:
-        new_armatures = list(filter(lambda obj: not obj in ignored_objects, context.scene.objects.values()))
-        for obj in new_armatures:
-            print("[DOS2DE-Importer] Applying transformation for object '{}:{}' and children.".format(obj.name, obj.type))
-            transform_apply(operator, context, obj, location=True, rotation=True, scale=True, children=True)
-
-    if delete_objects_options != "DISABLED":
-        delete_objects = list(filter(lambda obj: not obj in ignored_objects and can_delete(obj.type, delete_objects_options), context.scene.objects.values()))
+        print("[DOS2DE-Importer] Applying transformation for {} new objects.".format(len(new_objects)))
+        apply_transforms(new_objects)
+
+    shared_armatures = set()
+    discarded_armatures = []
+    if args["action_library_mode"]:
+        library = get_animation_library()
+        animated = list(new_objects) + [obj for obj in animated_objects if obj not in new_objects]
+        for obj in animated:
+            if obj.type == "ARMATURE" and obj.animation_data is not None and obj.animation_data.action is not None:
+                file_actions = [obj.animation_data.action] + (list(extra_actions) if obj in animated_objects else [])
+                shared = library.bind(obj, file_actions)
+                shared_armatures.add(shared)
+                print("[DOS2DE-Importer] Added actions {} to library armature '{}'.".format(
+                    ", ".join("'{}'".format(action.name) for action in file_actions), shared.name))
+                if shared is not obj and obj in new_objects:
+                    discarded_armatures.append(obj)
+
+    if delete_objects_options != "DISABLED" or len(discarded_armatures) > 0:
+        delete_objects = []
+        if delete_objects_options != "DISABLED":
+            delete_objects = [obj for obj in new_objects if can_delete(obj.type, delete_objects_options) and obj not in shared_armatures]
+        delete_objects += [obj for obj in discarded_armatures if obj not in delete_objects]
         print("[DOS2DE-Importer] Deleting '{}' new objects after import.".format(len(delete_objects)))
+        session = get_import_session(context)
         for obj in delete_objects:
-            index = bpy.data.objects.find(obj.name)
-            if index > -1:
-                obj_data = bpy.data.objects[index]
-                print("[DOS2DE-Importer] Deleting object '{}:{}'.".format(obj.name, obj.type))
-                bpy.data.objects.remove(obj_data)
+            print("[DOS2DE-Importer] Deleting object '{}:{}'.".format(obj.name, obj.type))
+            session.forget(obj)
+            bpy.data.objects.remove(obj)
+        deleted = set(delete_objects)
+        new_objects = [obj for obj in new_objects if obj not in deleted]
     
+    if args["mesh_deduplicate"]:
+        index = get_mesh_index(args["mesh_deduplicate_saved"])
+        shared = 0
+        for obj in new_objects:
+            if obj.type == "MESH" and obj.data is not None:
+                duplicate = index.share(obj)
+                if duplicate is not None:
+                    print("[DOS2DE-Importer] Linked '{}' to existing mesh '{}'.".format(obj.name, obj.data.name))
+                    get_name_allocator("MESH").release(duplicate.name)
+                    bpy.data.meshes.remove(duplicate)
+                    shared += 1
+        if shared > 0:
+            print("[DOS2DE-Importer] Shared mesh data for {} of {} new objects.".format(shared, len(new_objects)))
+
     rename_objects = (rename_armatures != "DISABLED" or rename_meshes != "DISABLED")
 
     if rename_objects == True:
-        new_objects = list(filter(lambda obj: not obj in ignored_objects, context.scene.objects.values()))
         filename = os.path.basename(load_filepath).replace("-temp", "")
         index_of_dot = filename.index('.')
         if index_of_dot >= 0:
             filename = filename[:index_of_dot]
 
+        # Datablocks created by this import weren't part of the snapshot
+        for objtype in ("ARMATURE", "MESH"):
+            get_name_allocator(objtype).add(obj.data.name for obj in new_objects if obj.type == objtype)
+
         for obj in new_objects:
             name_prefix = ""
             next_name = ""
@@ -913,19 +1667,287 @@ def import_collada(operator, context, load_filepath, rename_temp=False, **args):
                 if "extracted_assets_dir" in preferences:
                     assets_dir = preferences.extracted_assets_dir
         if assets_dir != "":
-            check_findname = os.path.basename(load_filepath).replace("-temp.dae", "")
-            new_meshes = list(filter(lambda obj: not obj in ignored_objects and obj.type == "MESH", context.scene.objects.values()))
+            check_findname = os.path.splitext(os.path.basename(load_filepath))[0].replace("-temp", "")
+            new_meshes = [obj for obj in new_objects if obj.type == "MESH"]
+            textures = get_textures(None, check_findname, context, assets_dir)
+            materials = len(bpy.data.materials)
             for mesh in new_meshes:
-                mat_name="{}_DOS2DE_PBR".format(obj.name)
-                mat = bpy.data.materials.get(mat_name)
-                if mat is None:
-                    if create_material(mat_name, mesh, check_findname, context, assets_dir):
-                        print("[DOS2DE-Importer] Created material for '{}'".format(mesh.name))
-                else:
-                    mesh.data.materials.append(mat)
+                mat_name = "{}_DOS2DE_PBR".format(mesh.name)
+                create_material(mat_name, mesh, check_findname, context, assets_dir, textures)
+            if len(new_meshes) > 0:
+                print("[DOS2DE-Importer] Assigned materials to {} meshes ({} created).".format(len(new_meshes), len(bpy.data.materials) - materials))
     return True
 
-def import_granny(operator, context, load_filepath, divine_path, **args):
+def granny_transform_matrix(transform):
+    x, y, z, w = transform["Orientation"]
+    ss = transform["ScaleShear"]
+    scale_shear = Matrix((ss[0:3], ss[3:6], ss[6:9])).to_4x4()
+    return Matrix.Translation(Vector(transform["Position"])) @ Quaternion((w, x, y, z)).to_matrix().to_4x4() @ scale_shear
+
+def create_granny_armature(context, skeleton, name):
+    bones = skeleton["Bones"]
+    world_matrices = []
+    for bone in bones:
+        local = granny_transform_matrix(bone["LocalTransform"])
+        parent = bone["ParentIndex"]
+        world_matrices.append(world_matrices[parent] @ local if parent >= 0 else local)
+    return create_armature(context, name, [b["Name"] for b in bones], [b["ParentIndex"] for b in bones], world_matrices)
+
+def create_armature(context, name, bone_names, parents, world_matrices):
+    """Armature object with one bone per name, parents come before their children"""
+    lengths = [0.0] * len(bone_names)
+    for i, parent in enumerate(parents):
+        if parent >= 0:
+            distance = (world_matrices[i].to_translation() - world_matrices[parent].to_translation()).length
+            lengths[parent] = max(lengths[parent], distance)
+
+    armature = bpy.data.armatures.new(name)
+    armature_obj = bpy.data.objects.new(name, armature)
+    context.collection.objects.link(armature_obj)
+
+    last_active = context.view_layer.objects.active
+    context.view_layer.objects.active = armature_obj
+    bpy.ops.object.mode_set(mode="EDIT")
+    edit_bones = []
+    for bone_name, parent, matrix, length in zip(bone_names, parents, world_matrices, lengths):
+        edit_bone = armature.edit_bones.new(bone_name)
+        edit_bone.head = (0.0, 0.0, 0.0)
+        edit_bone.tail = (0.0, length if length > 0.0001 else 0.05, 0.0)
+        edit_bone.matrix = Matrix.Translation(matrix.to_translation()) @ matrix.to_quaternion().to_matrix().to_4x4()
+        if parent >= 0:
+            edit_bone.parent = edit_bones[parent]
+        edit_bones.append(edit_bone)
+    bone_names = [b.name for b in edit_bones]
+    bpy.ops.object.mode_set(mode="OBJECT")
+    context.view_layer.objects.active = last_active
+    return armature_obj, bone_names
+
+def skin_options(**args):
+    return {
+        "normalize": args["skin_normalize_weights"],
+        "max_influences": 4 if args["skin_limit_influences"] else None,
+    }
+
+def assign_skin_weights(obj, group_names, vertices, groups, weights, normalize=True, max_influences=None, steps=None):
+    """Vertex groups for group_names, filled with one VertexGroup.add call per (group, weight) run.
+    steps is only set for weights that were read from integers, see mesh_builder.weight_groups"""
+    start = time.perf_counter()
+    vertex_groups = [obj.vertex_groups.new(name=name) for name in group_names]
+    influences = len(vertices)
+    vertices, groups, weights = mesh_builder.prepare_influences(vertices, groups, weights,
+        normalize=normalize, max_influences=max_influences)
+    prepared = time.perf_counter()
+    runs = mesh_builder.weight_groups(vertices, groups, weights, steps)
+    for group, weight, group_vertices in runs:
+        vertex_groups[group].add(group_vertices, weight, "REPLACE")
+    end = time.perf_counter()
+    print("[DOS2DE-Importer] Skinned '{}': {} of {} influences in {} VertexGroup.add calls. Prepare {:.1f} ms, write {:.1f} ms.".format(
+        obj.name, len(vertices), influences, len(runs), (prepared - start) * 1000.0, (end - prepared) * 1000.0))
+    return vertex_groups
+
+def create_granny_mesh(context, mesh, armature_obj=None, normalize=True, max_influences=None):
+    vertices = mesh["PrimaryVertexData"]["Vertices"].array
+    components = vertices.dtype.names
+    topology = mesh["PrimaryTopology"]
+    indices = granny.triangle_indices(topology)
+
+    groups = [(g["MaterialIndex"], g["TriFirst"], g["TriCount"]) for g in topology.get("Groups") or []]
+    material_indices = mesh_builder.triangle_material_indices(groups, len(indices) // 3) if len(groups) > 0 else None
+
+    mesh_data = bpy.data.meshes.new(mesh["Name"])
+    for binding in mesh.get("MaterialBindings") or []:
+        material = binding.get("Material")
+        mat_name = material.get("Name") if material is not None else None
+        mesh_data.materials.append(bpy.data.materials.new(mat_name or mesh["Name"]))
+
+    mesh_builder.fill_mesh(mesh_data, vertices["Position"], indices,
+        normals=vertices["Normal"] if "Normal" in components else None,
+        uvs=vertices["TextureCoordinates0"] if "TextureCoordinates0" in components else None,
+        material_indices=material_indices)
+
+    mesh_obj = bpy.data.objects.new(mesh["Name"], mesh_data)
+    context.collection.objects.link(mesh_obj)
+
+    bone_bindings = mesh.get("BoneBindings") or []
+    if armature_obj is not None and len(bone_bindings) > 0:
+        bone_names = [b["BoneName"] for b in bone_bindings]
+        if "BoneWeights" in components:
+            influences = mesh_builder.flatten_influences(vertices["BoneIndices"],
+                vertices["BoneWeights"].astype(np.float32) / 255.0)
+            # The weights are bytes, so runs are grouped on the same 1/255 grid
+            assign_skin_weights(mesh_obj, bone_names, *influences, normalize=normalize, max_influences=max_influences, steps=255)
+        else:
+            groups = [mesh_obj.vertex_groups.new(name=name) for name in bone_names]
+            groups[0].add(range(len(vertices)), 1.0, "REPLACE")
+        mesh_obj.parent = armature_obj
+        modifier = mesh_obj.modifiers.new(name="Armature", type="ARMATURE")
+        modifier.object = armature_obj
+    return mesh_obj
+
+def import_granny_native(operator, context, load_filepath, **args):
+    with granny.open_file(load_filepath) as gr2:
+        compressed = gr2.compressed_sections()
+        if len(compressed) > 0:
+            raise granny.GR2CompressionError("Section(s) {} use {} compression".format(
+                ", ".join(str(s.index) for s in compressed), compressed[0].compression_name))
+        return build_granny_native(operator, context, load_filepath, gr2.root, **args)
+
+def find_animation_armature(context, track_names):
+    """The active armature, when it has a bone for one of the animation tracks"""
+    obj = context.view_layer.objects.active
+    if obj is not None and obj.type == "ARMATURE":
+        bones = obj.data.bones
+        if any(name in bones for name in track_names):
+            return obj
+    return None
+
+def skeleton_rest_matrices(skeleton):
+    """Parent space and armature space rest matrices of a Granny skeleton, keyed by bone name"""
+    local_matrices = {}
+    world_matrices = {}
+    worlds = []
+    for bone in skeleton["Bones"]:
+        local = curves.transform_matrix(bone["LocalTransform"])
+        parent = bone["ParentIndex"]
+        worlds.append(worlds[parent] @ local if parent >= 0 else local)
+        local_matrices[bone["Name"]] = local
+        world_matrices[bone["Name"]] = worlds[-1]
+    return local_matrices, world_matrices
+
+def create_pose_action(name, bone_names, frames, bases):
+    """Action with location, rotation and scale F-curves from (bones, frames, 4, 4) pose bases"""
+    location, rotation, scale = curves.decompose_matrices(bases)
+    action = bpy.data.actions.new(name)
+    for i, bone_name in enumerate(bone_names):
+        for prop, values in (("location", location), ("rotation_quaternion", rotation), ("scale", scale)):
+            data_path = 'pose.bones["{}"].{}'.format(bone_name, prop)
+            for index in range(values.shape[2]):
+                actions.new_fcurve(action, data_path, index, bone_name, actions.sampled_keyframes(frames, values[i, :, index]))
+    return action
+
+def create_granny_action(context, armature_obj, animation, skeleton=None):
+    bones = list(armature_obj.data.bones)
+    bone_indices = {bone.name: i for i, bone in enumerate(bones)}
+    parents = [bone_indices[bone.parent.name] if bone.parent is not None else -1 for bone in bones]
+    bind = np.array([bone.matrix_local for bone in bones], dtype=np.float64)
+
+    tracks = {}
+    track_count = 0
+    for group in animation.get("TrackGroups") or []:
+        for track in group.get("TransformTracks") or []:
+            track_count += 1
+            if track["Name"] in bone_indices:
+                tracks.setdefault(track["Name"], track)
+    tracked = [bone_indices[name] for name in tracks]
+
+    local_rest, world_rest = skeleton_rest_matrices(skeleton) if skeleton is not None else ({}, {})
+    time_step = animation["TimeStep"]
+    times = curves.sample_times(animation["Duration"], time_step)
+    render = context.scene.render
+    frames = times * (render.fps / render.fps_base)
+
+    # Bones without a track hold their rest pose, so their children still follow the animation
+    rest = np.array([world_rest.get(bone.name, matrix) for bone, matrix in zip(bones, bind)])
+    animated = np.empty((len(bones), len(times), 4, 4), dtype=np.float64)
+    for i, bone in enumerate(bones):
+        if bone.name in local_rest:
+            animated[i] = local_rest[bone.name]
+        elif parents[i] >= 0:
+            animated[i] = np.linalg.inv(rest[parents[i]]) @ rest[i]
+        else:
+            animated[i] = rest[i]
+    if len(tracked) > 0:
+        animated[tracked] = curves.sample_tracks([curves.read_track(track, time_step) for track in tracks.values()], times)
+    bases = curves.pose_bases(parents, bind, rest, animated)
+    action = create_pose_action(animation["Name"], list(tracks), frames, bases[tracked])
+    print("[DOS2DE-Importer] Created action '{}' with {} of {} tracks, {} frames.".format(
+        action.name, len(tracks), track_count, len(times)))
+    return action
+
+def build_granny_animations(operator, context, load_filepath, root, **args):
+    """Animation only import: the skeleton and animation tracks, meshes are never read"""
+    session = get_import_session(context)
+    print("[DOS2DE-Importer] Reading GR2 animations natively: '{}'".format(load_filepath))
+
+    animations = root.get("Animations") or []
+    track_names = set(track["Name"] for animation in animations
+        for group in animation.get("TrackGroups") or []
+        for track in group.get("TransformTracks") or [])
+
+    model = None
+    skeleton = None
+    for candidate in root.get("Models") or []:
+        if candidate.get("Skeleton") is not None:
+            model, skeleton = candidate, candidate["Skeleton"]
+            break
+    if skeleton is None and len(root.get("Skeletons") or []) > 0:
+        skeleton = root["Skeletons"][0]
+
+    armature_obj = None
+    if args["action_library_mode"] and skeleton is not None:
+        armature_obj = get_animation_library().get(granny_skeleton_hash(skeleton))
+    if armature_obj is None:
+        armature_obj = find_animation_armature(context, track_names)
+    if armature_obj is None:
+        if skeleton is None or len(skeleton["Bones"]) == 0:
+            raise granny.GR2Error("No skeleton in the file and no matching armature is active")
+        armature_obj, _ = create_granny_armature(context, skeleton, model["Name"] if model is not None else skeleton["Name"])
+        if model is not None:
+            armature_obj.matrix_world = granny_transform_matrix(model["InitialPlacement"])
+        if granny.up_axis(root) == "Y":
+            armature_obj.matrix_world = Matrix.Rotation(1.5707963267948966, 4, "X") @ armature_obj.matrix_world
+
+    new_actions = [create_granny_action(context, armature_obj, animation, skeleton) for animation in animations]
+    if len(new_actions) > 0:
+        if armature_obj.animation_data is None:
+            armature_obj.animation_data_create()
+        armature_obj.animation_data.action = new_actions[0]
+        # Only one action can be assigned, keep the others from being discarded on save
+        for action in new_actions[1:]:
+            action.use_fake_user = True
+
+    return finish_import(operator, context, load_filepath, session.new_objects(context),
+        animated_objects=[armature_obj], extra_actions=new_actions[1:], **args)
+
+def build_granny_native(operator, context, load_filepath, root, **args):
+    if animation_only(**args):
+        return build_granny_animations(operator, context, load_filepath, root, **args)
+    if len(root.get("Animations") or []) > 0:
+        raise granny.GR2Error("Animations are not supported by the native reader")
+
+    session = get_import_session(context)
+    print("[DOS2DE-Importer] Reading GR2 file natively: '{}'".format(load_filepath))
+
+    root_objects = []
+    bound_meshes = set()
+    for model in root.get("Models") or []:
+        armature_obj = None
+        skeleton = model.get("Skeleton")
+        if skeleton is not None and len(skeleton["Bones"]) > 0:
+            armature_obj, _ = create_granny_armature(context, skeleton, model["Name"])
+            armature_obj.matrix_world = granny_transform_matrix(model["InitialPlacement"])
+            root_objects.append(armature_obj)
+        for binding in model.get("MeshBindings") or []:
+            mesh = binding["Mesh"]
+            if mesh is None or mesh.ref in bound_meshes:
+                continue
+            bound_meshes.add(mesh.ref)
+            mesh_obj = create_granny_mesh(context, mesh, armature_obj, **skin_options(**args))
+            if armature_obj is None:
+                root_objects.append(mesh_obj)
+
+    for mesh in root.get("Meshes") or []:
+        if mesh is not None and mesh.ref not in bound_meshes:
+            root_objects.append(create_granny_mesh(context, mesh))
+
+    if granny.up_axis(root) == "Y":
+        axis_fix = Matrix.Rotation(1.5707963267948966, 4, "X")
+        for obj in root_objects:
+            obj.matrix_world = axis_fix @ obj.matrix_world
+
+    return finish_import(operator, context, load_filepath, session.new_objects(context), **args)
+
+def get_conform_skeleton_path(load_filepath, **args):
     gr2_conform_enabled = args["gr2_conform_enabled"]
     if gr2_conform_enabled == True:
         conform_skeleton_path = args["gr2_conform_skeleton_path"]
@@ -938,18 +1960,7 @@ def import_granny(operator, context, load_filepath, divine_path, **args):
                 filename = os.path.basename(load_filepath)
                 print("  [DOS2DE-Importer] Auto-select base skeleton set. Looking for match in name {}".format(load_filepath))
 
-                auto_skeleton = None
-                for key,entry in base_skeleton_dict.items():
-                    base_file = entry[0]
-                    if filename.count(key) > 0:
-                        auto_skeleton = base_file
-                        break
-                    else:
-                        race = entry[1]
-                        gender = entry[2]
-                        if filename.count(race + "_Hero_"+gender) > 0:
-                            auto_skeleton = base_file
-                            break
+                auto_skeleton = skeleton_catalog.match(filename)
 
                 if auto_skeleton is not None and os.path.isfile(auto_skeleton):
                     conform_skeleton_path = auto_skeleton
@@ -959,8 +1970,8 @@ def import_granny(operator, context, load_filepath, divine_path, **args):
 
             else:
                 print("[DOS2DE-Importer] Looking for '{}'.".format(base_skeleton))
-                if base_skeleton in base_skeleton_dict.keys():
-                    check_path = base_skeleton_dict[base_skeleton][0]
+                check_path = skeleton_catalog.get(base_skeleton)
+                if check_path is not None:
                     if os.path.isfile(check_path):
                         conform_skeleton_path = check_path
                         print("[DOS2DE-Importer] Using base skeleton '{}'.".format(conform_skeleton_path))
@@ -968,61 +1979,156 @@ def import_granny(operator, context, load_filepath, divine_path, **args):
             print("[DOS2DE-Importer] No base skeleton set. Using conform path.")
     else:
         conform_skeleton_path = ""
-    delete_dae = args["gr2_delete_dae"]
-
-    divine_exe = '"{}"'.format(divine_path)
-    
-    from pathlib import Path
-    path_start = Path(load_filepath)
-    dae_temp_path = str(Path(str(path_start.with_suffix("")) + "-temp.dae"))
+    return conform_skeleton_path
+
+def prepare_granny_batches(jobs, divine_path, max_workers=1, log_level="all", staging=None):
+    """Group pending conversions by their options and split them into at most max_workers batches each"""
+    import tempfile
+    groups = {}
+    for job in jobs:
+        groups.setdefault(job.options, []).append(job)
+
+    batches = []
+    singles = []
+    for options, group in groups.items():
+        count = max(1, min(max_workers, len(group)))
+        for chunk in (group[i::count] for i in range(count)):
+            if len(chunk) == 1:
+                singles.append(chunk[0])
+                continue
+            staging_dir = staging.make_dir("batch_") if staging is not None else tempfile.mkdtemp(prefix="io_scene_gr2_batch_")
+            batch = converter.BatchConversion(chunk, staging_dir)
+            batch.command = converter.divine_command(divine_path, batch.input_dir, batch.output_dir, options,
+                action="convert-models", log_level=log_level)
+            batches.append(batch)
+    return batches, singles
+
+def prepare_granny_conversion(context, load_filepath, divine_path, **args):
+    gr2_conform_enabled = args["gr2_conform_enabled"]
+    if gr2_conform_enabled:
+        get_skeleton_catalog(context, wait=True)
+    conform_skeleton_path = get_conform_skeleton_path(load_filepath, **args)
+
+    # Staging only holds files that are deleted after the import, kept dae files go next to the gr2 file
+    staging = get_staging_area(context) if args["gr2_delete_dae"] else None
+    if staging is not None:
+        dae_temp_path = staging.path_for(load_filepath)
+    else:
+        from pathlib import Path
+        path_start = Path(load_filepath)
+        dae_temp_path = str(Path(str(path_start.with_suffix("")) + "-temp.dae"))
 
     if gr2_conform_enabled and conform_skeleton_path is not None and os.path.isfile(conform_skeleton_path):
-        gr2_options_str = "-e conform -e conform-copy --conform-path \"{}\"".format(conform_skeleton_path)
+        gr2_options_str = converter.conform_options(conform_skeleton_path)
     else:
         gr2_options_str = ""
 
-    proccess_args = "{} --loglevel all -g dos2de -s \"{}\" -d \"{}\" -i gr2 -o dae -a convert-model {}".format(
-        divine_exe, load_filepath, dae_temp_path, gr2_options_str)
+    proccess_args = converter.divine_command(divine_path, load_filepath, dae_temp_path, gr2_options_str, log_level=args["gr2_log_level"])
+
+    job = converter.ConversionJob(load_filepath, dae_temp_path, proccess_args)
+    job.options = gr2_options_str
 
-    print("Starting GR2->DAE conversion using divine.exe.")
-    print("Sending command: {}".format(proccess_args))
+    conversion_cache = get_conversion_cache(context)
+    if conversion_cache is not None:
+        job.cache_key = conversion_cache.key(load_filepath, conform_skeleton_path if gr2_options_str != "" else "",
+            cache.converter_version(divine_path), gr2_options_str.replace(conform_skeleton_path or "", ""))
+        job.cached_path = conversion_cache.lookup(job.cache_key)
+        print("[DOS2DE-Importer] Conversion cache {} for '{}' (hits: {}, misses: {}).".format(
+            "hit" if job.cached_path is not None else "miss", load_filepath, conversion_cache.hits, conversion_cache.misses))
+    return job
 
-    process = subprocess.run(proccess_args, 
-        stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+def finish_granny_conversion(operator, context, job, **args):
+    delete_dae = args["gr2_delete_dae"]
+    load_filepath = job.source_path
+    dae_temp_path = job.output_path
 
-    print(process.stdout)
+    if job.cached_path is not None:
+        try:
+            return import_collada(operator, context, load_filepath=job.cached_path, source_filepath=load_filepath, **args)
+        finally:
+            if cache.conversion_cache is not None:
+                cache.conversion_cache.release(job.cached_path)
 
-    if process.returncode != 0:
+    if job.returncode != 0:
         #raise Exception("Error converting DAE to GR2: \"{}\"{}".format(process.stderr, process.stdout))
-        error_message = "[DOS2DE-Importer] [ERROR:{}] Error converting GR2 to DAE. {}".format(process.returncode, '\n'.join(process.stdout.splitlines()[-1:]))
+        error_message = "[DOS2DE-Importer] [ERROR:{}] Error converting GR2 to DAE. {}".format(job.returncode, job.error_message())
         operator.report({"ERROR"}, error_message)
+        print("[DOS2DE-Importer] Last converter output:\n{}\n{}".format(job.output, job.errors))
         print(error_message)
+        staging = get_staging_area(context)
+        if staging is not None:
+            staging.remove(dae_temp_path)
     else:
+        conversion_cache = get_conversion_cache(context)
+        if conversion_cache is not None and job.cache_key is not None and os.path.isfile(dae_temp_path):
+            cached_path = conversion_cache.store(job.cache_key, dae_temp_path, move=delete_dae)
+            print("[DOS2DE-Importer] Importing cached dae file: '{}'.".format(cached_path))
+            try:
+                return import_collada(operator, context, load_filepath=cached_path, source_filepath=load_filepath, **args)
+            finally:
+                conversion_cache.release(cached_path)
+
         #Deleta .dae
         print("[DOS2DE-Importer] Importing temp dae file: '{}'.".format(dae_temp_path))
-        if import_collada(operator, context, load_filepath=dae_temp_path, rename_temp=True, **args):
-            if delete_dae:
-                print("[DOS2DE-Importer] Deleting temp file: '{}'.".format(dae_temp_path))
-                if os.path.isfile(dae_temp_path):
+        imported = False
+        try:
+            imported = import_collada(operator, context, load_filepath=dae_temp_path, rename_temp=True, source_filepath=load_filepath, **args)
+        finally:
+            if delete_dae or not imported:
+                staging = get_staging_area(context)
+                if staging is not None:
+                    staging.remove(dae_temp_path)
+                elif delete_dae and os.path.isfile(dae_temp_path):
+                    print("[DOS2DE-Importer] Deleting temp file: '{}'.".format(dae_temp_path))
                     os.remove(dae_temp_path)
+        if imported:
             return True
         else:
             print("Failed?")
     return False
 
+def import_granny(operator, context, load_filepath, divine_path, **args):
+    job = prepare_granny_conversion(context, load_filepath, divine_path, **args)
+    if job.cached_path is None:
+        print("Starting GR2->DAE conversion using divine.exe.")
+        print("Sending command: {}".format(job.command))
+        get_converter_backend(context).convert(job)
+    return finish_granny_conversion(operator, context, job, **args)
+
+def use_native_reader(**args):
+    # Conforming needs divine.exe, everything else can be read natively when the sections are uncompressed
+    return args["gr2_native_reader"] and not args["gr2_conform_enabled"]
+
+def try_import_granny_native(operator, context, load_filepath, **args):
+    try:
+        return import_granny_native(operator, context, load_filepath, **args)
+    except granny.GR2Error as e:
+        print("[DOS2DE-Importer] Native GR2 reader skipped '{}': {}".format(load_filepath, e))
+    return None
+
 def import_start(operator, context, load_filepath, divine_path, **args):
+    # Textures are read while the file converts and imports
+    preload_textures(context, [load_filepath], **args)
+    try:
+        return import_file(operator, context, load_filepath, divine_path, **args)
+    finally:
+        clear_preloaded_textures(context)
+        release_conversion_cache()
+
+def import_file(operator, context, load_filepath, divine_path, **args):
     name = os.path.split(load_filepath)[-1].split(".")[0]
     parts = os.path.splitext(load_filepath)
     ext = parts[1].lower()
 
     print("[DOS2DE-Importer] Importing file: '{}'.".format(load_filepath))
 
-    # Ignore current armatures when renaming actions
-    ignored_objects = list(filter(lambda obj: obj.type == "ARMATURE", context.scene.objects.values()))
-    #print("[DOS2DE-Importer] Ignored Objects {}".format(len(ignored_objects)))
     if ext == ".dae":
         return import_collada(operator, context, load_filepath, **args)
     elif ext == ".gr2":
+        if use_native_reader(**args):
+            result = try_import_granny_native(operator, context, load_filepath, **args)
+            if result is not None:
+                return result
 
         if divine_path != "" and os.path.isfile(divine_path):
             return import_granny(operator, context, load_filepath, divine_path, **args)
@@ -1033,6 +2139,91 @@ def import_start(operator, context, load_filepath, divine_path, **args):
         return False
     return True
 
+def import_files(operator, context, filepaths, divine_path, max_workers=1, use_batch=False, **args):
+    """Import several files, converting gr2 files on a pool of divine.exe processes while the main thread imports"""
+    divine_found = divine_path != "" and os.path.isfile(divine_path)
+    native_files = []
+    convert_files = []
+    for filepath in filepaths:
+        ext = os.path.splitext(filepath)[1].lower()
+        if ext == ".gr2" and not (use_native_reader(**args) and granny.is_supported(filepath)):
+            convert_files.append(filepath)
+        else:
+            native_files.append(filepath)
+
+    window_manager = context.window_manager
+    total = max(1, len(filepaths))
+    finished = [0]
+    running = {}
+
+    def update_progress():
+        window_manager.progress_update(100.0 * (finished[0] + sum(running.values())) / total)
+
+    def on_progress(job, fraction, message):
+        running[job.source_path] = fraction
+        print("[DOS2DE-Importer] {} '{}'".format(message, job.source_path))
+        update_progress()
+
+    def file_done(filepath):
+        running.pop(filepath, None)
+        finished[0] += 1
+        update_progress()
+
+    backend = get_converter_backend(context)
+    reset_import_batch()
+    preload_textures(context, filepaths, **args)
+    window_manager.progress_begin(0, 100)
+    try:
+        with converter.ConversionPool(max_workers, backend, on_progress) as pool:
+            def submit(filepath):
+                if not divine_found:
+                    operator.report({"ERROR"}, "[DOS2DE-Importer] Failed to find divine.exe at path: '{}'. Canceling GR2 import.".format(divine_path))
+                    file_done(filepath)
+                    return
+                job = prepare_granny_conversion(context, filepath, divine_path, **args)
+                if job.cached_path is None:
+                    print("[DOS2DE-Importer] Queued GR2->DAE conversion: {}".format(job.command))
+                pool.submit(job)
+
+            if use_batch and backend.supports_batch and divine_found and len(convert_files) > 1:
+                pending = []
+                for filepath in convert_files:
+                    job = prepare_granny_conversion(context, filepath, divine_path, **args)
+                    if job.cached_path is not None:
+                        pool.submit(job)
+                    else:
+                        pending.append(job)
+                batches, singles = prepare_granny_batches(pending, divine_path, max_workers, args["gr2_log_level"], get_staging_area(context))
+                for batch in batches:
+                    print("[DOS2DE-Importer] Queued batch GR2->DAE conversion of {} files: {}".format(len(batch.jobs), batch.command))
+                    pool.submit_batch(batch)
+                for job in singles:
+                    print("[DOS2DE-Importer] Queued GR2->DAE conversion: {}".format(job.command))
+                    pool.submit(job)
+            else:
+                for filepath in convert_files:
+                    submit(filepath)
+
+            for filepath in native_files:
+                if os.path.splitext(filepath)[1].lower() == ".gr2":
+                    print("[DOS2DE-Importer] Importing file: '{}'.".format(filepath))
+                    if try_import_granny_native(operator, context, filepath, **args) is None:
+                        submit(filepath)
+                        continue
+                else:
+                    import_file(operator, context, filepath, divine_path, **args)
+                file_done(filepath)
+
+            for job in pool.completed():
+                print("[DOS2DE-Importer] Importing file: '{}'.".format(job.source_path))
+                finish_granny_conversion(operator, context, job, **args)
+                file_done(job.source_path)
+    finally:
+        clear_preloaded_textures(context)
+        release_conversion_cache()
+        reset_import_batch()
+        window_manager.progress_end()
+
 class DOS2DEImporter_FileSelectorOperator(bpy.types.Operator):
     bl_idname = "dos2deimporter.op_fileselector"
     bl_label = "Select File"
@@ -1136,6 +2327,7 @@ class ImportDivinityCollada(bpy.types.Operator, ImportHelper):
             settings.directory = directory
 
             divine_path = ""
+            preferences = None
 
             print(context.preferences.addons)
             if "io_scene_gr2" in context.preferences.addons:
@@ -1145,10 +2337,14 @@ class ImportDivinityCollada(bpy.types.Operator, ImportHelper):
 
                     divine_path = preferences.divine_path
 
-            for file_elem in self.files:
-                filepath = os.path.join(directory, file_elem.name)
-                #print("Selected file: {}".format(filepath))
-                import_start(self, context, filepath, divine_path, **keywords)
+            max_workers = 1
+            use_batch = False
+            if preferences is not None:
+                max_workers = preferences.conversion_workers
+                use_batch = preferences.use_batch_conversion
+
+            filepaths = [os.path.join(directory, file_elem.name) for file_elem in self.files]
+            import_files(self, context, filepaths, divine_path, max_workers=max_workers, use_batch=use_batch, **keywords)
 
             if(len(selection) > 0):
                 for obj in selection:
@@ -1180,6 +2376,7 @@ classes = (
     NODE_PT_dos2de_material_helpers,
     DOS2DEImporter_FileSelectorOperator,
     DOS2DEImporter_GR2_AddConformPath,
+    DOS2DEImporter_OT_clear_conversion_cache,
     ImportDivinityCollada,
 )
 
@@ -1194,11 +2391,17 @@ def register():
             name="DOS2DE Import Settings",
             description="Persistent settings saved between imports for this specific scene"
         )
+        bpy.app.handlers.save_pre.append(link_decoded_images)
 
     except: traceback.print_exc()
 
 def unregister():
     try: 
+        close_converter_backend()
+        cleanup_staging_area()
+        close_image_preloader()
+        if link_decoded_images in bpy.app.handlers.save_pre:
+            bpy.app.handlers.save_pre.remove(link_decoded_images)
         bpy.types.TOPBAR_MT_file_import.remove(menu_func_import)
 
         for cls in classes:
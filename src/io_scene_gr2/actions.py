@@ -0,0 +1,154 @@
+import numpy as np
+
+# Post-processing of imported actions on whole keyframe arrays.
+# Keyframes are read with foreach_get, changed with numpy and written back with foreach_set.
+# Curves that lose or gain keys are recreated, as keyframe_points can't be truncated in place.
+
+class Keyframes():
+    def __init__(self, co, handle_left, handle_right):
+        self.co = co
+        self.handle_left = handle_left
+        self.handle_right = handle_right
+
+    def __len__(self):
+        return len(self.co)
+
+    def select(self, mask):
+        return Keyframes(self.co[mask], self.handle_left[mask], self.handle_right[mask])
+
+def read_keyframes(fcurve):
+    points = fcurve.keyframe_points
+    count = len(points)
+    arrays = []
+    for name in ("co", "handle_left", "handle_right"):
+        values = np.empty(count * 2, dtype=np.float32)
+        points.foreach_get(name, values)
+        arrays.append(values.reshape(count, 2))
+    return Keyframes(*arrays)
+
+def write_keyframes(fcurve, keyframes):
+    points = fcurve.keyframe_points
+    points.foreach_set("co", keyframes.co.ravel())
+    points.foreach_set("handle_left", keyframes.handle_left.ravel())
+    points.foreach_set("handle_right", keyframes.handle_right.ravel())
+    fcurve.update()
+
+def offset_keyframes(keyframes, offset):
+    for array in (keyframes.co, keyframes.handle_left, keyframes.handle_right):
+        array[:, 0] += offset
+
+def clean_mask(co, threshold):
+    """Keys to keep so that linear interpolation between kept keys stays within threshold of every removed key"""
+    count = len(co)
+    keep = np.zeros(count, dtype=bool)
+    if count == 0:
+        return keep
+    x = co[:, 0].astype(np.float64)
+    y = co[:, 1].astype(np.float64)
+    keep[0] = True
+    if np.all(np.abs(y - y[0]) <= threshold):
+        # Flat curve, a single key holds the value
+        return keep
+    keep[-1] = True
+    # Top-down split: every span that strays too far keeps its worst key, all spans at once per pass
+    while True:
+        kept = np.flatnonzero(keep)
+        error = np.abs(np.interp(x, x[kept], y[kept]) - y)
+        if not np.any(error > threshold):
+            break
+        span_max = np.maximum.reduceat(error[:-1], kept[:-1])
+        span = np.repeat(np.arange(len(kept) - 1), np.diff(kept))
+        worst = np.flatnonzero((error[:-1] == span_max[span]) & (error[:-1] > threshold))
+        # Keep the first worst key of each span
+        worst = worst[np.r_[True, span[worst][1:] != span[worst][:-1]]]
+        keep[worst] = True
+    return keep
+
+def resample_keyframes(keyframes, step):
+    """Linear resampling to keys every step frames, from the first to the last key"""
+    co = keyframes.co
+    if len(co) < 2:
+        return keyframes
+    start, end = float(co[0, 0]), float(co[-1, 0])
+    count = int(np.floor((end - start) / step + 1e-6)) + 1
+    frames = start + step * np.arange(count, dtype=np.float64)
+    if end - frames[-1] > step * 1e-6:
+        # The range isn't a multiple of step, the last key is kept as it is
+        frames = np.append(frames, end)
+    frames[-1] = end
+    values = np.interp(frames, co[:, 0], co[:, 1])
+    new_co = np.stack((frames, values), axis=-1).astype(np.float32)
+    return Keyframes(new_co, new_co.copy(), new_co.copy())
+
+def default_value(fcurve):
+    if fcurve.data_path.endswith("scale"):
+        return 1.0
+    if fcurve.data_path.endswith("rotation_quaternion") and fcurve.array_index == 0:
+        return 1.0
+    return 0.0
+
+def rebuild_fcurve(action, fcurve, keyframes, interpolation=None):
+    """Replace fcurve with a new curve holding keyframes, returns the new curve"""
+    data_path = fcurve.data_path
+    array_index = fcurve.array_index
+    group = fcurve.group.name if fcurve.group is not None else ""
+    extrapolation = fcurve.extrapolation
+    if interpolation is None:
+        interpolation = fcurve.keyframe_points[0].interpolation if len(fcurve.keyframe_points) > 0 else "BEZIER"
+    action.fcurves.remove(fcurve)
+    fcurve = new_fcurve(action, data_path, array_index, group, keyframes, interpolation)
+    fcurve.extrapolation = extrapolation
+    return fcurve
+
+def new_fcurve(action, data_path, array_index, group, keyframes, interpolation="LINEAR"):
+    fcurve = action.fcurves.new(data_path, index=array_index, action_group=group)
+    points = fcurve.keyframe_points
+    points.add(len(keyframes))
+    if len(points) > 0 and points[0].interpolation != interpolation:
+        for point in points:
+            point.interpolation = interpolation
+    write_keyframes(fcurve, keyframes)
+    return fcurve
+
+def sampled_keyframes(frames, values, tolerance=1e-6):
+    """Keyframes for values sampled at frames, a single key when the values never change"""
+    if len(values) > 1 and np.all(np.abs(values - values[0]) <= tolerance):
+        frames = frames[:1]
+        values = values[:1]
+    co = np.stack((frames, values), axis=-1).astype(np.float32)
+    return Keyframes(co, co.copy(), co.copy())
+
+class ActionStats():
+    def __init__(self):
+        self.curves = 0
+        self.keys_before = 0
+        self.keys_after = 0
+        self.removed_curves = 0
+
+def process_action(action, offset=0.0, clean_threshold=None, clean_channels=False, resample_step=None):
+    stats = ActionStats()
+    for fcurve in list(action.fcurves):
+        keyframes = read_keyframes(fcurve)
+        stats.curves += 1
+        stats.keys_before += len(keyframes)
+        if len(keyframes) == 0:
+            continue
+        count = len(keyframes)
+        interpolation = None
+        if offset != 0.0:
+            offset_keyframes(keyframes, offset)
+        if resample_step is not None and resample_step > 0:
+            keyframes = resample_keyframes(keyframes, resample_step)
+            interpolation = "LINEAR"
+        if clean_threshold is not None:
+            keyframes = keyframes.select(clean_mask(keyframes.co, clean_threshold))
+            if clean_channels and len(keyframes) == 1 and abs(keyframes.co[0, 1] - default_value(fcurve)) <= clean_threshold:
+                action.fcurves.remove(fcurve)
+                stats.removed_curves += 1
+                continue
+        stats.keys_after += len(keyframes)
+        if len(keyframes) == count and interpolation is None:
+            write_keyframes(fcurve, keyframes)
+        else:
+            rebuild_fcurve(action, fcurve, keyframes, interpolation)
+    return stats
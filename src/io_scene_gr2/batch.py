@@ -0,0 +1,285 @@
+import argparse
+import importlib
+import json
+import os
+import subprocess
+import sys
+import time
+import types
+
+# Headless bulk conversion of whole gr2 asset trees.
+#
+# Inside Blender every file goes through import_start with the scene's importer settings and is saved as a .blend:
+#   blender -b --addons io_scene_gr2 -P batch.py -- <source dir> <output dir> [options]
+# As a plain Python script every file is converted to .dae with divine.exe, without bpy:
+#   python batch.py <source dir> <output dir> --divine <path to divine.exe> [options]
+#
+# Finished files are appended to manifest-<shard>.jsonl in the output directory as they complete,
+# so an interrupted run picks up where it stopped with --resume. manifest.json holds the merged result.
+
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+PACKAGE_NAME = __package__ or os.path.basename(PACKAGE_DIR)
+MANIFEST_NAME = "manifest.json"
+
+try:
+    import bpy
+except ImportError:
+    bpy = None
+
+def load_package():
+    if PACKAGE_NAME in sys.modules:
+        return sys.modules[PACKAGE_NAME]
+    if bpy is not None:
+        parent_dir = os.path.dirname(PACKAGE_DIR)
+        if parent_dir not in sys.path:
+            sys.path.insert(0, parent_dir)
+        package = importlib.import_module(PACKAGE_NAME)
+        if not hasattr(bpy.types.Scene, "dos2de_importer_settings"):
+            package.register()
+        return package
+    # Without bpy the add-on's __init__.py can't run. A bare package is enough for the bpy-free modules.
+    package = types.ModuleType(PACKAGE_NAME)
+    package.__path__ = [PACKAGE_DIR]
+    package.__file__ = os.path.join(PACKAGE_DIR, "__init__.py")
+    sys.modules[PACKAGE_NAME] = package
+    return package
+
+def find_files(source_dir, extensions=(".gr2",)):
+    files = []
+    for root, dirs, filenames in os.walk(source_dir):
+        dirs.sort()
+        for filename in sorted(filenames):
+            if os.path.splitext(filename)[1].lower() in extensions:
+                files.append(os.path.relpath(os.path.join(root, filename), source_dir))
+    return files
+
+def output_path_for(output_dir, relative_path, extension):
+    return os.path.join(output_dir, os.path.splitext(relative_path)[0] + extension)
+
+def parse_shard(value):
+    index, count = value.split("/")
+    index, count = int(index), int(count)
+    if count < 1 or index < 0 or index >= count:
+        raise argparse.ArgumentTypeError("Shard must be <index>/<count> with 0 <= index < count")
+    return index, count
+
+def shard_manifest_path(output_dir, shard):
+    return os.path.join(output_dir, "manifest-{}.jsonl".format(shard[0] if shard is not None else "main"))
+
+def read_manifest(output_dir):
+    """Merge manifest.json and every shard manifest, later entries for a file replace earlier ones"""
+    entries = {}
+    merged_path = os.path.join(output_dir, MANIFEST_NAME)
+    if os.path.isfile(merged_path):
+        try:
+            with open(merged_path, "r", encoding="utf-8") as f:
+                entries.update(json.load(f).get("files", {}))
+        except (OSError, ValueError):
+            pass
+    if os.path.isdir(output_dir):
+        for filename in sorted(os.listdir(output_dir)):
+            if filename.startswith("manifest-") and filename.endswith(".jsonl"):
+                with open(os.path.join(output_dir, filename), "r", encoding="utf-8") as f:
+                    for line in f:
+                        try:
+                            entry = json.loads(line)
+                        except ValueError:
+                            # A line cut short by an interruption
+                            continue
+                        entries[entry["source"]] = entry
+    return entries
+
+def write_manifest(source_dir, output_dir):
+    entries = read_manifest(output_dir)
+    manifest = {
+        "source_dir": os.path.abspath(source_dir),
+        "output_dir": os.path.abspath(output_dir),
+        "succeeded": sum(1 for e in entries.values() if e["status"] == "ok"),
+        "failed": sum(1 for e in entries.values() if e["status"] != "ok"),
+        "files": entries,
+    }
+    merged_path = os.path.join(output_dir, MANIFEST_NAME)
+    with open(merged_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(merged_path + ".tmp", merged_path)
+    for filename in os.listdir(output_dir):
+        if filename.startswith("manifest-") and filename.endswith(".jsonl"):
+            os.remove(os.path.join(output_dir, filename))
+    return manifest
+
+def clear_manifest(output_dir):
+    for filename in os.listdir(output_dir):
+        if filename == MANIFEST_NAME or (filename.startswith("manifest-") and filename.endswith(".jsonl")):
+            os.remove(os.path.join(output_dir, filename))
+
+def pending_files(files, output_dir, resume):
+    if not resume:
+        return files
+    entries = read_manifest(output_dir)
+    pending = []
+    for relative_path in files:
+        entry = entries.get(relative_path)
+        if entry is not None and entry["status"] == "ok" and os.path.isfile(os.path.join(output_dir, entry["output"])):
+            continue
+        pending.append(relative_path)
+    return pending
+
+class BatchReporter():
+    """Stands in for the import operator, collecting the errors import_start reports"""
+
+    def __init__(self):
+        self.errors = []
+
+    def report(self, type, message):
+        print(message)
+        if "ERROR" in type:
+            self.errors.append(message)
+
+def parse_value(current, value):
+    if isinstance(current, bool):
+        return value.lower() in ("1", "true", "yes", "on")
+    elif isinstance(current, int):
+        return int(value)
+    elif isinstance(current, float):
+        return float(value)
+    return value
+
+class BlenderConverter():
+    """Imports every file into an empty scene with import_start and saves the result as a .blend"""
+    extension = ".blend"
+
+    def __init__(self, package, options):
+        self.package = package
+        self.overrides = options.set or []
+        self.divine_path = options.divine
+        if self.divine_path is None:
+            preferences = package.get_preferences(bpy.context)
+            self.divine_path = preferences.divine_path if preferences is not None else ""
+
+    def settings(self):
+        settings = bpy.context.scene.dos2de_importer_settings
+        for override in self.overrides:
+            name, value = override.split("=", 1)
+            setattr(settings, name, parse_value(getattr(settings, name), value))
+        return settings
+
+    def convert(self, source_path, output_path):
+        bpy.ops.wm.read_homefile(use_empty=True)
+        self.package.reset_import_batch()
+        keywords = self.settings().as_keywords()
+        reporter = BatchReporter()
+        result = self.package.import_start(reporter, bpy.context, source_path, self.divine_path, **keywords)
+        if not result or len(reporter.errors) > 0:
+            return "\n".join(reporter.errors) or "Import failed"
+        temp_path = output_path + ".tmp"
+        bpy.ops.wm.save_as_mainfile(filepath=temp_path, check_existing=False, copy=True)
+        os.replace(temp_path, output_path)
+        return None
+
+class DivineConverter():
+    """Converts every file to .dae with divine.exe, no Blender needed"""
+    extension = ".dae"
+
+    def __init__(self, package, options):
+        self.converter = importlib.import_module(PACKAGE_NAME + ".converter")
+        self.divine_path = options.divine or ""
+        self.options = self.converter.conform_options(options.conform) if options.conform else ""
+        self.log_level = options.log_level
+
+    def convert(self, source_path, output_path):
+        if not os.path.isfile(self.divine_path):
+            return "Failed to find divine.exe at path: '{}'".format(self.divine_path)
+        command = self.converter.divine_command(self.divine_path, source_path, output_path, self.options, log_level=self.log_level)
+        job = self.converter.run_conversion(self.converter.ConversionJob(source_path, output_path, command))
+        if job.returncode != 0 or not os.path.isfile(output_path):
+            if os.path.isfile(output_path):
+                os.remove(output_path)
+            return job.error_message() or "Converter exited with code {}".format(job.returncode)
+        return None
+
+def run_shard(options, files):
+    package = load_package()
+    converter_type = BlenderConverter if bpy is not None and not options.dae else DivineConverter
+    file_converter = converter_type(package, options)
+    manifest_path = shard_manifest_path(options.output_dir, options.shard)
+    failed = 0
+    with open(manifest_path, "a", encoding="utf-8") as manifest:
+        for index, relative_path in enumerate(files):
+            source_path = os.path.join(options.source_dir, relative_path)
+            output_path = output_path_for(options.output_dir, relative_path, file_converter.extension)
+            os.makedirs(os.path.dirname(output_path), exist_ok=True)
+            print("[DOS2DE-Importer] [{}/{}] Converting '{}'.".format(index + 1, len(files), relative_path))
+            start = time.time()
+            try:
+                error = file_converter.convert(source_path, output_path)
+            except Exception as e:
+                error = "{}: {}".format(type(e).__name__, e)
+            entry = {
+                "source": relative_path,
+                "output": os.path.relpath(output_path, options.output_dir),
+                "status": "ok" if error is None else "failed",
+                "seconds": round(time.time() - start, 3),
+            }
+            if error is not None:
+                entry["error"] = error
+                failed += 1
+                print("[DOS2DE-Importer] [ERROR] '{}': {}".format(relative_path, error))
+            manifest.write(json.dumps(entry) + "\n")
+            manifest.flush()
+    return failed
+
+def shard_command(arguments, shard, count):
+    script_arguments = arguments + ["--shard", "{}/{}".format(shard, count), "--processes", "1"]
+    if bpy is not None:
+        return [bpy.app.binary_path, "-b", "--addons", PACKAGE_NAME, "-P", os.path.abspath(__file__), "--"] + script_arguments
+    return [sys.executable, os.path.abspath(__file__)] + script_arguments
+
+def run(arguments):
+    parser = argparse.ArgumentParser(description="Convert every gr2 file below a directory.")
+    parser.add_argument("source_dir")
+    parser.add_argument("output_dir")
+    parser.add_argument("--divine", default=None, help="Path to divine.exe. Defaults to the add-on preference inside Blender.")
+    parser.add_argument("--conform", default="", help="Skeleton to conform to, when converting to .dae without Blender.")
+    parser.add_argument("--log-level", default="warn", help="divine.exe log level.")
+    parser.add_argument("--set", action="append", metavar="NAME=VALUE", help="Override an importer setting, inside Blender.")
+    parser.add_argument("--dae", action="store_true", help="Write .dae files even when running inside Blender.")
+    parser.add_argument("--resume", action="store_true", help="Skip files the manifest lists as converted.")
+    parser.add_argument("--processes", type=int, default=1, help="Number of processes to split the files across.")
+    parser.add_argument("--shard", type=parse_shard, default=None, help="Only convert every count-th file, starting at index.")
+    options = parser.parse_args(arguments)
+    if not os.path.isdir(options.source_dir):
+        parser.error("source_dir '{}' is not a directory".format(options.source_dir))
+
+    os.makedirs(options.output_dir, exist_ok=True)
+    files = find_files(options.source_dir)
+
+    if options.shard is not None:
+        # Split the full listing, so every shard agrees on the split no matter what the others already finished
+        index, count = options.shard
+        return 1 if run_shard(options, pending_files(files[index::count], options.output_dir, options.resume)) > 0 else 0
+
+    if not options.resume:
+        clear_manifest(options.output_dir)
+    pending = pending_files(files, options.output_dir, options.resume)
+    count = max(1, min(options.processes, len(pending)))
+    print("[DOS2DE-Importer] Converting {} of {} files with {} process(es).".format(len(pending), len(files), count))
+    if count > 1:
+        child_arguments = [a for a in arguments if a != "--resume"] + ["--resume"]
+        processes = [subprocess.Popen(shard_command(child_arguments, shard, count)) for shard in range(count)]
+        for process in processes:
+            process.wait()
+    else:
+        run_shard(options, pending)
+
+    manifest = write_manifest(options.source_dir, options.output_dir)
+    print("[DOS2DE-Importer] Batch finished. {} succeeded, {} failed. Manifest: '{}'.".format(
+        manifest["succeeded"], manifest["failed"], os.path.join(options.output_dir, MANIFEST_NAME)))
+    return 1 if manifest["failed"] > 0 else 0
+
+def main():
+    # Blender passes the script's own arguments after "--"
+    arguments = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else sys.argv[1:]
+    sys.exit(run(arguments))
+
+if __name__ == "__main__":
+    main()
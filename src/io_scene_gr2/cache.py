@@ -0,0 +1,165 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+
+# On-disk cache of GR2 -> DAE conversion results.
+# Entries are keyed by the contents of everything that influences divine.exe's output,
+# and evicted least-recently-used first once the cache grows past its size budget.
+# Entries handed out by lookup() or store() are pinned until release(), so eviction never removes a file that is still being imported.
+
+CACHE_EXTENSION = ".dae"
+HASH_CHUNK_SIZE = 1024 * 1024
+
+def default_cache_dir():
+    return os.path.join(tempfile.gettempdir(), "io_scene_gr2_cache")
+
+def converter_version(divine_path):
+    if divine_path is None or divine_path == "" or not os.path.isfile(divine_path):
+        return ""
+    version = ""
+    settings_path = os.path.join(os.path.dirname(divine_path), "settings.json")
+    if os.path.isfile(settings_path):
+        try:
+            with open(settings_path, "r", encoding="utf-8") as f:
+                version = str(json.load(f).get("Version", ""))
+        except (OSError, ValueError):
+            pass
+    stat = os.stat(divine_path)
+    return "{}:{}:{}".format(version, stat.st_size, stat.st_mtime_ns)
+
+class ConversionCache():
+    def __init__(self, directory, max_size):
+        self.directory = directory
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.file_hashes = {}
+        self.pinned = {}
+
+    def file_hash(self, filepath):
+        stat = os.stat(filepath)
+        memo_key = (os.path.normcase(os.path.abspath(filepath)), stat.st_size, stat.st_mtime_ns)
+        digest = self.file_hashes.get(memo_key)
+        if digest is None:
+            h = hashlib.sha1()
+            with open(filepath, "rb") as f:
+                for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+                    h.update(chunk)
+            digest = h.hexdigest()
+            self.file_hashes[memo_key] = digest
+        return digest
+
+    def key(self, source_path, conform_path="", converter="", options=""):
+        h = hashlib.sha1()
+        h.update(self.file_hash(source_path).encode())
+        if conform_path is not None and conform_path != "" and os.path.isfile(conform_path):
+            h.update(b"conform:" + self.file_hash(conform_path).encode())
+        h.update(b"converter:" + converter.encode())
+        h.update(b"options:" + options.encode())
+        return h.hexdigest()
+
+    def entry_path(self, key):
+        return os.path.join(self.directory, key + CACHE_EXTENSION)
+
+    def lookup(self, key):
+        path = self.entry_path(key)
+        with self.lock:
+            if os.path.isfile(path):
+                try:
+                    os.utime(path, None)
+                except OSError:
+                    pass
+                self.hits += 1
+                self.pinned[path] = self.pinned.get(path, 0) + 1
+                return path
+            self.misses += 1
+        return None
+
+    def store(self, key, filepath, move=False):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.entry_path(key)
+        staging_path = "{}.{}.tmp".format(path, threading.get_ident())
+        if move:
+            shutil.move(filepath, staging_path)
+        else:
+            shutil.copyfile(filepath, staging_path)
+        os.replace(staging_path, path)
+        with self.lock:
+            self.pinned[path] = self.pinned.get(path, 0) + 1
+        self.evict()
+        return path
+
+    def release(self, path):
+        with self.lock:
+            count = self.pinned.get(path, 0) - 1
+            if count > 0:
+                self.pinned[path] = count
+            else:
+                self.pinned.pop(path, None)
+
+    def release_all(self):
+        with self.lock:
+            self.pinned.clear()
+
+    def entries(self):
+        if not os.path.isdir(self.directory):
+            return []
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and entry.name.endswith(CACHE_EXTENSION):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def size(self):
+        return sum(e[1] for e in self.entries())
+
+    def evict(self):
+        with self.lock:
+            entries = sorted(self.entries())
+            total = sum(e[1] for e in entries)
+            for mtime, size, path in entries:
+                if total <= self.max_size:
+                    break
+                if path in self.pinned:
+                    continue
+                try:
+                    os.remove(path)
+                    total -= size
+                except OSError:
+                    pass
+
+    def clear(self):
+        with self.lock:
+            for _, _, path in self.entries():
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            self.hits = 0
+            self.misses = 0
+
+conversion_cache = None
+
+def get_cache(directory="", max_size_mb=512):
+    global conversion_cache
+    if directory is None or directory == "":
+        directory = default_cache_dir()
+    directory = os.path.abspath(bpy_path_abs(directory))
+    if conversion_cache is None or conversion_cache.directory != directory:
+        conversion_cache = ConversionCache(directory, max_size_mb * 1024 * 1024)
+    else:
+        conversion_cache.max_size = max_size_mb * 1024 * 1024
+    return conversion_cache
+
+def bpy_path_abs(path):
+    # Blender paths may be relative to the .blend file ("//")
+    try:
+        import bpy
+        return bpy.path.abspath(path)
+    except ImportError:
+        return path
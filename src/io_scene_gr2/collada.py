@@ -0,0 +1,374 @@
+import xml.etree.ElementTree as ET
+
+import numpy as np
+
+# Streaming Collada reader.
+# The document is read with iterparse and each geometry, controller and animation is turned into NumPy
+# arrays as soon as its element ends, then the element is cleared. Geometries can be handed to a
+# callback right away, so only one geometry's XML and arrays are alive at a time.
+
+class ColladaError(ValueError):
+    pass
+
+def local_name(tag):
+    return tag.rsplit("}", 1)[-1]
+
+def children(elem, name):
+    return [child for child in elem if local_name(child.tag) == name]
+
+def child(elem, name):
+    for c in elem:
+        if local_name(c.tag) == name:
+            return c
+    return None
+
+def descendants(elem, name):
+    return [e for e in elem.iter() if local_name(e.tag) == name]
+
+def url_id(url):
+    return url[1:] if url is not None and url.startswith("#") else url
+
+def parse_floats(text, dtype=np.float32):
+    if text is None:
+        return np.zeros(0, dtype=dtype)
+    return np.fromstring(text, dtype=dtype, sep=" ")
+
+def parse_ints(text):
+    if text is None:
+        return np.zeros(0, dtype=np.int64)
+    return np.fromstring(text, dtype=np.int64, sep=" ")
+
+def parse_matrix(text):
+    values = parse_floats(text, np.float64)
+    if len(values) != 16:
+        raise ColladaError("Matrix with {} values".format(len(values)))
+    # Collada writes matrices row by row
+    return values.reshape(4, 4)
+
+class Source():
+    def __init__(self, values, stride):
+        self.values = values
+        self.stride = stride
+
+    def rows(self):
+        if isinstance(self.values, list):
+            return self.values
+        return self.values.reshape(-1, self.stride)
+
+def read_sources(elem):
+    sources = {}
+    for source in children(elem, "source"):
+        accessor = None
+        technique = child(source, "technique_common")
+        if technique is not None:
+            accessor = child(technique, "accessor")
+        stride = int(accessor.get("stride", "1")) if accessor is not None else 1
+        values = None
+        for array in source:
+            name = local_name(array.tag)
+            if name == "float_array":
+                values = parse_floats(array.text)
+            elif name in ("Name_array", "IDREF_array"):
+                values = (array.text or "").split()
+        if values is not None:
+            sources[source.get("id")] = Source(values, stride)
+    return sources
+
+def read_inputs(elem):
+    """(semantic, offset, source id, set) of the <input> children"""
+    return [(i.get("semantic"), int(i.get("offset", "0")), url_id(i.get("source")), int(i.get("set", "0")))
+        for i in children(elem, "input")]
+
+def fan_triangles(counts):
+    """Corner indices that split polygons with counts corners into triangle fans"""
+    counts = np.asarray(counts, dtype=np.int64)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    triangles = np.maximum(counts - 2, 0)
+    polygon = np.repeat(np.arange(len(counts)), triangles)
+    # Index of each triangle within its polygon
+    step = np.arange(len(polygon)) - np.repeat(np.cumsum(triangles) - triangles, triangles)
+    first = starts[polygon]
+    return np.stack((first, first + step + 1, first + step + 2), axis=-1).reshape(-1)
+
+class Geometry():
+    def __init__(self, id, name, positions, indices, normals=None, uvs=None, material_indices=None, materials=()):
+        self.id = id
+        self.name = name
+        self.positions = positions
+        # Per corner arrays: position index, normal and uv of every triangle corner
+        self.indices = indices
+        self.normals = normals
+        self.uvs = uvs
+        self.material_indices = material_indices
+        # Material symbols, in material index order
+        self.materials = list(materials)
+
+def read_geometry(elem):
+    mesh = child(elem, "mesh")
+    if mesh is None:
+        return None
+    sources = read_sources(mesh)
+    vertices = child(mesh, "vertices")
+    if vertices is None:
+        raise ColladaError("Geometry '{}' has no vertices".format(elem.get("id")))
+    vertex_inputs = {semantic: source for semantic, _, source, _ in read_inputs(vertices)}
+    if "POSITION" not in vertex_inputs:
+        raise ColladaError("Geometry '{}' has no positions".format(elem.get("id")))
+    positions = sources[vertex_inputs["POSITION"]].rows()
+    vertex_normals = sources[vertex_inputs["NORMAL"]].rows() if "NORMAL" in vertex_inputs else None
+
+    indices = []
+    normals = []
+    uvs = []
+    material_indices = []
+    materials = []
+    for primitive in mesh:
+        kind = local_name(primitive.tag)
+        if kind not in ("triangles", "polylist", "polygons"):
+            if kind in ("lines", "linestrips", "trifans", "tristrips"):
+                raise ColladaError("Unsupported <{}> primitive in geometry '{}'".format(kind, elem.get("id")))
+            continue
+        inputs = read_inputs(primitive)
+        stride = max(offset for _, offset, _, _ in inputs) + 1
+        if kind == "polygons":
+            polygons = [parse_ints(p.text) for p in children(primitive, "p")]
+            p = np.concatenate(polygons) if len(polygons) > 0 else np.zeros(0, dtype=np.int64)
+            corners = fan_triangles([len(polygon) // stride for polygon in polygons])
+        else:
+            p = parse_ints(child(primitive, "p").text if child(primitive, "p") is not None else None)
+            if kind == "polylist":
+                corners = fan_triangles(parse_ints(child(primitive, "vcount").text))
+            else:
+                corners = np.arange(len(p) // stride)
+        p = p[:len(p) - len(p) % stride].reshape(-1, stride)[corners]
+
+        uv_set = min((s for semantic, _, _, s in inputs if semantic == "TEXCOORD"), default=None)
+        primitive_normals = None
+        primitive_uvs = None
+        for semantic, offset, source, input_set in inputs:
+            if semantic == "VERTEX":
+                indices.append(p[:, offset])
+                if vertex_normals is not None:
+                    primitive_normals = vertex_normals[p[:, offset]]
+            elif semantic == "NORMAL":
+                primitive_normals = sources[source].rows()[p[:, offset]]
+            elif semantic == "TEXCOORD" and input_set == uv_set:
+                primitive_uvs = sources[source].rows()[p[:, offset], :2]
+        normals.append(primitive_normals)
+        uvs.append(primitive_uvs)
+        material_indices.append(np.full(len(p) // 3, len(materials), dtype=np.int32))
+        materials.append(primitive.get("material"))
+
+    if len(indices) == 0:
+        return None
+    normals = np.concatenate(normals) if all(n is not None for n in normals) else None
+    uvs = np.concatenate(uvs) if all(u is not None for u in uvs) else None
+    return Geometry(elem.get("id"), elem.get("name") or elem.get("id"), positions, np.concatenate(indices),
+        normals=normals, uvs=uvs, material_indices=np.concatenate(material_indices), materials=materials)
+
+class Skin():
+    def __init__(self, id, source, bind_shape, joints, inverse_bind, vertices, joint_indices, weights):
+        self.id = id
+        self.source = source
+        self.bind_shape = bind_shape
+        self.joints = joints
+        self.inverse_bind = inverse_bind
+        # One entry per influence
+        self.vertices = vertices
+        self.joint_indices = joint_indices
+        self.weights = weights
+
+def read_controller(elem):
+    skin = child(elem, "skin")
+    if skin is None:
+        return None
+    sources = read_sources(skin)
+    bind_shape_elem = child(skin, "bind_shape_matrix")
+    bind_shape = parse_matrix(bind_shape_elem.text) if bind_shape_elem is not None else np.eye(4)
+
+    joints = []
+    inverse_bind = np.zeros((0, 4, 4))
+    for semantic, _, source, _ in read_inputs(child(skin, "joints")):
+        if semantic == "JOINT":
+            joints = sources[source].rows()
+        elif semantic == "INV_BIND_MATRIX":
+            inverse_bind = sources[source].values.astype(np.float64).reshape(-1, 4, 4)
+
+    vertex_weights = child(skin, "vertex_weights")
+    inputs = read_inputs(vertex_weights)
+    stride = max(offset for _, offset, _, _ in inputs) + 1
+    counts = parse_ints(child(vertex_weights, "vcount").text)
+    v = parse_ints(child(vertex_weights, "v").text)
+    v = v[:len(v) - len(v) % stride].reshape(-1, stride)
+    vertices = np.repeat(np.arange(len(counts)), counts)[:len(v)]
+    joint_indices = np.zeros(len(v), dtype=np.int64)
+    weights = np.ones(len(v), dtype=np.float32)
+    for semantic, offset, source, _ in inputs:
+        if semantic == "JOINT":
+            joint_indices = v[:, offset]
+        elif semantic == "WEIGHT":
+            weights = sources[source].values[v[:, offset]]
+    return Skin(elem.get("id"), url_id(skin.get("source")), bind_shape, joints, inverse_bind, vertices, joint_indices, weights)
+
+class Node():
+    def __init__(self, id, name, sid, type, matrix, parent):
+        self.id = id
+        self.name = name
+        self.sid = sid
+        self.type = type
+        self.matrix = matrix
+        self.parent = parent
+        # (kind, url, {material symbol: material id}) of instance_geometry and instance_controller children
+        self.instances = []
+
+def node_matrix(elem):
+    matrix = np.eye(4)
+    for transform in elem:
+        name = local_name(transform.tag)
+        if name == "matrix":
+            matrix = matrix @ parse_matrix(transform.text)
+        elif name == "translate":
+            step = np.eye(4)
+            step[:3, 3] = parse_floats(transform.text, np.float64)[:3]
+            matrix = matrix @ step
+        elif name == "scale":
+            step = np.eye(4)
+            step[[0, 1, 2], [0, 1, 2]] = parse_floats(transform.text, np.float64)[:3]
+            matrix = matrix @ step
+        elif name == "rotate":
+            x, y, z, angle = parse_floats(transform.text, np.float64)[:4]
+            axis = np.array((x, y, z)) / max(np.linalg.norm((x, y, z)), 1e-12)
+            k = np.array(((0.0, -axis[2], axis[1]), (axis[2], 0.0, -axis[0]), (-axis[1], axis[0], 0.0)))
+            radians = np.radians(angle)
+            step = np.eye(4)
+            step[:3, :3] = np.eye(3) + np.sin(radians) * k + (1.0 - np.cos(radians)) * (k @ k)
+            matrix = matrix @ step
+    return matrix
+
+def read_nodes(elem, parent, nodes):
+    for node_elem in children(elem, "node"):
+        node = Node(node_elem.get("id"), node_elem.get("name") or node_elem.get("id"), node_elem.get("sid"),
+            node_elem.get("type", "NODE"), node_matrix(node_elem), parent)
+        nodes.append(node)
+        for instance in node_elem:
+            kind = local_name(instance.tag)
+            if kind in ("instance_geometry", "instance_controller"):
+                bindings = {m.get("symbol"): url_id(m.get("target")) for m in descendants(instance, "instance_material")}
+                node.instances.append((kind, url_id(instance.get("url")), bindings))
+        read_nodes(node_elem, len(nodes) - 1, nodes)
+    return nodes
+
+class Channel():
+    def __init__(self, target, times, matrices):
+        self.target = target
+        self.times = times
+        self.matrices = matrices
+
+def read_animation(elem):
+    """Matrix channels of an <animation> and the ones nested in it, plus the number of channels skipped"""
+    channels = []
+    skipped = 0
+    sources = {}
+    samplers = {}
+    for animation in elem.iter():
+        if local_name(animation.tag) != "animation":
+            continue
+        sources.update(read_sources(animation))
+        for sampler in children(animation, "sampler"):
+            samplers[sampler.get("id")] = {semantic: source for semantic, _, source, _ in read_inputs(sampler)}
+    for channel in descendants(elem, "channel"):
+        sampler = samplers.get(url_id(channel.get("source")), {})
+        times = sources.get(sampler.get("INPUT"))
+        values = sources.get(sampler.get("OUTPUT"))
+        target = channel.get("target", "")
+        if times is None or values is None or values.stride != 16 or "/" not in target:
+            skipped += 1
+            continue
+        node_id, sid = target.split("/", 1)
+        if "." in sid or "(" in sid:
+            skipped += 1
+            continue
+        matrices = values.values.astype(np.float64).reshape(-1, 4, 4)
+        channels.append(Channel(node_id, times.values.astype(np.float64), matrices))
+    return channels, skipped
+
+class Document():
+    def __init__(self):
+        self.up_axis = "Y_UP"
+        self.unit = 1.0
+        self.geometries = {}
+        self.skins = {}
+        self.materials = {}
+        self.nodes = []
+        self.channels = []
+        self.skipped_channels = 0
+
+def read(filepath, on_geometry=None, meshes=True):
+    """Stream a Collada file. on_geometry(geometry) is called as each geometry ends, its result is kept
+    in Document.geometries instead of the arrays. Without meshes, geometries and skins are skipped unread"""
+    document = Document()
+    path = []
+    try:
+        for event, elem in ET.iterparse(filepath, events=("start", "end")):
+            name = local_name(elem.tag)
+            if event == "start":
+                path.append(name)
+                continue
+            path.pop()
+            parent = path[-1] if len(path) > 0 else None
+            if name == "up_axis" and parent == "asset":
+                document.up_axis = (elem.text or "Y_UP").strip()
+            elif name == "unit" and parent == "asset":
+                document.unit = float(elem.get("meter", "1.0"))
+            elif name in ("geometry", "controller") and not meshes:
+                elem.clear()
+            elif name == "geometry":
+                geometry = read_geometry(elem)
+                if geometry is not None:
+                    document.geometries[geometry.id] = on_geometry(geometry) if on_geometry is not None else geometry
+                elem.clear()
+            elif name == "controller":
+                skin = read_controller(elem)
+                if skin is not None:
+                    document.skins[skin.id] = skin
+                elem.clear()
+            elif name == "animation" and parent == "library_animations":
+                channels, skipped = read_animation(elem)
+                document.channels.extend(channels)
+                document.skipped_channels += skipped
+                elem.clear()
+            elif name == "material" and parent == "library_materials":
+                document.materials[elem.get("id")] = elem.get("name") or elem.get("id")
+                elem.clear()
+            elif name == "visual_scene":
+                if len(document.nodes) == 0:
+                    read_nodes(elem, -1, document.nodes)
+                elem.clear()
+    except ET.ParseError as e:
+        raise ColladaError("Failed to parse '{}': {}".format(filepath, e))
+    except (KeyError, IndexError, TypeError, AttributeError) as e:
+        raise ColladaError("Unexpected Collada layout in '{}': {}".format(filepath, e))
+    return document
+
+def up_axis_matrix(up_axis):
+    """Rotation that turns the document's up axis into +Z"""
+    matrix = np.eye(4)
+    if up_axis == "Y_UP":
+        matrix[:3, :3] = ((1.0, 0.0, 0.0), (0.0, 0.0, -1.0), (0.0, 1.0, 0.0))
+    elif up_axis == "X_UP":
+        matrix[:3, :3] = ((0.0, 0.0, -1.0), (0.0, 1.0, 0.0), (1.0, 0.0, 0.0))
+    return matrix
+
+def world_matrices(nodes):
+    worlds = []
+    for node in nodes:
+        worlds.append(worlds[node.parent] @ node.matrix if node.parent >= 0 else node.matrix)
+    return worlds
+
+def sample_channels(channels, times):
+    """Matrices of each channel at times, holding the closest earlier key, (channels, len(times), 4, 4)"""
+    result = np.empty((len(channels), len(times), 4, 4), dtype=np.float64)
+    for index, channel in enumerate(channels):
+        keys = np.clip(np.searchsorted(channel.times, times + 1e-6, side="right") - 1, 0, len(channel.times) - 1)
+        result[index] = channel.matrices[keys]
+    return result
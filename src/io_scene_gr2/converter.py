@@ -0,0 +1,257 @@
+import os
+import queue
+import shutil
+import subprocess
+import tempfile
+import threading
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# GR2 -> DAE conversion jobs, run outside of Blender's main thread.
+# Nothing here touches bpy, jobs only carry paths and the converter output back to the importer.
+
+# Only the last lines of the converter output are kept, for error reports
+OUTPUT_TAIL_LINES = 200
+
+def divine_command(divine_path, source, destination, options="", action="convert-model", log_level="all"):
+    divine_exe = '"{}"'.format(divine_path)
+    return "{} --loglevel {} -g dos2de -s \"{}\" -d \"{}\" -i gr2 -o dae -a {} {}".format(
+        divine_exe, log_level, source, destination, action, options)
+
+def conform_options(conform_skeleton_path):
+    return "-e conform -e conform-copy --conform-path \"{}\"".format(conform_skeleton_path)
+
+class ConversionJob():
+    def __init__(self, source_path, output_path, command=""):
+        self.source_path = source_path
+        self.output_path = output_path
+        self.command = command
+        self.options = ""
+        self.cache_key = None
+        self.cached_path = None
+        self.returncode = None
+        self.output = ""
+        self.errors = ""
+        self.started = False
+        self.on_progress = None
+        self.echo = False
+
+    def handle_line(self, line):
+        if self.echo:
+            print(line)
+        # divine's log has no stable stage messages, so a running job only reports that it started.
+        # Progress moves when jobs finish
+        if not self.started:
+            self.started = True
+            if self.on_progress is not None:
+                self.on_progress(self, 0.0, "Converting")
+
+    @property
+    def succeeded(self):
+        return self.cached_path is not None or self.returncode == 0
+
+    def error_message(self):
+        lines = (self.output or "").splitlines() or (self.errors or "").splitlines()
+        return '\n'.join(lines[-1:])
+
+def run_process(command, on_line=None, tail_lines=OUTPUT_TAIL_LINES):
+    """Run a converter process, streaming its output line by line and keeping only the tail in memory"""
+    tail = deque(maxlen=tail_lines)
+    try:
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+            universal_newlines=True, bufsize=1, errors="replace")
+    except OSError as e:
+        return -1, "", str(e)
+    with process.stdout:
+        for line in process.stdout:
+            line = line.rstrip("\r\n")
+            tail.append(line)
+            if on_line is not None:
+                on_line(line)
+    return process.wait(), "\n".join(tail), ""
+
+def run_conversion(job):
+    if job.cached_path is not None:
+        return job
+    job.returncode, job.output, job.errors = run_process(job.command, job.handle_line)
+    return job
+
+def default_staging_root():
+    # Prefer a RAM-backed tmpfs where one exists, source assets often live on network shares
+    shm = "/dev/shm"
+    if os.path.isdir(shm) and os.access(shm, os.W_OK):
+        return shm
+    return tempfile.gettempdir()
+
+class StagingArea():
+    """Private directory for intermediate files, every job gets a unique name inside it"""
+
+    def __init__(self, root=None):
+        self.root = root or default_staging_root()
+        self.directory = None
+        self.lock = threading.Lock()
+
+    def ensure(self):
+        with self.lock:
+            if self.directory is None or not os.path.isdir(self.directory):
+                os.makedirs(self.root, exist_ok=True)
+                self.directory = tempfile.mkdtemp(prefix="io_scene_gr2_", dir=self.root)
+            return self.directory
+
+    def path_for(self, source_path, extension=".dae"):
+        name = os.path.splitext(os.path.basename(source_path))[0]
+        return os.path.join(self.ensure(), "{}-{}{}".format(name, uuid.uuid4().hex[:12], extension))
+
+    def make_dir(self, prefix=""):
+        return tempfile.mkdtemp(prefix=prefix, dir=self.ensure())
+
+    def owns(self, path):
+        if self.directory is None:
+            return False
+        return os.path.abspath(path).startswith(os.path.abspath(self.directory) + os.sep)
+
+    def remove(self, path):
+        if self.owns(path) and os.path.isfile(path):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def cleanup(self):
+        with self.lock:
+            if self.directory is not None:
+                shutil.rmtree(self.directory, ignore_errors=True)
+                self.directory = None
+
+def stage_file(source, destination):
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copyfile(source, destination)
+
+class BatchConversion():
+    """Several jobs staged into one directory, so a single converter process handles all of them"""
+
+    def __init__(self, jobs, staging_dir, output_extension=".dae"):
+        self.jobs = jobs
+        self.staging_dir = staging_dir
+        self.input_dir = os.path.join(staging_dir, "input")
+        self.output_dir = os.path.join(staging_dir, "output")
+        self.output_extension = output_extension
+        self.command = ""
+        os.makedirs(self.input_dir, exist_ok=True)
+        os.makedirs(self.output_dir, exist_ok=True)
+        # Prefix staged files with their index, files from different folders may share a name
+        self.staged_names = []
+        for index, job in enumerate(jobs):
+            name, ext = os.path.splitext(os.path.basename(job.source_path))
+            staged_name = "{:04d}_{}".format(index, name)
+            stage_file(job.source_path, os.path.join(self.input_dir, staged_name + ext))
+            self.staged_names.append(staged_name)
+
+    def cleanup(self):
+        shutil.rmtree(self.staging_dir, ignore_errors=True)
+
+def run_batch_conversion(batch):
+    def on_line(line):
+        for job in batch.jobs:
+            job.handle_line(line)
+    returncode, output, errors = run_process(batch.command, on_line)
+    outputs = {}
+    if os.path.isdir(batch.output_dir):
+        outputs = {os.path.splitext(f)[0].lower(): os.path.join(batch.output_dir, f) for f in os.listdir(batch.output_dir)
+            if f.lower().endswith(batch.output_extension)}
+    for job, staged_name in zip(batch.jobs, batch.staged_names):
+        job.output = output
+        job.errors = errors
+        result = outputs.get(staged_name.lower())
+        if returncode == 0 and result is not None:
+            shutil.move(result, job.output_path)
+            job.returncode = 0
+        else:
+            job.returncode = returncode if returncode != 0 else 1
+    batch.cleanup()
+    return batch.jobs
+
+class ConverterBackend():
+    """Converts jobs outside of the main thread. convert() and convert_batch() may be called from several threads at once"""
+    name = ""
+    supports_batch = False
+
+    def convert(self, job):
+        raise NotImplementedError
+
+    def convert_batch(self, batch):
+        for job in batch.jobs:
+            self.convert(job)
+        batch.cleanup()
+        return batch.jobs
+
+    def close(self):
+        pass
+
+class SubprocessBackend(ConverterBackend):
+    """Starts a new converter process for every job or batch"""
+    name = "SUBPROCESS"
+    supports_batch = True
+
+    def convert(self, job):
+        return run_conversion(job)
+
+    def convert_batch(self, batch):
+        return run_batch_conversion(batch)
+
+class ConversionPool():
+    """Bounded pool of converter jobs. Finished jobs are handed back to the caller's thread by completed()"""
+
+    def __init__(self, max_workers, backend=None, on_progress=None):
+        self.executor = ThreadPoolExecutor(max_workers=max(1, max_workers))
+        self.backend = backend or SubprocessBackend()
+        self.futures = set()
+        self.on_progress = on_progress
+        self.events = queue.Queue()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+
+    def queue_event(self, job, fraction, message):
+        self.events.put((job, fraction, message))
+
+    def dispatch_events(self):
+        while True:
+            try:
+                job, fraction, message = self.events.get_nowait()
+            except queue.Empty:
+                break
+            if self.on_progress is not None:
+                self.on_progress(job, fraction, message)
+
+    def submit(self, job):
+        job.on_progress = self.queue_event
+        self.futures.add(self.executor.submit(self.backend.convert, job))
+
+    def submit_batch(self, batch):
+        for job in batch.jobs:
+            job.on_progress = self.queue_event
+        self.futures.add(self.executor.submit(self.backend.convert_batch, batch))
+
+    def completed(self, poll_interval=0.1):
+        """Yield finished jobs on the calling thread, dispatching progress events while waiting"""
+        while len(self.futures) > 0:
+            done, self.futures = wait(self.futures, timeout=poll_interval, return_when=FIRST_COMPLETED)
+            self.dispatch_events()
+            for future in done:
+                result = future.result()
+                if isinstance(result, list):
+                    yield from result
+                else:
+                    yield result
+
+    def shutdown(self):
+        for future in self.futures:
+            future.cancel()
+        self.executor.shutdown(wait=True)
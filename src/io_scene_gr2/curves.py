@@ -0,0 +1,404 @@
+import numpy as np
+
+from .granny import GR2Error
+
+# Granny animation curves, decoded to knots and control points and sampled with numpy.
+# Curve2 holds its data in a variant, CurveDataHeader.Format says which layout the variant has.
+# Files older than Granny 2.7 store Degree, Knots and Controls directly on the curve.
+# Sampling runs one de Boor pass over every curve of the same degree and dimension, and the pose
+# math runs once per hierarchy level, so baking an animation costs a few array ops per track kind.
+
+curve_format_names = (
+    "DaKeyframes32f",
+    "DaK32fC32f",
+    "DaIdentity",
+    "DaConstant32f",
+    "D3Constant32f",
+    "D4Constant32f",
+    "DaK16uC16u",
+    "DaK8uC8u",
+    "D4nK16uC15u",
+    "D4nK8uC7u",
+    "D3K16uC16u",
+    "D3K8uC8u",
+    "D9I1K16uC16u",
+    "D9I3K16uC16u",
+    "D9I1K8uC8u",
+    "D9I3K8uC8u",
+    "D3I1K32fC32f",
+    "D3I1K16uC16u",
+    "D3I1K8uC8u",
+)
+
+# Values of curves that don't store any: position, orientation (x, y, z, w) and scale/shear
+identity_values = {
+    3: np.zeros(3, dtype=np.float32),
+    4: np.array((0.0, 0.0, 0.0, 1.0), dtype=np.float32),
+    9: np.eye(3, dtype=np.float32).reshape(-1),
+}
+
+# Scales and offsets the D4n formats select per quaternion component
+quaternion_scale_table = np.array((
+    1.4142135, 0.70710677, 0.35355338, 0.35355338, 0.17677669, 0.17677669, 0.17677669, 0.17677669,
+    -1.4142135, -0.70710677, -0.35355338, -0.35355338, -0.17677669, -0.17677669, -0.17677669, -0.17677669,
+), dtype=np.float64)
+
+quaternion_offset_table = np.array((
+    -0.70710677, -0.35355338, -0.53033006, -0.17677669, -0.17677669, -0.088388346, -0.26516503, -0.44194174,
+    0.70710677, 0.35355338, 0.53033006, 0.17677669, 0.17677669, 0.088388346, 0.26516503, 0.44194174,
+), dtype=np.float64)
+
+class CurveError(GR2Error):
+    pass
+
+class Curve():
+    """B-spline of the given degree with one knot per control point"""
+
+    def __init__(self, degree, knots, controls):
+        self.degree = degree
+        self.knots = np.asarray(knots, dtype=np.float32).reshape(-1)
+        self.controls = np.asarray(controls, dtype=np.float32).reshape(len(self.knots), -1)
+
+    @property
+    def dimension(self):
+        return self.controls.shape[1]
+
+    @property
+    def is_constant(self):
+        return len(self.knots) <= 1
+
+    def evaluate(self, times):
+        """Sample the curve at times, returns (len(times), dimension)"""
+        return evaluate_curves([self], times)[0]
+
+def constant_curve(values):
+    return Curve(0, (0.0,), np.asarray(values, dtype=np.float32).reshape(1, -1))
+
+def format_name(curve_format):
+    if 0 <= curve_format < len(curve_format_names):
+        return curve_format_names[curve_format]
+    return "format {}".format(curve_format)
+
+def array_values(array, dtype=np.float32):
+    if array is None or len(array) == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.asarray(array.values, dtype=dtype)
+
+def knot_scale(one_over_knot_scale_trunc):
+    # The upper 16 bits of a float32
+    return float(np.array(int(one_over_knot_scale_trunc) << 16, dtype=np.uint32).view(np.float32))
+
+def split_knots(values, per_knot, one_over_knot_scale):
+    """Split KnotsControls into knot times and (knots, per_knot) control values"""
+    count = len(values) // (per_knot + 1)
+    knots = values[:count].astype(np.float64) / one_over_knot_scale
+    controls = values[count:count * (per_knot + 1)].astype(np.float64).reshape(count, per_knot)
+    return knots, controls
+
+def diagonal_scale_shear(values):
+    """(n, 3) or (n, 1) scale values to (n, 9) scale/shear matrices"""
+    matrices = np.zeros((len(values), 3, 3), dtype=np.float64)
+    matrices[:, [0, 1, 2], [0, 1, 2]] = values
+    return matrices.reshape(-1, 9)
+
+def decode_quaternions(values, selector, sign_bit, unit):
+    """Quaternions stored as three components plus the index of the dropped largest one"""
+    values = values.astype(np.int64)
+    a, b, c = values[:, 0], values[:, 1], values[:, 2]
+    shifts = np.arange(4) * 4
+    entries = (int(selector) >> shifts) & 0xF
+    scales = quaternion_scale_table[entries] * unit
+    offsets = quaternion_offset_table[entries]
+
+    mask = sign_bit - 1
+    largest = ((b & sign_bit) != 0).astype(np.int64) * 2 + ((c & sign_bit) != 0)
+    rows = np.arange(len(values))
+    q = np.empty((len(values), 4), dtype=np.float64)
+    squared = np.zeros(len(values), dtype=np.float64)
+    for step, component in enumerate((a, b, c)):
+        index = (largest + step + 1) & 3
+        value = (component & mask) * scales[index] + offsets[index]
+        q[rows, index] = value
+        squared += value * value
+    dropped = np.sqrt(np.maximum(0.0, 1.0 - squared))
+    q[rows, largest] = np.where((a & sign_bit) != 0, -dropped, dropped)
+    return q
+
+def decode_keyframes_32f(data, header, dimension, time_step):
+    controls = array_values(data["Controls"])
+    dimension = data["Dimension"] or dimension
+    count = len(controls) // dimension
+    return Curve(header["Degree"], np.arange(count) * time_step, controls[:count * dimension])
+
+def decode_k32f_c32f(data, header, dimension, time_step):
+    return read_knots_controls(header["Degree"], data["Knots"], data["Controls"], dimension)
+
+def decode_identity(data, header, dimension, time_step):
+    return constant_curve(identity_values[dimension])
+
+def decode_constant(data, header, dimension, time_step):
+    controls = data["Controls"]
+    if not isinstance(controls, np.ndarray):
+        controls = array_values(controls)
+    return constant_curve(controls)
+
+def decode_da_quantized(dtype):
+    def decode(data, header, dimension, time_step):
+        scale_offsets = array_values(data["ControlScaleOffsets"], np.float64)
+        width = len(scale_offsets) // 2
+        knots, controls = split_knots(array_values(data["KnotsControls"], dtype), width,
+            knot_scale(data["OneOverKnotScaleTrunc"]))
+        return Curve(header["Degree"], knots, controls * scale_offsets[:width] + scale_offsets[width:])
+    return decode
+
+def decode_d4n(dtype, sign_bit, unit):
+    def decode(data, header, dimension, time_step):
+        knots, controls = split_knots(array_values(data["KnotsControls"], dtype), 3, data["OneOverKnotScale"])
+        return Curve(header["Degree"], knots, decode_quaternions(controls, data["ScaleOffsetTableEntries"], sign_bit, unit))
+    return decode
+
+def decode_d3_quantized(dtype):
+    def decode(data, header, dimension, time_step):
+        knots, controls = split_knots(array_values(data["KnotsControls"], dtype), 3,
+            knot_scale(data["OneOverKnotScaleTrunc"]))
+        return Curve(header["Degree"], knots, controls * data["ControlScales"] + data["ControlOffsets"])
+    return decode
+
+def decode_d9_quantized(dtype, components):
+    def decode(data, header, dimension, time_step):
+        knots, controls = split_knots(array_values(data["KnotsControls"], dtype), components,
+            knot_scale(data["OneOverKnotScaleTrunc"]))
+        if components == 1:
+            controls = controls * data["ControlScale"] + data["ControlOffset"]
+        else:
+            controls = controls * data["ControlScales"] + data["ControlOffsets"]
+        return Curve(header["Degree"], knots, diagonal_scale_shear(controls))
+    return decode
+
+def decode_d3i1(dtype):
+    def decode(data, header, dimension, time_step):
+        values = array_values(data["KnotsControls"], dtype)
+        if dtype == np.float32:
+            knots, controls = split_knots(values, 1, 1.0)
+        else:
+            knots, controls = split_knots(values, 1, knot_scale(data["OneOverKnotScaleTrunc"]))
+        return Curve(header["Degree"], knots, controls * data["ControlScales"] + data["ControlOffsets"])
+    return decode
+
+curve_decoders = {
+    "DaKeyframes32f": decode_keyframes_32f,
+    "DaK32fC32f": decode_k32f_c32f,
+    "DaIdentity": decode_identity,
+    "DaConstant32f": decode_constant,
+    "D3Constant32f": decode_constant,
+    "D4Constant32f": decode_constant,
+    "DaK16uC16u": decode_da_quantized(np.uint16),
+    "DaK8uC8u": decode_da_quantized(np.uint8),
+    "D4nK16uC15u": decode_d4n(np.uint16, 0x8000, 1.0 / 32767.0),
+    "D4nK8uC7u": decode_d4n(np.uint8, 0x80, 1.0 / 127.0),
+    "D3K16uC16u": decode_d3_quantized(np.uint16),
+    "D3K8uC8u": decode_d3_quantized(np.uint8),
+    "D9I1K16uC16u": decode_d9_quantized(np.uint16, 1),
+    "D9I3K16uC16u": decode_d9_quantized(np.uint16, 3),
+    "D9I1K8uC8u": decode_d9_quantized(np.uint8, 1),
+    "D9I3K8uC8u": decode_d9_quantized(np.uint8, 3),
+    "D3I1K32fC32f": decode_d3i1(np.float32),
+    "D3I1K16uC16u": decode_d3i1(np.uint16),
+    "D3I1K8uC8u": decode_d3i1(np.uint8),
+}
+
+def read_knots_controls(degree, knots, controls, dimension):
+    knots = array_values(knots)
+    controls = array_values(controls)
+    if len(knots) == 0:
+        return constant_curve(identity_values[dimension])
+    if len(controls) != len(knots) * dimension:
+        raise CurveError("Curve has {} knots but {} control values for dimension {}".format(
+            len(knots), len(controls), dimension))
+    return Curve(degree, knots, controls)
+
+def read_curve(curve, dimension, time_step=1.0):
+    """Decode a Curve2 (or a pre-2.7 Curve) of the given dimension to a Curve"""
+    if curve is None:
+        return constant_curve(identity_values[dimension])
+    if "CurveData" not in curve:
+        return read_knots_controls(curve["Degree"], curve.get("Knots"), curve.get("Controls"), dimension)
+
+    data = curve["CurveData"]
+    if data is None:
+        return constant_curve(identity_values[dimension])
+    header = data["CurveDataHeader"]
+    name = format_name(header["Format"])
+    decoder = curve_decoders.get(name)
+    if decoder is None:
+        raise CurveError("Unsupported curve data {}".format(name))
+    result = decoder(data, header, dimension, time_step)
+    if result.dimension != dimension:
+        raise CurveError("{} curve has dimension {}, expected {}".format(name, result.dimension, dimension))
+    if len(result.knots) == 0:
+        return constant_curve(identity_values[dimension])
+    return result
+
+def read_track(track, time_step=1.0):
+    """Position, orientation and scale/shear curves of a TransformTrack"""
+    return (read_curve(track.get("PositionCurve"), 3, time_step),
+        read_curve(track.get("OrientationCurve"), 4, time_step),
+        read_curve(track.get("ScaleShearCurve"), 9, time_step))
+
+def evaluate_batch(batch, degree, times):
+    """De Boor on every sample of every curve in batch at once, returns (curves, samples, dimension)"""
+    counts = np.array([len(c.knots) for c in batch])
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    ends = (starts + counts - 1)[:, None]
+    knots = np.concatenate([c.knots for c in batch]).astype(np.float64)
+    controls = np.concatenate([c.controls for c in batch]).astype(np.float64)
+    t = np.clip(times[None, :], knots[starts][:, None], knots[ends[:, 0]][:, None])
+
+    # One search for all curves: each curve's knots are shifted past the ones before it
+    spacing = knots.max() - knots.min() + 1.0
+    shifts = np.arange(len(batch)) * spacing
+    found = np.searchsorted(knots + np.repeat(shifts, counts), t + shifts[:, None], side="right")
+    if degree == 0:
+        return controls[np.clip(found - 1, starts[:, None], ends)]
+
+    # Sample t lies in [knots[i-1], knots[i]) and is shaped by controls i-degree..i, control j starts at knots[j-1]
+    i = np.clip(found, starts[:, None] + 1, ends)
+    lower = starts[:, None, None]
+    upper = ends[:, :, None]
+    points = controls[np.clip(i[:, :, None] + np.arange(-degree, 1), lower, upper)]
+    for r in range(1, degree + 1):
+        slots = np.arange(r, degree + 1)
+        j = i[:, :, None] - degree + slots
+        lo = knots[np.clip(j - 1, lower, upper)]
+        hi = knots[np.clip(j + degree - r, lower, upper)]
+        span = hi - lo
+        alpha = np.where(span > 0.0, (t[:, :, None] - lo) / np.where(span > 0.0, span, 1.0), 0.0)[..., None]
+        points[:, :, slots] = (1.0 - alpha) * points[:, :, slots - 1] + alpha * points[:, :, slots]
+    return points[:, :, degree]
+
+def evaluate_curves(curve_list, times):
+    """Sample curves of one dimension at times, returns (len(curve_list), len(times), dimension)"""
+    times = np.asarray(times, dtype=np.float64).reshape(-1)
+    dimension = curve_list[0].dimension if len(curve_list) > 0 else 0
+    result = np.empty((len(curve_list), len(times), dimension), dtype=np.float32)
+    batches = {}
+    for index, curve in enumerate(curve_list):
+        if curve.is_constant:
+            result[index] = curve.controls[0]
+        else:
+            batches.setdefault(min(curve.degree, len(curve.knots) - 1), []).append(index)
+    for degree, indices in batches.items():
+        result[indices] = evaluate_batch([curve_list[i] for i in indices], degree, times)
+    return result
+
+def quaternion_to_matrix(q):
+    """(n, 4) x, y, z, w quaternions to (n, 3, 3) rotation matrices"""
+    q = q / np.maximum(np.linalg.norm(q, axis=1, keepdims=True), 1e-12)
+    x, y, z, w = q[:, 0], q[:, 1], q[:, 2], q[:, 3]
+    return np.stack((
+        1.0 - 2.0 * (y * y + z * z), 2.0 * (x * y - z * w), 2.0 * (x * z + y * w),
+        2.0 * (x * y + z * w), 1.0 - 2.0 * (x * x + z * z), 2.0 * (y * z - x * w),
+        2.0 * (x * z - y * w), 2.0 * (y * z + x * w), 1.0 - 2.0 * (x * x + y * y),
+    ), axis=-1).reshape(-1, 3, 3)
+
+def matrix_to_quaternion(m):
+    """(n, 3, 3) rotation matrices to (n, 4) w, x, y, z quaternions"""
+    trace = m[:, 0, 0] + m[:, 1, 1] + m[:, 2, 2]
+    candidates = np.stack((
+        np.stack((1.0 + trace, m[:, 2, 1] - m[:, 1, 2], m[:, 0, 2] - m[:, 2, 0], m[:, 1, 0] - m[:, 0, 1]), axis=-1),
+        np.stack((m[:, 2, 1] - m[:, 1, 2], 1.0 + m[:, 0, 0] - m[:, 1, 1] - m[:, 2, 2], m[:, 0, 1] + m[:, 1, 0], m[:, 0, 2] + m[:, 2, 0]), axis=-1),
+        np.stack((m[:, 0, 2] - m[:, 2, 0], m[:, 0, 1] + m[:, 1, 0], 1.0 - m[:, 0, 0] + m[:, 1, 1] - m[:, 2, 2], m[:, 1, 2] + m[:, 2, 1]), axis=-1),
+        np.stack((m[:, 1, 0] - m[:, 0, 1], m[:, 0, 2] + m[:, 2, 0], m[:, 1, 2] + m[:, 2, 1], 1.0 - m[:, 0, 0] - m[:, 1, 1] + m[:, 2, 2]), axis=-1),
+    ), axis=1)
+    # Use the branch with the largest diagonal term, the others lose precision
+    diagonal = np.stack((trace, m[:, 0, 0], m[:, 1, 1], m[:, 2, 2]), axis=-1)
+    q = candidates[np.arange(len(m)), np.argmax(diagonal, axis=1)]
+    return q / np.maximum(np.linalg.norm(q, axis=1, keepdims=True), 1e-12)
+
+def make_continuous(q):
+    """Flip quaternion signs along the sample axis (-2) so consecutive samples don't take the long way around"""
+    if q.shape[-2] < 2:
+        return q
+    flips = np.sum(q[..., 1:, :] * q[..., :-1, :], axis=-1) < 0.0
+    signs = np.cumprod(np.where(flips, -1.0, 1.0), axis=-1)
+    q = q.copy()
+    q[..., 1:, :] *= signs[..., None]
+    return q
+
+def compose_transforms(position, orientation, scale_shear):
+    """Granny transforms (translation @ rotation @ scale/shear) as (n, 4, 4) matrices"""
+    count = max(len(position), len(orientation), len(scale_shear))
+    matrices = np.zeros((count, 4, 4), dtype=np.float64)
+    matrices[:, :3, :3] = quaternion_to_matrix(np.asarray(orientation, dtype=np.float64)) @ np.asarray(scale_shear, dtype=np.float64).reshape(-1, 3, 3)
+    matrices[:, :3, 3] = position
+    matrices[:, 3, 3] = 1.0
+    return matrices
+
+def decompose_matrices(matrices):
+    """(..., samples, 4, 4) matrices to location, w, x, y, z rotation and scale arrays"""
+    shape = matrices.shape[:-2]
+    matrices = matrices.reshape(-1, 4, 4)
+    location = matrices[:, :3, 3]
+    basis = matrices[:, :3, :3]
+    scale = np.linalg.norm(basis, axis=1)
+    # A mirrored basis keeps its rotation with one negative scale
+    scale[np.linalg.det(basis) < 0.0, 0] *= -1.0
+    rotation = matrix_to_quaternion(basis / np.where(scale == 0.0, 1.0, scale)[:, None, :])
+    return location.reshape(shape + (3,)), make_continuous(rotation.reshape(shape + (4,))), scale.reshape(shape + (3,))
+
+def transform_matrix(transform):
+    return compose_transforms(np.asarray(transform["Position"])[None],
+        np.asarray(transform["Orientation"])[None], np.asarray(transform["ScaleShear"])[None])[0]
+
+def sample_tracks(track_curves, times):
+    """Local bone matrices of every track at times, (tracks, len(times), 4, 4)"""
+    samples = len(times)
+    values = [evaluate_curves([curves[kind] for curves in track_curves], times).reshape(len(track_curves) * samples, -1)
+        for kind in range(3)]
+    return compose_transforms(*values).reshape(len(track_curves), samples, 4, 4)
+
+def sample_times(duration, time_step):
+    """Sample times covering [0, duration] every time_step seconds"""
+    if time_step <= 0.0:
+        return np.zeros(1, dtype=np.float64)
+    count = int(round(duration / time_step)) + 1
+    return np.arange(count, dtype=np.float64) * time_step
+
+def bone_depths(parents):
+    depths = np.zeros(len(parents), dtype=np.int64)
+    current = np.array(parents, dtype=np.int64)
+    while np.any(current >= 0):
+        has_parent = current >= 0
+        depths[has_parent] += 1
+        current[has_parent] = parents[current[has_parent]]
+    return depths
+
+def pose_bases(parents, bind, rest, animated):
+    """Pose bone matrix_basis for every bone and sample.
+
+    parents: parent index per bone, -1 for roots
+    bind: (bones, 4, 4) armature space matrix_local of the Blender bones
+    rest: (bones, 4, 4) armature space rest matrices of the Granny skeleton
+    animated: (bones, samples, 4, 4) parent space bone matrices
+    """
+    parents = np.asarray(parents, dtype=np.int64)
+    depths = bone_depths(parents)
+    world = np.empty(animated.shape, dtype=np.float64)
+    for depth in range(depths.max() + 1 if len(depths) > 0 else 0):
+        level = np.flatnonzero(depths == depth)
+        if depth == 0:
+            world[level] = animated[level]
+        else:
+            world[level] = world[parents[level]] @ animated[level]
+
+    # The pose matrices that deform the mesh like the Granny bones, given the Blender bones' rest
+    posed = world @ (np.linalg.inv(rest) @ bind)[:, None]
+    inv_bind = np.linalg.inv(bind)
+    bases = np.empty(animated.shape, dtype=np.float64)
+    roots = parents < 0
+    bases[roots] = inv_bind[roots][:, None] @ posed[roots]
+    children = np.flatnonzero(~roots)
+    if len(children) > 0:
+        child_parents = parents[children]
+        bases[children] = (inv_bind[children] @ bind[child_parents])[:, None] @ np.linalg.inv(posed[child_parents]) @ posed[children]
+    return bases
@@ -0,0 +1,90 @@
+import os
+import re
+
+# Bookkeeping shared by the imports of one batch: which scene objects are new, which datablock names are taken,
+# and which materials already exist for a texture set. Nothing here needs bpy, datablocks are only read through their attributes.
+
+lastNum = re.compile(r'(?:[^\d]*(\d+)[^\d]*)+')
+
+def increment_string(s):
+    m = lastNum.search(s)
+    if m:
+        next = str(int(m.group(1))+1)
+        start, end = m.span(1)
+        s = s[:max(end-len(next), start)] + next + s[end:]
+    else:
+        s = s + "_1"
+    return s
+
+class NameAllocator():
+    """Collision-free names for one datablock type, from a snapshot of the names taken when it was created"""
+
+    def __init__(self, names=()):
+        self.taken = set(names)
+        # Last name handed out per requested name, so the increment_string sequence never restarts
+        self.cursors = {}
+
+    def add(self, names):
+        self.taken.update(names)
+
+    def release(self, name):
+        self.taken.discard(name)
+
+    def allocate(self, name):
+        candidate = name
+        if candidate in self.taken:
+            candidate = self.cursors.get(name, name)
+            while candidate in self.taken:
+                candidate = increment_string(candidate)
+        self.taken.add(candidate)
+        self.cursors[name] = candidate
+        return candidate
+
+class ImportSession():
+    """Pointers of the scene objects seen so far, so each import can tell its new objects apart in one pass"""
+
+    def __init__(self, context):
+        self.known = {obj.as_pointer() for obj in context.scene.objects}
+
+    def new_objects(self, context):
+        """Objects added to the scene since the session started or since the last call"""
+        new_objects = [obj for obj in context.scene.objects if obj.as_pointer() not in self.known]
+        self.known.update(obj.as_pointer() for obj in new_objects)
+        return new_objects
+
+    def forget(self, obj):
+        # A removed object's memory may be reused by the next import
+        self.known.discard(obj.as_pointer())
+
+def texture_key(textures, filename):
+    """Key of a texture set, materials without any texture are keyed by the model file instead"""
+    paths = [os.path.normcase(os.path.normpath(t)) if t else "" for t in textures.textures]
+    if not any(paths):
+        return "file:" + filename
+    return "|".join(paths)
+
+class MaterialIndex():
+    """Materials by texture set. The key is kept on the material, so saved materials are reused too"""
+
+    key_property = "dos2de_texture_key"
+
+    def __init__(self, materials=()):
+        self.materials = {}
+        for mat in materials:
+            key = mat.get(self.key_property)
+            if key is not None:
+                self.materials.setdefault(key, mat)
+
+    def get(self, key):
+        mat = self.materials.get(key)
+        if mat is not None:
+            try:
+                mat.name
+            except ReferenceError:
+                del self.materials[key]
+                return None
+        return mat
+
+    def add(self, key, mat):
+        mat[self.key_property] = key
+        self.materials[key] = mat
@@ -0,0 +1,184 @@
+import struct
+
+import numpy as np
+
+# DDS reader with BC1/BC2/BC3 (DXT1/DXT3/DXT5) decoding.
+# Blocks are decoded all at once with numpy, the result is float RGBA with the bottom row first,
+# the layout Image.pixels.foreach_set expects.
+
+DDS_MAGIC = b"DDS "
+DDS_HEADER_SIZE = 124
+DDS_DX10_HEADER_SIZE = 20
+DDSD_MIPMAPCOUNT = 0x20000
+DDPF_FOURCC = 0x4
+
+# fourcc -> (format, bytes per 4x4 block)
+fourcc_formats = {
+    b"DXT1": ("BC1", 8),
+    b"DXT2": ("BC2", 16),
+    b"DXT3": ("BC2", 16),
+    b"DXT4": ("BC3", 16),
+    b"DXT5": ("BC3", 16),
+}
+
+# DXGI_FORMAT values of the DX10 extended header
+dxgi_formats = {
+    70: ("BC1", 8), 71: ("BC1", 8), 72: ("BC1", 8),
+    73: ("BC2", 16), 74: ("BC2", 16), 75: ("BC2", 16),
+    76: ("BC3", 16), 77: ("BC3", 16), 78: ("BC3", 16),
+}
+
+class DDSError(ValueError):
+    pass
+
+class DDSMipLevel():
+    def __init__(self, level, width, height, offset, size):
+        self.level = level
+        self.width = width
+        self.height = height
+        self.offset = offset
+        self.size = size
+
+class DDSFile():
+    def __init__(self, data):
+        if len(data) < 4 + DDS_HEADER_SIZE or data[:4] != DDS_MAGIC:
+            raise DDSError("Not a DDS file")
+        header_size, flags, height, width, pitch, depth, mip_count = struct.unpack_from("<7I", data, 4)
+        if header_size != DDS_HEADER_SIZE:
+            raise DDSError("Unexpected DDS header size {}".format(header_size))
+        pf_flags, fourcc = struct.unpack_from("<I4s", data, 80)
+        offset = 4 + DDS_HEADER_SIZE
+        if not pf_flags & DDPF_FOURCC:
+            raise DDSError("Uncompressed DDS files are not supported")
+        if fourcc == b"DX10":
+            dxgi_format = struct.unpack_from("<I", data, offset)[0]
+            offset += DDS_DX10_HEADER_SIZE
+            if dxgi_format not in dxgi_formats:
+                raise DDSError("Unsupported DXGI format {}".format(dxgi_format))
+            self.format, self.block_size = dxgi_formats[dxgi_format]
+        elif fourcc in fourcc_formats:
+            self.format, self.block_size = fourcc_formats[fourcc]
+        else:
+            raise DDSError("Unsupported DDS format {}".format(fourcc))
+
+        self.data = data
+        self.width = width
+        self.height = height
+        self.mip_count = max(1, mip_count) if flags & DDSD_MIPMAPCOUNT else 1
+        self.levels = []
+        for level in range(self.mip_count):
+            w = max(1, width >> level)
+            h = max(1, height >> level)
+            size = ((w + 3) // 4) * ((h + 3) // 4) * self.block_size
+            if offset + size > len(data):
+                # Truncated mip chains happen, keep the levels that are there
+                break
+            self.levels.append(DDSMipLevel(level, w, h, offset, size))
+            offset += size
+        if len(self.levels) == 0:
+            raise DDSError("DDS file has no complete mip level")
+
+    def level_for_size(self, max_size):
+        """The largest mip level that fits in max_size pixels on both sides"""
+        for mip in self.levels:
+            if mip.width <= max_size and mip.height <= max_size:
+                return mip.level
+        return self.levels[-1].level
+
+    def decode(self, level=0, flip=True):
+        """Decode one mip level to a float32 array of shape (height, width, 4)"""
+        mip = self.levels[min(level, len(self.levels) - 1)]
+        blocks_x = (mip.width + 3) // 4
+        blocks_y = (mip.height + 3) // 4
+        blocks = np.frombuffer(self.data, dtype=np.uint8, count=mip.size, offset=mip.offset).reshape(-1, self.block_size)
+        if self.format == "BC1":
+            rgba = decode_bc1(blocks)
+        elif self.format == "BC2":
+            rgba = decode_bc2(blocks)
+        else:
+            rgba = decode_bc3(blocks)
+        # (blocks_y, blocks_x, 4 rows, 4 columns, rgba) -> (rows, columns, rgba)
+        pixels = rgba.reshape(blocks_y, blocks_x, 4, 4, 4).transpose(0, 2, 1, 3, 4).reshape(blocks_y * 4, blocks_x * 4, 4)
+        pixels = pixels[:mip.height, :mip.width]
+        if flip:
+            pixels = pixels[::-1]
+        return np.ascontiguousarray(pixels)
+
+def unpack_565(colors):
+    r = ((colors >> 11) & 0x1F).astype(np.float32) / 31.0
+    g = ((colors >> 5) & 0x3F).astype(np.float32) / 63.0
+    b = (colors & 0x1F).astype(np.float32) / 31.0
+    return np.stack((r, g, b), axis=-1)
+
+def decode_colors(blocks, allow_transparent):
+    """Decode the 8 byte color part of each block to (blocks, 16, 4) RGBA"""
+    c0 = blocks[:, 0].astype(np.uint16) | (blocks[:, 1].astype(np.uint16) << 8)
+    c1 = blocks[:, 2].astype(np.uint16) | (blocks[:, 3].astype(np.uint16) << 8)
+    bits = blocks[:, 4:8].copy().view("<u4").reshape(-1)
+    indices = (bits[:, None] >> (2 * np.arange(16, dtype=np.uint32))) & 3
+
+    p0 = unpack_565(c0)
+    p1 = unpack_565(c1)
+    palette = np.empty((len(blocks), 4, 4), dtype=np.float32)
+    palette[:, 0, :3] = p0
+    palette[:, 1, :3] = p1
+    palette[:, 2, :3] = (2.0 * p0 + p1) / 3.0
+    palette[:, 3, :3] = (p0 + 2.0 * p1) / 3.0
+    palette[:, :, 3] = 1.0
+    if allow_transparent:
+        # c0 <= c1 switches BC1 blocks to three colors plus transparent black
+        three_color = c0 <= c1
+        palette[three_color, 2, :3] = (p0[three_color] + p1[three_color]) * 0.5
+        palette[three_color, 3] = 0.0
+    return np.take_along_axis(palette, indices[:, :, None].astype(np.intp), axis=1)
+
+def decode_bc1(blocks):
+    return decode_colors(blocks, True)
+
+def decode_bc2(blocks):
+    rgba = decode_colors(blocks[:, 8:16], False)
+    bits = blocks[:, 0:8].copy().view("<u8").reshape(-1)
+    alpha = (bits[:, None] >> (4 * np.arange(16, dtype=np.uint64))) & 0xF
+    rgba[:, :, 3] = alpha.astype(np.float32) / 15.0
+    return rgba
+
+def decode_bc3(blocks):
+    rgba = decode_colors(blocks[:, 8:16], False)
+    a0 = blocks[:, 0].astype(np.float32)
+    a1 = blocks[:, 1].astype(np.float32)
+    bits = np.zeros((len(blocks), 8), dtype=np.uint8)
+    bits[:, :6] = blocks[:, 2:8]
+    bits = bits.view("<u8").reshape(-1)
+    indices = (bits[:, None] >> (3 * np.arange(16, dtype=np.uint64))) & 7
+
+    palette = np.empty((len(blocks), 8), dtype=np.float32)
+    palette[:, 0] = a0
+    palette[:, 1] = a1
+    eight = a0 > a1
+    weights = np.arange(1, 7, dtype=np.float32)
+    # Eight alpha block: six interpolated values
+    palette[:, 2:8] = (a0[:, None] * (7.0 - weights) + a1[:, None] * weights) / 7.0
+    # Six alpha block: four interpolated values, then 0 and 255
+    six = ~eight
+    weights = np.arange(1, 5, dtype=np.float32)
+    palette[six, 2:6] = (a0[six, None] * (5.0 - weights) + a1[six, None] * weights) / 5.0
+    palette[six, 6] = 0.0
+    palette[six, 7] = 255.0
+    rgba[:, :, 3] = np.take_along_axis(palette, indices.astype(np.intp), axis=1) / 255.0
+    return rgba
+
+class DecodedImage():
+    def __init__(self, filepath, width, height, pixels):
+        self.filepath = filepath
+        self.width = width
+        self.height = height
+        self.pixels = pixels
+
+def load(filepath, level=0, max_size=None):
+    """Read and decode a DDS file. max_size picks the largest mip level that fits, instead of level"""
+    with open(filepath, "rb") as f:
+        dds = DDSFile(f.read())
+    if max_size is not None:
+        level = dds.level_for_size(max_size)
+    pixels = dds.decode(level)
+    return DecodedImage(filepath, pixels.shape[1], pixels.shape[0], pixels.reshape(-1))
@@ -0,0 +1,504 @@
+import mmap
+import struct
+
+import numpy as np
+
+# Pure-Python reader for Granny (.gr2) files.
+# Files are memory-mapped and sections are only decoded when something inside them is accessed.
+# Only uncompressed sections are supported, touching a compressed one raises GR2CompressionError
+# so callers can fall back to divine.exe.
+
+GR2_MAGIC = {
+    # (pointer size, format revision)
+    bytes.fromhex("b867b0caf86db10f84728c7e5e19001e"): (4, 6),
+    bytes.fromhex("29de6cc0baa4532b25f5b7a5f666e2ee"): (4, 7),
+    bytes.fromhex("e59b495e6f631f141e13eba990beedc4"): (8, 7),
+}
+
+SECTION_COMPRESSION = {
+    0: "None",
+    1: "Oodle0",
+    2: "Oodle1",
+    3: "BitKnit1",
+    4: "BitKnit2",
+}
+
+# granny_member_type
+MEMBER_NONE = 0
+MEMBER_INLINE = 1
+MEMBER_REFERENCE = 2
+MEMBER_REFERENCE_TO_ARRAY = 3
+MEMBER_ARRAY_OF_REFERENCES = 4
+MEMBER_VARIANT_REFERENCE = 5
+MEMBER_REFERENCE_TO_VARIANT_ARRAY = 7
+MEMBER_STRING = 8
+MEMBER_TRANSFORM = 9
+MEMBER_REAL32 = 10
+MEMBER_INT8 = 11
+MEMBER_UINT8 = 12
+MEMBER_BINORMAL_INT8 = 13
+MEMBER_NORMAL_UINT8 = 14
+MEMBER_INT16 = 15
+MEMBER_UINT16 = 16
+MEMBER_BINORMAL_INT16 = 17
+MEMBER_NORMAL_UINT16 = 18
+MEMBER_INT32 = 19
+MEMBER_UINT32 = 20
+MEMBER_REAL16 = 21
+MEMBER_EMPTY_REFERENCE = 22
+
+primitive_formats = {
+    MEMBER_REAL32: "f",
+    MEMBER_INT8: "b",
+    MEMBER_UINT8: "B",
+    MEMBER_BINORMAL_INT8: "b",
+    MEMBER_NORMAL_UINT8: "B",
+    MEMBER_INT16: "h",
+    MEMBER_UINT16: "H",
+    MEMBER_BINORMAL_INT16: "h",
+    MEMBER_NORMAL_UINT16: "H",
+    MEMBER_INT32: "i",
+    MEMBER_UINT32: "I",
+    MEMBER_REAL16: "e",
+}
+
+primitive_dtypes = {
+    MEMBER_REAL32: "<f4",
+    MEMBER_INT8: "i1",
+    MEMBER_UINT8: "u1",
+    MEMBER_BINORMAL_INT8: "i1",
+    MEMBER_NORMAL_UINT8: "u1",
+    MEMBER_INT16: "<i2",
+    MEMBER_UINT16: "<u2",
+    MEMBER_BINORMAL_INT16: "<i2",
+    MEMBER_NORMAL_UINT16: "<u2",
+    MEMBER_INT32: "<i4",
+    MEMBER_UINT32: "<u4",
+    MEMBER_REAL16: "<f2",
+}
+
+TRANSFORM_SIZE = 4 + 3 * 4 + 4 * 4 + 9 * 4
+
+class GR2Error(Exception):
+    pass
+
+class GR2CompressionError(GR2Error):
+    pass
+
+class GR2Section():
+    def __init__(self, index, compression, offset, compressed_size, uncompressed_size, alignment,
+            relocations_offset, num_relocations, marshalling_offset, num_marshalling):
+        self.index = index
+        self.compression = compression
+        self.offset = offset
+        self.compressed_size = compressed_size
+        self.uncompressed_size = uncompressed_size
+        self.alignment = alignment
+        self.relocations_offset = relocations_offset
+        self.num_relocations = num_relocations
+        self.marshalling_offset = marshalling_offset
+        self.num_marshalling = num_marshalling
+        self.data = None
+        self.relocations = None
+
+    @property
+    def compression_name(self):
+        return SECTION_COMPRESSION.get(self.compression, str(self.compression))
+
+    @property
+    def is_compressed(self):
+        return self.compression != 0 and self.uncompressed_size > 0
+
+class GR2Member():
+    def __init__(self, type, name, definition, array_size):
+        self.type = type
+        self.name = name
+        self.definition = definition
+        self.array_size = array_size
+
+class GR2Struct():
+    """Lazily decoded Granny structure, members are read from the section the first time they are accessed"""
+    __slots__ = ("file", "type_ref", "ref", "_values")
+
+    def __init__(self, file, type_ref, ref):
+        self.file = file
+        self.type_ref = type_ref
+        self.ref = ref
+        self._values = {}
+
+    def __getitem__(self, name):
+        value = self._values.get(name, self)
+        if value is self:
+            member, offset = self.file.type_layout(self.type_ref)[1][name]
+            value = self.file.read_member(member, (self.ref[0], self.ref[1] + offset))
+            self._values[name] = value
+        return value
+
+    def __contains__(self, name):
+        return name in self.file.type_layout(self.type_ref)[1]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.file.type_layout(self.type_ref)[0])
+
+    def __repr__(self):
+        return "GR2Struct({})".format(", ".join(self.keys()))
+
+    def get(self, name, default=None):
+        if name in self:
+            return self[name]
+        return default
+
+    def keys(self):
+        return [m.name for m, _ in self.file.type_layout(self.type_ref)[0]]
+
+    def items(self):
+        return [(name, self[name]) for name in self.keys()]
+
+class GR2Array():
+    """Lazily decoded array of inline structures, with a zero-copy NumPy view when the element type allows it"""
+
+    def __init__(self, file, type_ref, ref, count):
+        self.file = file
+        self.type_ref = type_ref
+        self.ref = ref
+        self.count = count if ref is not None else 0
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self.count))]
+        if index < 0:
+            index += self.count
+        if index < 0 or index >= self.count:
+            raise IndexError(index)
+        size = self.file.struct_size(self.type_ref)
+        return self.file.read_struct(self.type_ref, (self.ref[0], self.ref[1] + index * size))
+
+    def __iter__(self):
+        for i in range(self.count):
+            yield self[i]
+
+    @property
+    def dtype(self):
+        return self.file.struct_dtype(self.type_ref)
+
+    @property
+    def array(self):
+        """Structured array viewing the section buffer directly"""
+        dtype = self.dtype
+        if dtype is None:
+            raise GR2Error("Element type of this array can't be viewed as a NumPy array")
+        if self.count == 0:
+            return np.zeros(0, dtype=dtype)
+        return np.frombuffer(self.file.section_data(self.ref[0]), dtype=dtype, count=self.count, offset=self.ref[1])
+
+    @property
+    def values(self):
+        """View of the only member of single-value element types (Real32, Int32, UInt16 etc.)"""
+        array = self.array
+        if len(array.dtype.names) != 1:
+            raise GR2Error("Array elements have more than one member")
+        return array[array.dtype.names[0]]
+
+    def field(self, name):
+        return self.array[name]
+
+class GR2File():
+    def __init__(self, data, filepath=""):
+        self.filepath = filepath
+        self.raw = data
+        self.pointer_size = 4
+        self.version = 0
+        self.sections = []
+        self.types = {}
+        self.layouts = {}
+        self.dtypes = {}
+        self.objects = {}
+        self._file = None
+        self._read_header()
+
+    def _read_header(self):
+        data = self.raw
+        if len(data) < 0x20:
+            raise GR2Error("File is too small to be a GR2 file")
+        magic = bytes(data[0:16])
+        if magic not in GR2_MAGIC:
+            raise GR2Error("Unsupported GR2 magic {}".format(magic.hex()))
+        self.pointer_size, _ = GR2_MAGIC[magic]
+        header_size, header_format = struct.unpack_from("<2I", data, 16)
+        if header_format != 0:
+            raise GR2Error("Unsupported GR2 header format {}".format(header_format))
+
+        info = 0x20
+        (self.version, self.total_size, self.crc, sections_offset, num_sections,
+            root_type_section, root_type_offset, root_node_section, root_node_offset,
+            self.tag) = struct.unpack_from("<10I", data, info)
+        if self.version not in (6, 7):
+            raise GR2Error("Unsupported GR2 file version {}".format(self.version))
+        self.root_type = (root_type_section, root_type_offset)
+        self.root_node = (root_node_section, root_node_offset)
+
+        for index in range(num_sections):
+            fields = struct.unpack_from("<11I", data, info + sections_offset + index * 44)
+            (compression, offset, compressed_size, uncompressed_size, alignment, _, _,
+                relocations_offset, num_relocations, marshalling_offset, num_marshalling) = fields
+            section = GR2Section(index, compression, offset, compressed_size, uncompressed_size,
+                alignment, relocations_offset, num_relocations, marshalling_offset, num_marshalling)
+            if not section.is_compressed and offset + uncompressed_size > len(data):
+                raise GR2Error("Section {} runs past the end of the file".format(index))
+            self.sections.append(section)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        # NumPy views handed out by this file keep the map alive, so only close it when nothing references it anymore.
+        for section in self.sections:
+            section.data = None
+        self.objects.clear()
+        if isinstance(self.raw, mmap.mmap):
+            try:
+                self.raw.close()
+            except BufferError:
+                pass
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def compressed_sections(self):
+        return [s for s in self.sections if s.is_compressed]
+
+    def section_data(self, index):
+        section = self.sections[index]
+        if section.data is None:
+            if section.is_compressed:
+                raise GR2CompressionError("Section {} uses {} compression".format(index, section.compression_name))
+            section.data = memoryview(self.raw)[section.offset:section.offset + section.uncompressed_size]
+        return section.data
+
+    def section_relocations(self, index):
+        section = self.sections[index]
+        if section.relocations is None:
+            relocations = {}
+            if section.num_relocations > 0:
+                table = np.frombuffer(self.raw, dtype="<u4", count=section.num_relocations * 3,
+                    offset=section.relocations_offset).reshape(-1, 3)
+                for offset, target_section, target_offset in table.tolist():
+                    relocations[offset] = (target_section, target_offset)
+            section.relocations = relocations
+        return section.relocations
+
+    def marshalling(self, index):
+        section = self.sections[index]
+        entries = []
+        for i in range(section.num_marshalling):
+            count, offset, type_section, type_offset = struct.unpack_from("<4I", self.raw, section.marshalling_offset + i * 16)
+            entries.append((offset, count, (type_section, type_offset)))
+        return entries
+
+    def _unpack(self, fmt, ref):
+        return struct.unpack_from("<" + fmt, self.section_data(ref[0]), ref[1])
+
+    def pointer(self, ref):
+        return self.section_relocations(ref[0]).get(ref[1], None)
+
+    def string(self, ref):
+        if ref is None:
+            return None
+        data = self.section_data(ref[0])
+        end = ref[1]
+        while end < len(data) and data[end] != 0:
+            end += 1
+        return bytes(data[ref[1]:end]).decode("utf-8", errors="replace")
+
+    def type_definition(self, ref):
+        members = self.types.get(ref)
+        if members is not None:
+            return members
+        members = []
+        self.types[ref] = members
+        ptr = self.pointer_size
+        member_size = 4 + ptr + ptr + 4 + 12 + ptr
+        section, offset = ref
+        while True:
+            member_type = self._unpack("I", (section, offset))[0]
+            if member_type == MEMBER_NONE:
+                break
+            name = self.string(self.pointer((section, offset + 4)))
+            definition = self.pointer((section, offset + 4 + ptr))
+            array_size = self._unpack("I", (section, offset + 4 + ptr * 2))[0]
+            members.append(GR2Member(member_type, name, definition, array_size))
+            offset += member_size
+        return members
+
+    def type_layout(self, ref):
+        layout = self.layouts.get(ref)
+        if layout is None:
+            ordered = []
+            offset = 0
+            for member in self.type_definition(ref):
+                ordered.append((member, offset))
+                offset += self.member_size(member)
+            layout = (ordered, {m.name: (m, o) for m, o in ordered}, offset)
+            self.layouts[ref] = layout
+        return layout
+
+    def member_size(self, member):
+        ptr = self.pointer_size
+        t = member.type
+        if t == MEMBER_INLINE:
+            size = self.struct_size(member.definition)
+        elif t in (MEMBER_REFERENCE, MEMBER_STRING, MEMBER_EMPTY_REFERENCE):
+            size = ptr
+        elif t in (MEMBER_REFERENCE_TO_ARRAY, MEMBER_ARRAY_OF_REFERENCES):
+            size = 4 + ptr
+        elif t == MEMBER_VARIANT_REFERENCE:
+            size = ptr * 2
+        elif t == MEMBER_REFERENCE_TO_VARIANT_ARRAY:
+            size = ptr * 2 + 4
+        elif t == MEMBER_TRANSFORM:
+            size = TRANSFORM_SIZE
+        elif t in primitive_formats:
+            size = struct.calcsize("<" + primitive_formats[t])
+        else:
+            raise GR2Error("Unknown member type {} for '{}'".format(t, member.name))
+        return size * max(member.array_size, 1)
+
+    def struct_size(self, type_ref):
+        return self.type_layout(type_ref)[2]
+
+    def struct_dtype(self, type_ref):
+        if type_ref in self.dtypes:
+            return self.dtypes[type_ref]
+        names, formats, offsets = [], [], []
+        dtype = None
+        for member, offset in self.type_layout(type_ref)[0]:
+            if member.type in primitive_dtypes:
+                member_dtype = np.dtype(primitive_dtypes[member.type])
+            elif member.type == MEMBER_INLINE:
+                member_dtype = self.struct_dtype(member.definition)
+            else:
+                member_dtype = None
+            if member_dtype is None:
+                break
+            if member.array_size > 0:
+                member_dtype = np.dtype((member_dtype, (member.array_size,)))
+            names.append(member.name)
+            formats.append(member_dtype)
+            offsets.append(offset)
+        else:
+            dtype = np.dtype({"names": names, "formats": formats, "offsets": offsets,
+                "itemsize": self.struct_size(type_ref)})
+        self.dtypes[type_ref] = dtype
+        return dtype
+
+    def read_struct(self, type_ref, ref):
+        if type_ref is None or ref is None:
+            return None
+        key = (type_ref, ref)
+        obj = self.objects.get(key)
+        if obj is None:
+            obj = GR2Struct(self, type_ref, ref)
+            self.objects[key] = obj
+        return obj
+
+    def read_transform(self, ref):
+        values = self._unpack("I16f", ref)
+        return {
+            "Flags": values[0],
+            "Position": values[1:4],
+            "Orientation": values[4:8],
+            "ScaleShear": values[8:17],
+        }
+
+    def read_member(self, member, ref):
+        if member.array_size > 0 and member.type != MEMBER_INLINE:
+            if member.type in primitive_dtypes:
+                return np.frombuffer(self.section_data(ref[0]), dtype=primitive_dtypes[member.type],
+                    count=member.array_size, offset=ref[1])
+            single = GR2Member(member.type, member.name, member.definition, 0)
+            size = self.member_size(single)
+            return [self.read_member(single, (ref[0], ref[1] + i * size)) for i in range(member.array_size)]
+
+        ptr = self.pointer_size
+        section, offset = ref
+        t = member.type
+        if t == MEMBER_INLINE:
+            if member.array_size > 0:
+                return GR2Array(self, member.definition, ref, member.array_size)
+            return self.read_struct(member.definition, ref)
+        elif t == MEMBER_REFERENCE:
+            return self.read_struct(member.definition, self.pointer(ref))
+        elif t == MEMBER_REFERENCE_TO_ARRAY:
+            count = self._unpack("i", ref)[0]
+            return GR2Array(self, member.definition, self.pointer((section, offset + 4)), count)
+        elif t == MEMBER_ARRAY_OF_REFERENCES:
+            count = self._unpack("i", ref)[0]
+            items = self.pointer((section, offset + 4))
+            if items is None:
+                return []
+            return [self.read_struct(member.definition, self.pointer((items[0], items[1] + i * ptr))) for i in range(count)]
+        elif t == MEMBER_VARIANT_REFERENCE:
+            return self.read_struct(self.pointer(ref), self.pointer((section, offset + ptr)))
+        elif t == MEMBER_REFERENCE_TO_VARIANT_ARRAY:
+            type_ref = self.pointer(ref)
+            count = self._unpack("i", (section, offset + ptr))[0]
+            return GR2Array(self, type_ref, self.pointer((section, offset + ptr + 4)), count)
+        elif t == MEMBER_STRING:
+            return self.string(self.pointer(ref))
+        elif t == MEMBER_TRANSFORM:
+            return self.read_transform(ref)
+        elif t == MEMBER_EMPTY_REFERENCE:
+            return None
+        else:
+            return self._unpack(primitive_formats[t], ref)[0]
+
+    @property
+    def root(self):
+        return self.read_struct(self.root_type, self.root_node)
+
+def open_file(filepath):
+    f = open(filepath, "rb")
+    try:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        gr2 = GR2File(data, filepath)
+    except (ValueError, OSError, struct.error) as e:
+        f.close()
+        raise GR2Error("Failed to map '{}': {}".format(filepath, e))
+    except GR2Error:
+        f.close()
+        raise
+    gr2._file = f
+    return gr2
+
+def is_supported(filepath):
+    try:
+        with open_file(filepath) as gr2:
+            return len(gr2.compressed_sections()) == 0
+    except (OSError, GR2Error):
+        return False
+
+def triangle_indices(topology):
+    if topology is None:
+        return np.zeros(0, dtype=np.int32)
+    indices = topology.get("Indices")
+    if indices is None or len(indices) == 0:
+        indices = topology.get("Indices16")
+    if indices is None or len(indices) == 0:
+        return np.zeros(0, dtype=np.int32)
+    return indices.values
+
+def up_axis(root):
+    art_tool_info = root.get("ArtToolInfo")
+    if art_tool_info is not None and art_tool_info.get("UpVector") is not None:
+        up = art_tool_info["UpVector"]
+        return "XYZ"[max(range(3), key=lambda i: abs(up[i]))]
+    return "Z"
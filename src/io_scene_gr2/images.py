@@ -0,0 +1,122 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Image lookups for material building.
+# ImageIndex finds existing images by file path or basename without scanning bpy.data.images,
+# ImagePreloader reads texture files on worker threads before the main thread needs them.
+
+def read_file(filepath):
+    with open(filepath, "rb") as f:
+        return f.read()
+
+def is_valid(image):
+    # Images removed from bpy.data raise ReferenceError on access
+    try:
+        image.name
+        return True
+    except ReferenceError:
+        return False
+
+class ImageIndex():
+    """Images keyed by normalized file path and by basename, kept in step with an images collection"""
+
+    def __init__(self, abspath=None):
+        self.abspath = abspath or (lambda path: path)
+        self.by_path = {}
+        self.by_name = {}
+        self.size = None
+
+    def normalize(self, filepath):
+        return os.path.normcase(os.path.normpath(self.abspath(filepath)))
+
+    def basename(self, filepath):
+        return os.path.basename(self.normalize(filepath))
+
+    def add(self, image):
+        if image.filepath != "" and image.filepath is not None:
+            self.by_path[self.normalize(image.filepath)] = image
+            self.by_name.setdefault(self.basename(image.filepath), image)
+
+    def rebuild(self, images):
+        self.by_path.clear()
+        self.by_name.clear()
+        for image in images:
+            self.add(image)
+        self.size = len(images)
+
+    def sync(self, images):
+        # Images added or removed outside of the importer
+        if self.size != len(images):
+            self.rebuild(images)
+
+    def lookup(self, filepath):
+        image = self.by_path.get(self.normalize(filepath))
+        if image is not None:
+            return image, True
+        return self.by_name.get(self.basename(filepath)), False
+
+    def find(self, images, filepath):
+        """Return (image, exact) for filepath, exact is False when only the basename matched"""
+        self.sync(images)
+        image, exact = self.lookup(filepath)
+        if image is not None and not (is_valid(image) and self.basename(image.filepath) == self.basename(filepath)):
+            # Removed or repathed since it was indexed
+            self.rebuild(images)
+            image, exact = self.lookup(filepath)
+        return image, exact
+
+    def relink(self, image, filepath):
+        image.filepath = filepath
+        self.add(image)
+
+    def loaded(self, images, image):
+        self.add(image)
+        self.size = len(images)
+
+    def clear(self):
+        self.by_path.clear()
+        self.by_name.clear()
+        self.size = None
+
+class ImagePreloader():
+    """Runs loader(filepath) for upcoming textures on a thread pool, take() hands the result to the main thread"""
+
+    def __init__(self, max_workers=4, loader=read_file):
+        self.executor = ThreadPoolExecutor(max_workers=max(1, max_workers))
+        self.loader = loader
+        self.futures = {}
+        self.lock = threading.Lock()
+
+    def key(self, filepath):
+        return os.path.normcase(os.path.abspath(filepath))
+
+    def preload(self, filepaths):
+        with self.lock:
+            for filepath in filepaths:
+                if filepath is None or filepath == "" or not os.path.isfile(filepath):
+                    continue
+                key = self.key(filepath)
+                if key not in self.futures:
+                    self.futures[key] = self.executor.submit(self.loader, filepath)
+
+    def take(self, filepath):
+        with self.lock:
+            future = self.futures.pop(self.key(filepath), None)
+        if future is None:
+            return None
+        try:
+            return future.result()
+        except (OSError, ValueError) as e:
+            print("[DOS2DE-Importer] Failed to preload '{}': {}".format(filepath, e))
+            return None
+
+    def clear(self):
+        with self.lock:
+            for future in self.futures.values():
+                future.cancel()
+            self.futures.clear()
+
+    def shutdown(self):
+        self.clear()
+        self.executor.shutdown(wait=False)
@@ -0,0 +1,165 @@
+import hashlib
+
+import numpy as np
+
+# Builds bpy.types.Mesh data from contiguous vertex/index arrays with foreach_set calls.
+# Nothing here imports bpy at module level, so the builder can be driven with a stubbed mesh.
+
+def _floats(values, width):
+    return np.ascontiguousarray(values, dtype=np.float32).reshape(-1, width)
+
+def _ints(values):
+    return np.ascontiguousarray(values, dtype=np.int32).reshape(-1)
+
+def triangle_material_indices(groups, num_triangles):
+    material_indices = np.zeros(num_triangles, dtype=np.int32)
+    for material_index, first, count in groups:
+        material_indices[first:first + count] = material_index
+    return material_indices
+
+def fill_mesh(mesh_data, positions, indices, normals=None, uvs=None, material_indices=None, flip_uv=True,
+        loop_normals=None, loop_uvs=None):
+    """normals and uvs are per vertex, loop_normals and loop_uvs per triangle corner"""
+    positions = _floats(positions, 3)
+    indices = _ints(indices)
+    num_vertices = len(positions)
+    num_loops = len(indices) - len(indices) % 3
+    num_polygons = num_loops // 3
+    indices = indices[:num_loops]
+
+    mesh_data.vertices.add(num_vertices)
+    mesh_data.loops.add(num_loops)
+    mesh_data.polygons.add(num_polygons)
+
+    mesh_data.vertices.foreach_set("co", positions.ravel())
+    mesh_data.loops.foreach_set("vertex_index", indices)
+    mesh_data.polygons.foreach_set("loop_start", np.arange(0, num_loops, 3, dtype=np.int32))
+    mesh_data.polygons.foreach_set("loop_total", np.full(num_polygons, 3, dtype=np.int32))
+
+    if material_indices is not None:
+        mesh_data.polygons.foreach_set("material_index", _ints(material_indices)[:num_polygons])
+
+    if uvs is not None:
+        loop_uvs = _floats(uvs, 2)[indices]
+    elif loop_uvs is not None:
+        loop_uvs = _floats(loop_uvs, 2)[:num_loops].copy()
+    if loop_uvs is not None:
+        if flip_uv:
+            loop_uvs[:, 1] = 1.0 - loop_uvs[:, 1]
+        uv_layer = mesh_data.uv_layers.new(name="UVMap")
+        uv_layer.data.foreach_set("uv", loop_uvs.ravel())
+
+    mesh_data.update(calc_edges=True)
+    mesh_data.validate(clean_customdata=False)
+
+    if loop_normals is not None and len(mesh_data.loops) != num_loops:
+        # validate() removed faces, the corners no longer line up
+        loop_normals = None
+    if normals is not None or loop_normals is not None:
+        mesh_data.polygons.foreach_set("use_smooth", np.ones(len(mesh_data.polygons), dtype=bool))
+        if hasattr(mesh_data, "use_auto_smooth"):
+            mesh_data.use_auto_smooth = True
+        if normals is not None:
+            mesh_data.normals_split_custom_set_from_vertices(_floats(normals, 3))
+        else:
+            mesh_data.normals_split_custom_set(_floats(loop_normals, 3)[:num_loops])
+
+    mesh_data.update()
+    return mesh_data
+
+def create_mesh(name, positions, indices, normals=None, uvs=None, material_indices=None, flip_uv=True, meshes=None,
+        loop_normals=None, loop_uvs=None):
+    if meshes is None:
+        import bpy
+        meshes = bpy.data.meshes
+    mesh_data = meshes.new(name)
+    return fill_mesh(mesh_data, positions, indices, normals=normals, uvs=uvs,
+        material_indices=material_indices, flip_uv=flip_uv, loop_normals=loop_normals, loop_uvs=loop_uvs)
+
+def transform_points(points, matrix):
+    matrix = np.asarray(matrix, dtype=np.float64)
+    return (points @ matrix[:3, :3].T + matrix[:3, 3]).astype(np.float32)
+
+def transform_mesh(mesh_data, matrix):
+    """Bake a 4x4 matrix into the vertex positions and shape keys of mesh_data"""
+    count = len(mesh_data.vertices)
+    co = np.empty(count * 3, dtype=np.float32)
+    mesh_data.vertices.foreach_get("co", co)
+    mesh_data.vertices.foreach_set("co", transform_points(co.reshape(-1, 3), matrix).ravel())
+    if mesh_data.shape_keys is not None:
+        for key_block in mesh_data.shape_keys.key_blocks:
+            key_block.data.foreach_get("co", co)
+            key_block.data.foreach_set("co", transform_points(co.reshape(-1, 3), matrix).ravel())
+    mesh_data.update()
+    return mesh_data
+
+def geometry_hash(mesh_data, extra=()):
+    """Hash of the vertex, face, index and UV buffers of mesh_data, plus any extra values"""
+    digest = hashlib.sha1()
+    digest.update(np.array((len(mesh_data.vertices), len(mesh_data.loops), len(mesh_data.polygons),
+        len(mesh_data.materials)), dtype=np.int64).tobytes())
+    buffers = [
+        (mesh_data.vertices, "co", np.float32, 3),
+        (mesh_data.polygons, "loop_total", np.int32, 1),
+        (mesh_data.polygons, "material_index", np.int32, 1),
+        (mesh_data.loops, "vertex_index", np.int32, 1),
+    ]
+    buffers += [(layer.data, "uv", np.float32, 2) for layer in mesh_data.uv_layers]
+    for collection, name, dtype, width in buffers:
+        values = np.empty(len(collection) * width, dtype=dtype)
+        collection.foreach_get(name, values)
+        digest.update(values.tobytes())
+    for value in extra:
+        digest.update(str(value).encode("utf-8"))
+    return digest.hexdigest()
+
+def flatten_influences(groups, weights):
+    """(vertices, k) group index and weight arrays to one entry per influence"""
+    groups = np.asarray(groups).reshape(len(groups), -1)
+    weights = np.asarray(weights, dtype=np.float32).reshape(len(groups), -1)
+    vertices = np.repeat(np.arange(len(groups)), groups.shape[1])
+    return vertices, groups.reshape(-1), weights.reshape(-1)
+
+def prepare_influences(vertices, groups, weights, normalize=True, max_influences=None):
+    """Drop empty influences, keep the max_influences largest per vertex and make each vertex's weights sum to 1"""
+    vertices = np.asarray(vertices, dtype=np.int64)
+    groups = np.asarray(groups, dtype=np.int64)
+    weights = np.asarray(weights, dtype=np.float32)
+    keep = (weights > 0.0) & (groups >= 0)
+    vertices, groups, weights = vertices[keep], groups[keep], weights[keep]
+    if max_influences is not None and len(vertices) > 0:
+        # Largest weights first within each vertex, then cut every run at max_influences
+        order = np.lexsort((-weights, vertices))
+        vertices, groups, weights = vertices[order], groups[order], weights[order]
+        run_starts = np.flatnonzero(np.r_[True, vertices[1:] != vertices[:-1]])
+        rank = np.arange(len(vertices)) - np.repeat(run_starts, np.diff(np.r_[run_starts, len(vertices)]))
+        keep = rank < max_influences
+        vertices, groups, weights = vertices[keep], groups[keep], weights[keep]
+    if normalize and len(vertices) > 0:
+        totals = np.bincount(vertices, weights=weights)
+        weights = (weights / totals[vertices]).astype(np.float32)
+    return vertices, groups, weights
+
+def weight_groups(vertices, groups, weights, steps=None):
+    """Split influences into (group, weight, vertex indices) runs, one VertexGroup.add call each.
+    Influences are grouped by their exact weight. Pass steps for weights read from integers, like the bytes of gr2 vertices,
+    to snap them back to multiples of 1/steps so a group needs at most steps calls"""
+    vertices = np.asarray(vertices)
+    groups = np.asarray(groups)
+    weights = np.asarray(weights, dtype=np.float64)
+    if steps is not None:
+        weights = np.rint(weights * steps) / steps
+    keep = weights > 0.0
+    vertices, groups, weights = vertices[keep], groups[keep], weights[keep]
+    order = np.lexsort((vertices, weights, groups))
+    groups = groups[order]
+    weights = weights[order]
+    vertices = vertices[order]
+    breaks = np.flatnonzero((groups[1:] != groups[:-1]) | (weights[1:] != weights[:-1])) + 1
+    starts = np.concatenate(([0], breaks))
+    ends = np.concatenate((breaks, [len(order)]))
+    starts = starts.tolist()
+    vertices = vertices.tolist()
+    groups = groups[starts].tolist() if len(order) > 0 else []
+    weights = weights[starts].tolist() if len(order) > 0 else []
+    return [(group, weight, vertices[s:e]) for group, weight, s, e in zip(groups, weights, starts, ends.tolist()) if e > s]
@@ -0,0 +1,97 @@
+import hashlib
+import os
+import re
+import threading
+
+# Catalog of the base skeletons found in the extracted assets directory.
+# The enum items callback redraws constantly, so it only ever reads the catalog. Scanning the assets
+# directory happens in a background thread whenever the directory changes.
+
+class SkeletonCatalog():
+    def __init__(self, races):
+        self.races = races
+        self.assets_dir = None
+        self.entries = {}
+        self.items = []
+        self.matcher = None
+        self.matcher_keys = {}
+        self.lock = threading.Lock()
+        self.thread = None
+        self.generation = 0
+
+    def scan(self, assets_dir):
+        entries = {}
+        if assets_dir != "" and os.path.isdir(assets_dir):
+            characters_dir = os.path.join(assets_dir, "Characters")
+            if os.path.isdir(characters_dir):
+                for race in self.races:
+                    race_dir = os.path.join(characters_dir, race)
+                    if os.path.isdir(race_dir):
+                        for gender in ("Female", "Male"):
+                            base_skeleton = os.path.join(race_dir, "{}_{}_Base.gr2".format(race, gender))
+                            if os.path.isfile(base_skeleton):
+                                entries[race + "_" + gender] = (base_skeleton, race, gender)
+        return entries
+
+    def build_matcher(self, entries):
+        # One alternative per name a file can carry, earlier catalog entries win when several match
+        alternatives = []
+        matcher_keys = {}
+        for priority, (key, (base_skeleton, race, gender)) in enumerate(entries.items()):
+            for name in (key, race + "_Hero_" + gender):
+                group = "g{}".format(len(alternatives))
+                alternatives.append("(?P<{}>{})".format(group, re.escape(name)))
+                matcher_keys[group] = (priority, key)
+        if len(alternatives) == 0:
+            return None, {}
+        return re.compile("|".join(alternatives)), matcher_keys
+
+    def build(self, assets_dir, generation=None):
+        entries = self.scan(assets_dir)
+        matcher, matcher_keys = self.build_matcher(entries)
+        items = [(key, "{} {}".format(race, gender), path) for key, (path, race, gender) in entries.items()]
+        with self.lock:
+            if generation is not None and generation != self.generation:
+                return
+            self.entries = entries
+            self.items = items
+            self.matcher = matcher
+            self.matcher_keys = matcher_keys
+
+    def refresh(self, assets_dir, background=True):
+        with self.lock:
+            self.assets_dir = assets_dir
+            self.generation += 1
+            generation = self.generation
+        if background:
+            self.thread = threading.Thread(target=self.build, args=(assets_dir, generation), daemon=True)
+            self.thread.start()
+        else:
+            self.build(assets_dir, generation)
+
+    def wait(self):
+        thread = self.thread
+        if thread is not None:
+            thread.join()
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        return entry[0] if entry is not None else None
+
+    def match(self, filename):
+        """Path of the base skeleton whose race and gender appear in filename, or None"""
+        with self.lock:
+            matcher, matcher_keys, entries = self.matcher, self.matcher_keys, self.entries
+        if matcher is None:
+            return None
+        matches = [matcher_keys[m.lastgroup] for m in matcher.finditer(filename)]
+        if len(matches) == 0:
+            return None
+        return entries[min(matches)[1]][0]
+
+def skeleton_hash(bones):
+    """Hash of a bone hierarchy given as (name, parent name) pairs, independent of the bone order"""
+    digest = hashlib.sha1()
+    for name, parent in sorted((name, parent or "") for name, parent in bones):
+        digest.update("{}\0{}\n".format(name, parent).encode("utf-8"))
+    return digest.hexdigest()
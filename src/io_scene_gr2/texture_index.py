@@ -0,0 +1,77 @@
+import bisect
+import os
+import re
+import threading
+
+# Index of the .dds files in texture directories, so materials don't list and regex-scan a directory per mesh.
+# Files are grouped by map kind and sorted by name, and prefix lookups are memoized per (prefix, kind).
+# A directory is re-listed when its mtime changes.
+
+texture_name_pattern = re.compile(r"^(.*?)_(BM|BMA|NM|PM|MSKcloth|MSKskin)\.dds$")
+
+# BMA (base color with alpha) is looked up together with BM
+kind_aliases = {"BMA": "BM"}
+
+class DirectoryEntry():
+    def __init__(self, directory, mtime):
+        self.directory = directory
+        self.mtime = mtime
+        self.textures = {}
+        self.matches = {}
+
+    def add(self, stem, kind, filename):
+        self.textures.setdefault(kind, []).append((stem, filename))
+
+    def sort(self):
+        for textures in self.textures.values():
+            textures.sort()
+
+    def find(self, prefix, kind):
+        key = (prefix, kind)
+        if key in self.matches:
+            return self.matches[key]
+        path = None
+        textures = self.textures.get(kind, [])
+        start = bisect.bisect_left(textures, (prefix, ""))
+        if start < len(textures) and textures[start][0].startswith(prefix):
+            path = os.path.join(self.directory, textures[start][1])
+        self.matches[key] = path
+        return path
+
+class TextureIndex():
+    def __init__(self):
+        self.directories = {}
+        self.lock = threading.Lock()
+
+    def entry(self, directory):
+        try:
+            mtime = os.stat(directory).st_mtime_ns
+        except OSError:
+            return None
+        with self.lock:
+            entry = self.directories.get(directory)
+            if entry is None or entry.mtime != mtime:
+                entry = DirectoryEntry(directory, mtime)
+                for filename in os.listdir(directory):
+                    m = texture_name_pattern.match(filename)
+                    if m is not None:
+                        kind = kind_aliases.get(m.group(2), m.group(2))
+                        entry.add(m.group(1), kind, filename)
+                entry.sort()
+                self.directories[directory] = entry
+            return entry
+
+    def find(self, directory, prefix, kind):
+        """Path of the first texture in directory named <prefix>*_<kind>.dds, or None"""
+        entry = self.entry(directory)
+        if entry is None:
+            return None
+        with self.lock:
+            return entry.find(prefix, kind_aliases.get(kind, kind))
+
+    def clear(self):
+        with self.lock:
+            self.directories.clear()
+
+# Shared by every import in the session, so batch imports list each texture directory once
+directory_index = TextureIndex()
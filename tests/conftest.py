@@ -0,0 +1,11 @@
+import os
+import sys
+import types
+
+# The add-on's __init__ needs bpy, register the package without running it
+# so the modules that only need numpy can be tested outside of Blender.
+package_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src", "io_scene_gr2")
+if "io_scene_gr2" not in sys.modules:
+    package = types.ModuleType("io_scene_gr2")
+    package.__path__ = [package_dir]
+    sys.modules["io_scene_gr2"] = package
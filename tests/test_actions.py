@@ -0,0 +1,54 @@
+import numpy as np
+
+from io_scene_gr2 import actions
+
+def keys(frames, values):
+    co = np.stack((frames, values), axis=-1).astype(np.float32)
+    return actions.Keyframes(co, co.copy(), co.copy())
+
+def test_clean_mask_linear_segments():
+    frames = np.arange(9, dtype=np.float32)
+    values = np.array([0, 1, 2, 3, 4, 3, 2, 1, 0], dtype=np.float32)
+    keep = actions.clean_mask(keys(frames, values).co, 0.01)
+    assert np.flatnonzero(keep).tolist() == [0, 4, 8]
+
+def test_clean_mask_stays_within_threshold():
+    frames = np.linspace(0, 100, 201)
+    values = np.sin(frames * 0.1)
+    co = keys(frames, values).co
+    for threshold in (0.1, 0.01, 0.001):
+        keep = actions.clean_mask(co, threshold)
+        assert keep[0] and keep[-1]
+        error = np.abs(np.interp(co[:, 0], co[keep, 0], co[keep, 1]) - co[:, 1])
+        assert error.max() <= threshold
+    assert keep.sum() < len(co)
+
+def test_clean_mask_flat_and_empty():
+    assert actions.clean_mask(keys([0, 1, 2], [1.0, 1.0005, 1.0]).co, 0.001).tolist() == [True, False, False]
+    assert len(actions.clean_mask(np.zeros((0, 2), dtype=np.float32), 0.001)) == 0
+
+def test_resample_keyframes():
+    resampled = actions.resample_keyframes(keys([0, 4, 5], [0, 8, 0]), 2)
+    assert resampled.co[:, 0].tolist() == [0, 2, 4, 5]
+    assert np.allclose(resampled.co[:, 1], [0, 4, 8, 0])
+    single = keys([3], [1])
+    assert actions.resample_keyframes(single, 2) is single
+
+def test_offset_and_select():
+    keyframes = keys([0, 1, 2], [5, 6, 7])
+    actions.offset_keyframes(keyframes, 1.0)
+    assert keyframes.co[:, 0].tolist() == [1, 2, 3]
+    assert keyframes.handle_left[:, 0].tolist() == [1, 2, 3]
+    selected = keyframes.select(np.array([True, False, True]))
+    assert len(selected) == 2
+    assert selected.handle_right[:, 1].tolist() == [5, 7]
+
+def test_sampled_keyframes():
+    frames = np.arange(4, dtype=np.float64)
+    assert len(actions.sampled_keyframes(frames, np.full(4, 0.5))) == 1
+    assert actions.sampled_keyframes(frames, np.arange(4.0)).co[:, 1].tolist() == [0, 1, 2, 3]
+
+def test_resample_keeps_whole_steps():
+    resampled = actions.resample_keyframes(keys([1, 2, 7], [0, 1, 6]), 3)
+    assert resampled.co[:, 0].tolist() == [1, 4, 7]
+    assert np.allclose(resampled.co[:, 1], [0, 3, 6])
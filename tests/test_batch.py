@@ -0,0 +1,77 @@
+import json
+import os
+
+import pytest
+
+from io_scene_gr2 import batch
+
+def touch(path, data=b""):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+
+def make_tree(root, names):
+    for name in names:
+        touch(os.path.join(str(root), *name.split("/")))
+
+def write_shard(output_dir, shard, entries):
+    with open(batch.shard_manifest_path(str(output_dir), shard), "a", encoding="utf-8") as f:
+        for entry in entries:
+            f.write(json.dumps(entry) + "\n")
+
+def test_find_files(tmp_path):
+    make_tree(tmp_path, ["b/z.gr2", "b/a.GR2", "a.gr2", "a/c.gr2", "notes.txt", "c.dae"])
+    assert batch.find_files(str(tmp_path)) == ["a.gr2", os.path.join("a", "c.gr2"), os.path.join("b", "a.GR2"), os.path.join("b", "z.gr2")]
+    assert batch.find_files(str(tmp_path), (".dae",)) == ["c.dae"]
+
+def test_pending_files_resume(tmp_path):
+    files = ["done.gr2", "failed.gr2", "deleted.gr2", "new.gr2"]
+    touch(str(tmp_path / "done.dae"))
+    write_shard(tmp_path, None, [
+        {"source": "done.gr2", "output": "done.dae", "status": "ok"},
+        {"source": "failed.gr2", "output": "failed.dae", "status": "failed"},
+        {"source": "deleted.gr2", "output": "deleted.dae", "status": "ok"},
+    ])
+    assert batch.pending_files(files, str(tmp_path), resume=False) == files
+    assert batch.pending_files(files, str(tmp_path), resume=True) == ["failed.gr2", "deleted.gr2", "new.gr2"]
+
+def test_manifest_merge(tmp_path):
+    with open(str(tmp_path / batch.MANIFEST_NAME), "w", encoding="utf-8") as f:
+        json.dump({"files": {"a.gr2": {"source": "a.gr2", "output": "a.dae", "status": "failed"}}}, f)
+    write_shard(tmp_path, (0, 2), [{"source": "a.gr2", "output": "a.dae", "status": "ok"}])
+    write_shard(tmp_path, (1, 2), [{"source": "b.gr2", "output": "b.dae", "status": "failed"}])
+    with open(batch.shard_manifest_path(str(tmp_path), (1, 2)), "a", encoding="utf-8") as f:
+        f.write('{"source": "c.gr2", "sta')
+    manifest = batch.write_manifest(str(tmp_path), str(tmp_path))
+    assert (manifest["succeeded"], manifest["failed"]) == (1, 1)
+    assert sorted(manifest["files"]) == ["a.gr2", "b.gr2"]
+    assert sorted(os.listdir(str(tmp_path))) == [batch.MANIFEST_NAME]
+    assert batch.read_manifest(str(tmp_path)) == manifest["files"]
+
+def test_parse_shard():
+    assert batch.parse_shard("1/3") == (1, 3)
+    for value in ("3/3", "-1/2", "0/0"):
+        with pytest.raises(Exception):
+            batch.parse_shard(value)
+
+def test_shards_split_the_full_listing(tmp_path):
+    source, output = tmp_path / "source", tmp_path / "output"
+    names = ["{}.gr2".format(i) for i in range(5)]
+    make_tree(source, names)
+    # Without divine.exe every file fails, which still records the files each shard took
+    arguments = [str(source), str(output), "--divine", str(tmp_path / "missing.exe")]
+    assert batch.run(arguments + ["--shard", "0/2"]) == 1
+    assert batch.run(arguments + ["--shard", "1/2"]) == 1
+    shards = []
+    for shard in ((0, 2), (1, 2)):
+        with open(batch.shard_manifest_path(str(output), shard), encoding="utf-8") as f:
+            shards.append([json.loads(line)["source"] for line in f])
+    assert shards == [names[0::2], names[1::2]]
+    assert all(e["status"] == "failed" and "divine.exe" in e["error"] for e in batch.read_manifest(str(output)).values())
+
+def test_missing_source_dir(tmp_path, capsys):
+    with pytest.raises(SystemExit) as e:
+        batch.run([str(tmp_path / "missing"), str(tmp_path / "output")])
+    assert e.value.code == 2
+    assert "is not a directory" in capsys.readouterr().err
+    assert not (tmp_path / "output").exists()
@@ -0,0 +1,70 @@
+import os
+
+from io_scene_gr2 import cache
+
+def write(path, data):
+    with open(path, "wb") as f:
+        f.write(data)
+    return path
+
+def age(path, seconds):
+    stat = os.stat(path)
+    os.utime(path, (stat.st_atime - seconds, stat.st_mtime - seconds))
+
+def test_key_stability(tmp_path):
+    source = write(tmp_path / "a.gr2", b"granny")
+    conform = write(tmp_path / "skeleton.gr2", b"bones")
+    conversion_cache = cache.ConversionCache(str(tmp_path / "cache"), 1024)
+    key = conversion_cache.key(str(source), str(conform), "1.0", "-e conform")
+    # Same contents at another path give the same key
+    copy = write(tmp_path / "b.gr2", b"granny")
+    assert cache.ConversionCache(str(tmp_path / "cache"), 1024).key(str(copy), str(conform), "1.0", "-e conform") == key
+    assert conversion_cache.key(str(source), str(conform), "1.1", "-e conform") != key
+    assert conversion_cache.key(str(source), "", "1.0", "-e conform") != key
+    assert conversion_cache.key(str(source), str(conform), "1.0", "") != key
+    write(tmp_path / "skeleton.gr2", b"other bones")
+    assert conversion_cache.key(str(source), str(conform), "1.0", "-e conform") != key
+
+def test_hits_and_misses(tmp_path):
+    conversion_cache = cache.ConversionCache(str(tmp_path / "cache"), 1024)
+    assert conversion_cache.lookup("abc") is None
+    dae = write(tmp_path / "a.dae", b"<COLLADA/>")
+    stored = conversion_cache.store("abc", str(dae))
+    assert os.path.isfile(dae)
+    assert conversion_cache.lookup("abc") == stored
+    assert (conversion_cache.hits, conversion_cache.misses) == (1, 1)
+    conversion_cache.clear()
+    assert conversion_cache.lookup("abc") is None
+    assert (conversion_cache.hits, conversion_cache.misses) == (0, 1)
+
+def test_lru_eviction(tmp_path):
+    conversion_cache = cache.ConversionCache(str(tmp_path / "cache"), 250)
+    paths = {}
+    for index, key in enumerate(("old", "used", "new")):
+        paths[key] = conversion_cache.store(key, str(write(tmp_path / "a.dae", b"x" * 100)), move=True)
+        conversion_cache.release(paths[key])
+        age(paths[key], 100 - index * 10)
+    # Only new and old fit, looking up used makes old the least recently used entry
+    assert not os.path.isfile(paths["old"])
+    assert conversion_cache.lookup("used") == paths["used"]
+    conversion_cache.release(paths["used"])
+    age(paths["new"], 100)
+    conversion_cache.store("latest", str(write(tmp_path / "a.dae", b"x" * 100)))
+    assert not os.path.isfile(paths["new"])
+    assert os.path.isfile(paths["used"])
+    assert conversion_cache.size() <= 250
+
+def test_pinned_entries_are_kept(tmp_path):
+    conversion_cache = cache.ConversionCache(str(tmp_path / "cache"), 150)
+    first = conversion_cache.store("first", str(write(tmp_path / "a.dae", b"x" * 100)))
+    conversion_cache.release(first)
+    assert conversion_cache.lookup("first") == first
+    age(first, 100)
+    second = conversion_cache.store("second", str(write(tmp_path / "a.dae", b"x" * 100)))
+    # first was handed out by lookup and isn't imported yet
+    assert os.path.isfile(first) and os.path.isfile(second)
+    conversion_cache.release(first)
+    conversion_cache.release(second)
+    conversion_cache.evict()
+    assert not os.path.isfile(first)
+    assert os.path.isfile(second)
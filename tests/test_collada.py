@@ -0,0 +1,220 @@
+import numpy as np
+import pytest
+
+from io_scene_gr2 import collada
+
+DOCUMENT = """<?xml version="1.0" encoding="utf-8"?>
+<COLLADA xmlns="http://www.collada.org/2005/11/COLLADASchema" version="1.4.1">
+  <asset><unit meter="0.01"/><up_axis>Y_UP</up_axis></asset>
+  <library_materials>
+    <material id="skin-mat" name="Skin"/>
+  </library_materials>
+  <library_geometries>
+    <geometry id="quad" name="Quad">
+      <mesh>
+        <source id="quad-pos">
+          <float_array count="15">0 0 0 1 0 0 1 1 0 0 1 0 2 0 0</float_array>
+          <technique_common><accessor count="5" stride="3"/></technique_common>
+        </source>
+        <source id="quad-nrm">
+          <float_array count="6">0 0 1 0 0 -1</float_array>
+          <technique_common><accessor count="2" stride="3"/></technique_common>
+        </source>
+        <source id="quad-uv0">
+          <float_array count="8">0 0 1 0 1 1 0 1</float_array>
+          <technique_common><accessor count="4" stride="2"/></technique_common>
+        </source>
+        <source id="quad-uv1">
+          <float_array count="2">9 9</float_array>
+          <technique_common><accessor count="1" stride="2"/></technique_common>
+        </source>
+        <vertices id="quad-vtx"><input semantic="POSITION" source="#quad-pos"/></vertices>
+        <polylist material="mat0" count="2">
+          <input semantic="VERTEX" source="#quad-vtx" offset="0"/>
+          <input semantic="NORMAL" source="#quad-nrm" offset="1"/>
+          <input semantic="TEXCOORD" source="#quad-uv0" offset="2" set="0"/>
+          <input semantic="TEXCOORD" source="#quad-uv1" offset="3" set="1"/>
+          <vcount>4 3</vcount>
+          <p>0 0 0 0 1 0 1 0 2 0 2 0 3 0 3 0  1 1 1 0 4 1 0 0 2 1 2 0</p>
+        </polylist>
+      </mesh>
+    </geometry>
+    <geometry id="pentagon">
+      <mesh>
+        <source id="pentagon-pos">
+          <float_array count="15">0 0 0 1 0 0 1 1 0 0.5 2 0 0 1 0</float_array>
+          <technique_common><accessor count="5" stride="3"/></technique_common>
+        </source>
+        <vertices id="pentagon-vtx"><input semantic="POSITION" source="#pentagon-pos"/></vertices>
+        <polygons material="a" count="1">
+          <input semantic="VERTEX" source="#pentagon-vtx" offset="0"/>
+          <p>0 1 2 3 4</p>
+        </polygons>
+        <triangles material="b" count="1">
+          <input semantic="VERTEX" source="#pentagon-vtx" offset="0"/>
+          <p>4 3 2</p>
+        </triangles>
+      </mesh>
+    </geometry>
+  </library_geometries>
+  <library_controllers>
+    <controller id="quad-skin">
+      <skin source="#quad">
+        <bind_shape_matrix>1 0 0 5 0 1 0 0 0 0 1 0 0 0 0 1</bind_shape_matrix>
+        <source id="quad-joints">
+          <Name_array count="2">root_sid spine_sid</Name_array>
+          <technique_common><accessor count="2" stride="1"/></technique_common>
+        </source>
+        <source id="quad-inv">
+          <float_array count="32">1 0 0 0 0 1 0 0 0 0 1 0 0 0 0 1  1 0 0 0 0 1 0 -2 0 0 1 0 0 0 0 1</float_array>
+          <technique_common><accessor count="2" stride="16"/></technique_common>
+        </source>
+        <source id="quad-weights">
+          <float_array count="3">1 0.25 0.75</float_array>
+          <technique_common><accessor count="3" stride="1"/></technique_common>
+        </source>
+        <joints>
+          <input semantic="JOINT" source="#quad-joints"/>
+          <input semantic="INV_BIND_MATRIX" source="#quad-inv"/>
+        </joints>
+        <vertex_weights count="5">
+          <input semantic="JOINT" source="#quad-joints" offset="0"/>
+          <input semantic="WEIGHT" source="#quad-weights" offset="1"/>
+          <vcount>1 2 0 1 1</vcount>
+          <v>0 0  0 1 1 2  1 0  0 0</v>
+        </vertex_weights>
+      </skin>
+    </controller>
+  </library_controllers>
+  <library_animations>
+    <animation id="spine-anim">
+      <source id="spine-time">
+        <float_array count="2">0 1</float_array>
+        <technique_common><accessor count="2" stride="1"/></technique_common>
+      </source>
+      <source id="spine-matrix">
+        <float_array count="32">1 0 0 0 0 1 0 2 0 0 1 0 0 0 0 1  1 0 0 0 0 1 0 3 0 0 1 0 0 0 0 1</float_array>
+        <technique_common><accessor count="2" stride="16"/></technique_common>
+      </source>
+      <sampler id="spine-sampler">
+        <input semantic="INPUT" source="#spine-time"/>
+        <input semantic="OUTPUT" source="#spine-matrix"/>
+      </sampler>
+      <channel source="#spine-sampler" target="spine/transform"/>
+      <channel source="#spine-sampler" target="spine/translate.X"/>
+    </animation>
+  </library_animations>
+  <library_visual_scenes>
+    <visual_scene id="scene">
+      <node id="armature" name="Armature" type="NODE">
+        <translate>0 0 1</translate>
+        <node id="root" sid="root_sid" name="Root" type="JOINT">
+          <matrix>1 0 0 0 0 1 0 0 0 0 1 0 0 0 0 1</matrix>
+          <node id="spine" sid="spine_sid" name="Spine" type="JOINT">
+            <matrix>1 0 0 0 0 1 0 2 0 0 1 0 0 0 0 1</matrix>
+          </node>
+        </node>
+      </node>
+      <node id="body" name="Body">
+        <instance_controller url="#quad-skin">
+          <bind_material><technique_common>
+            <instance_material symbol="mat0" target="#skin-mat"/>
+          </technique_common></bind_material>
+        </instance_controller>
+      </node>
+    </visual_scene>
+  </library_visual_scenes>
+</COLLADA>
+"""
+
+@pytest.fixture
+def document(tmp_path):
+    path = tmp_path / "scene.dae"
+    path.write_text(DOCUMENT)
+    return collada.read(str(path))
+
+def test_asset(document):
+    assert document.up_axis == "Y_UP"
+    assert document.unit == 0.01
+    assert document.materials == {"skin-mat": "Skin"}
+
+def test_polylist_with_split_indices(document):
+    quad = document.geometries["quad"]
+    assert quad.name == "Quad"
+    # The quad fans into (0, 1, 2), (0, 2, 3), the triangle keeps its corners
+    assert quad.indices.tolist() == [0, 1, 2, 0, 2, 3, 1, 4, 2]
+    assert quad.normals.tolist() == [[0, 0, 1]] * 6 + [[0, 0, -1]] * 3
+    # Only the first TEXCOORD set is read, through its own offset
+    assert quad.uvs.tolist() == [[0, 0], [1, 0], [1, 1], [0, 0], [1, 1], [0, 1], [1, 0], [0, 0], [1, 1]]
+    assert quad.material_indices.tolist() == [0, 0, 0]
+    assert quad.materials == ["mat0"]
+
+def test_polygons_and_triangles(document):
+    pentagon = document.geometries["pentagon"]
+    assert pentagon.name == "pentagon"
+    assert pentagon.indices.tolist() == [0, 1, 2, 0, 2, 3, 0, 3, 4, 4, 3, 2]
+    assert pentagon.material_indices.tolist() == [0, 0, 0, 1]
+    assert pentagon.materials == ["a", "b"]
+    assert pentagon.normals is None and pentagon.uvs is None
+
+def test_vertex_weights(document):
+    skin = document.skins["quad-skin"]
+    assert skin.source == "quad"
+    assert skin.joints == ["root_sid", "spine_sid"]
+    assert skin.bind_shape[0, 3] == 5.0
+    assert skin.inverse_bind[1, 1, 3] == -2.0
+    # Vertex 2 has no influences
+    assert skin.vertices.tolist() == [0, 1, 1, 3, 4]
+    assert skin.joint_indices.tolist() == [0, 0, 1, 1, 0]
+    assert np.allclose(skin.weights, [1.0, 0.25, 0.75, 1.0, 1.0])
+
+def test_nodes_and_world_matrices(document):
+    nodes = document.nodes
+    assert [(n.name, n.type, n.parent) for n in nodes] == [
+        ("Armature", "NODE", -1), ("Root", "JOINT", 0), ("Spine", "JOINT", 1), ("Body", "NODE", -1)]
+    assert nodes[2].sid == "spine_sid"
+    assert nodes[3].instances == [("instance_controller", "quad-skin", {"mat0": "skin-mat"})]
+    worlds = collada.world_matrices(nodes)
+    assert worlds[2][:3, 3].tolist() == [0.0, 2.0, 1.0]
+    assert np.array_equal(worlds[3], np.eye(4))
+
+def test_matrix_channels(document):
+    assert document.skipped_channels == 1
+    (channel,) = document.channels
+    assert channel.target == "spine"
+    assert channel.times.tolist() == [0.0, 1.0]
+    sampled = collada.sample_channels([channel], np.array([0.0, 0.5, 1.0, 2.0]))
+    # Keys are held until the next one
+    assert sampled[0, :, 1, 3].tolist() == [2.0, 2.0, 3.0, 3.0]
+
+def test_up_axis_matrix():
+    y_up = collada.up_axis_matrix("Y_UP")
+    assert np.allclose(y_up[:3, :3] @ (0.0, 1.0, 0.0), (0.0, 0.0, 1.0))
+    assert np.allclose(y_up[:3, :3] @ (0.0, 0.0, 1.0), (0.0, -1.0, 0.0))
+    assert np.allclose(collada.up_axis_matrix("X_UP")[:3, :3] @ (1.0, 0.0, 0.0), (0.0, 0.0, 1.0))
+    assert np.array_equal(collada.up_axis_matrix("Z_UP"), np.eye(4))
+
+def test_skips_meshes(tmp_path):
+    path = tmp_path / "scene.dae"
+    path.write_text(DOCUMENT)
+    document = collada.read(str(path), meshes=False)
+    assert document.geometries == {} and document.skins == {}
+    assert len(document.nodes) == 4 and len(document.channels) == 1
+
+def test_geometry_callback(tmp_path):
+    path = tmp_path / "scene.dae"
+    path.write_text(DOCUMENT)
+    document = collada.read(str(path), lambda geometry: len(geometry.indices))
+    assert document.geometries == {"quad": 9, "pentagon": 12}
+
+def test_errors(tmp_path):
+    path = tmp_path / "broken.dae"
+    path.write_text("<COLLADA><library_geometries>")
+    with pytest.raises(collada.ColladaError):
+        collada.read(str(path))
+    path.write_text(DOCUMENT.replace('<input semantic="POSITION" source="#quad-pos"/>', ""))
+    with pytest.raises(collada.ColladaError):
+        collada.read(str(path))
+    path.write_text(DOCUMENT.replace("<polygons", "<tristrips").replace("</polygons>", "</tristrips>"))
+    with pytest.raises(collada.ColladaError):
+        collada.read(str(path))
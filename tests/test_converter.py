@@ -0,0 +1,150 @@
+import sys
+import threading
+
+from io_scene_gr2 import converter
+
+def python_command(code):
+    return [sys.executable, "-c", code]
+
+def test_run_process_keeps_tail():
+    lines = []
+    returncode, output, errors = converter.run_process(
+        python_command("import sys\nfor i in range(10): print('line', i)\nsys.exit(3)"), lines.append, tail_lines=3)
+    assert returncode == 3
+    assert len(lines) == 10
+    assert output == "line 7\nline 8\nline 9"
+    assert errors == ""
+
+def test_run_process_merges_stderr():
+    returncode, output, errors = converter.run_process(python_command("import sys; sys.stderr.write('failed\\n')"))
+    assert (returncode, output) == (0, "failed")
+
+def test_run_process_missing_executable(tmp_path):
+    returncode, output, errors = converter.run_process([str(tmp_path / "missing.exe")])
+    assert returncode == -1
+    assert errors != ""
+
+def test_run_conversion_skips_cached_jobs():
+    job = converter.ConversionJob("a.gr2", "a.dae", ["missing.exe"])
+    job.cached_path = "cache/a.dae"
+    converter.run_conversion(job)
+    assert job.returncode is None and job.succeeded
+
+def test_job_reports_start_once():
+    events = []
+    job = converter.ConversionJob("a.gr2", "a.dae")
+    job.on_progress = lambda job, fraction, message: events.append((job, fraction, message))
+    returncode, output, errors = converter.run_process(python_command("print(1); print(2)"), job.handle_line)
+    assert events == [(job, 0.0, "Converting")]
+
+def test_jobs_are_quiet_by_default(capsys):
+    job = converter.ConversionJob("a.gr2", "a.dae", python_command("print('converting')"))
+    converter.run_conversion(job)
+    assert job.output == "converting"
+    assert capsys.readouterr().out == ""
+    job.echo = True
+    converter.run_conversion(job)
+    assert capsys.readouterr().out == "converting\n"
+
+class FakeBackend(converter.ConverterBackend):
+    """Finishes jobs in the order the test releases them"""
+
+    def __init__(self):
+        self.release = {}
+        self.threads = set()
+
+    def convert(self, job):
+        self.threads.add(threading.get_ident())
+        job.on_progress(job, 0.5, "Half")
+        self.release[job.source_path].wait(5)
+        job.returncode = 0
+        return job
+
+def test_pool_yields_jobs_as_they_finish():
+    backend = FakeBackend()
+    jobs = [converter.ConversionJob(name, name + ".dae") for name in ("a", "b", "c")]
+    for job in jobs:
+        backend.release[job.source_path] = threading.Event()
+    events = []
+    def on_progress(job, fraction, message):
+        events.append((job.source_path, fraction, message, threading.get_ident()))
+    finished = []
+    with converter.ConversionPool(3, backend, on_progress) as pool:
+        for job in jobs:
+            pool.submit(job)
+        order = iter(("c", "a", "b"))
+        backend.release[next(order)].set()
+        for job in pool.completed(poll_interval=0.01):
+            finished.append(job.source_path)
+            name = next(order, None)
+            if name is not None:
+                backend.release[name].set()
+    assert finished == ["c", "a", "b"]
+    # Progress runs on the thread that iterates completed(), not on the pool's threads
+    assert sorted(e[:3] for e in events) == [("a", 0.5, "Half"), ("b", 0.5, "Half"), ("c", 0.5, "Half")]
+    assert {e[3] for e in events} == {threading.get_ident()}
+    assert threading.get_ident() not in backend.threads
+
+def test_pool_flattens_batches(tmp_path):
+    class BatchBackend(converter.ConverterBackend):
+        def convert(self, job):
+            job.returncode = 0
+            return job
+    sources = []
+    for name in ("a", "b"):
+        source = tmp_path / (name + ".gr2")
+        source.write_bytes(b"granny")
+        sources.append(str(source))
+    batch = converter.BatchConversion([converter.ConversionJob(s, s + ".dae") for s in sources], str(tmp_path / "batch"))
+    with converter.ConversionPool(1, BatchBackend()) as pool:
+        pool.submit_batch(batch)
+        finished = list(pool.completed(poll_interval=0.01))
+    assert [job.source_path for job in finished] == sources
+    assert all(job.succeeded for job in finished)
+    assert not (tmp_path / "batch").exists()
+
+# Stand-in for divine's batch mode: writes <name>.DAE to argv[2] for every file in argv[1] except skipped ones
+BATCH_SCRIPT = """
+import os, sys
+for name in sorted(os.listdir(sys.argv[1])):
+    print('Converting', name)
+    if 'broken' not in name:
+        with open(os.path.join(sys.argv[2], os.path.splitext(name)[0] + '.DAE'), 'w') as f:
+            f.write(name)
+"""
+
+def staged_jobs(tmp_path, names):
+    jobs = []
+    for index, name in enumerate(names):
+        folder = tmp_path / "assets" / str(index)
+        folder.mkdir(parents=True)
+        source = folder / (name + ".gr2")
+        source.write_bytes(name.encode())
+        jobs.append(converter.ConversionJob(str(source), str(tmp_path / "{}-{}.dae".format(name, index))))
+    return jobs
+
+def test_batch_prefixes_staged_names(tmp_path):
+    batch = converter.BatchConversion(staged_jobs(tmp_path, ["body", "body", "head"]), str(tmp_path / "batch"))
+    assert batch.staged_names == ["0000_body", "0001_body", "0002_head"]
+    assert sorted(p.name for p in (tmp_path / "batch" / "input").iterdir()) == ["0000_body.gr2", "0001_body.gr2", "0002_head.gr2"]
+    batch.cleanup()
+    assert not (tmp_path / "batch").exists()
+
+def test_run_batch_conversion_maps_outputs(tmp_path):
+    jobs = staged_jobs(tmp_path, ["body", "broken", "body"])
+    batch = converter.BatchConversion(jobs, str(tmp_path / "batch"))
+    batch.command = python_command(BATCH_SCRIPT) + [batch.input_dir, batch.output_dir]
+    starts = []
+    for job in jobs:
+        job.on_progress = lambda job, fraction, message: starts.append(job)
+    assert converter.run_batch_conversion(batch) is jobs
+    assert [job.returncode for job in jobs] == [0, 1, 0]
+    # Both "body" files come back to their own job
+    with open(jobs[0].output_path) as f:
+        assert f.read() == "0000_body.gr2"
+    with open(jobs[2].output_path) as f:
+        assert f.read() == "0002_body.gr2"
+    assert not (tmp_path / "broken-1.dae").exists()
+    assert starts == jobs
+    assert "Converting 0002_body.gr2" in jobs[1].output
+    assert not (tmp_path / "batch").exists()
@@ -0,0 +1,106 @@
+import math
+
+import numpy as np
+import pytest
+
+from io_scene_gr2 import curves
+
+class Values():
+    """Stand-in for a GR2Array of single-member elements"""
+
+    def __init__(self, values, dtype=np.float32):
+        self.values = np.asarray(values, dtype=dtype)
+
+    def __len__(self):
+        return len(self.values)
+
+def curve_data(format_name, degree=0, **members):
+    members["CurveDataHeader"] = {"Format": curves.curve_format_names.index(format_name), "Degree": degree}
+    return {"CurveData": members}
+
+def test_constant_and_identity_curves():
+    curve = curves.read_curve(curve_data("D3Constant32f", Controls=np.array([1.0, 2.0, 3.0], dtype=np.float32)), 3)
+    assert curve.is_constant
+    assert np.array_equal(curve.evaluate([0.0, 5.0]), [[1, 2, 3], [1, 2, 3]])
+    curve = curves.read_curve(curve_data("DaConstant32f", Controls=Values([0, 0, 0, 1])), 4)
+    assert np.array_equal(curve.evaluate([1.0]), [[0, 0, 0, 1]])
+    assert np.array_equal(curves.read_curve(curve_data("DaIdentity"), 9).controls[0], np.eye(3).ravel())
+    assert np.array_equal(curves.read_curve(None, 3).controls[0], [0, 0, 0])
+
+def test_d3_k8u_c8u():
+    # 2.0 as float32 is 0x40000000, the file stores its upper 16 bits
+    data = curve_data("D3K8uC8u", degree=1, OneOverKnotScaleTrunc=0x4000,
+        ControlScales=[0.5, 1.0, 2.0], ControlOffsets=[1.0, 0.0, -1.0],
+        KnotsControls=Values([0, 2, 4, 0, 10, 20, 1, 11, 21, 2, 12, 22], np.uint8))
+    curve = curves.read_curve(data, 3)
+    assert np.array_equal(curve.knots, [0.0, 1.0, 2.0])
+    assert np.array_equal(curve.controls, [[1, 10, 39], [1.5, 11, 41], [2, 12, 43]])
+    # Degree 1 passes through the controls at the knots and is linear between them
+    assert np.allclose(curve.evaluate([0.0, 0.5, 1.0, 2.0, 3.0]),
+        [[1, 10, 39], [1.25, 10.5, 40], [1.5, 11, 41], [2, 12, 43], [2, 12, 43]])
+
+def quaternion(components, scales, offsets, unit):
+    return [value * unit * scale + offset for value, scale, offset in zip(components, scales, offsets)]
+
+def test_d4n_k16u_c15u():
+    unit = 1.0 / 32767.0
+    # Components use table entries 0, 1, 2 and 0
+    selector = 0x0210
+    scales = (1.4142135, 0.70710677, 0.35355338, 1.4142135)
+    offsets = (-0.70710677, -0.35355338, -0.53033006, -0.70710677)
+    # First control drops w (sign bits of b and c set), the second drops x (neither set) and is negative
+    first = (16384, 0x8000 | 8192, 0x8000 | 30000)
+    second = (0x8000 | 20000, 12000, 16000)
+    data = curve_data("D4nK16uC15u", degree=1, OneOverKnotScale=4.0, ScaleOffsetTableEntries=selector,
+        KnotsControls=Values((0, 8) + first + second, np.uint16))
+    curve = curves.read_curve(data, 4)
+    assert np.array_equal(curve.knots, [0.0, 2.0])
+
+    x, y, z = quaternion((16384, 8192, 30000), scales[:3], offsets[:3], unit)
+    expected_first = [x, y, z, math.sqrt(1.0 - x * x - y * y - z * z)]
+    y, z, w = quaternion((20000, 12000, 16000), scales[1:], offsets[1:], unit)
+    expected_second = [-math.sqrt(1.0 - y * y - z * z - w * w), y, z, w]
+    assert np.allclose(curve.controls, [expected_first, expected_second], atol=1e-6)
+
+def test_d4n_k8u_c7u():
+    unit = 1.0 / 127.0
+    # Every component uses entry 3: scale 0.35355338, offset -0.17677669
+    data = curve_data("D4nK8uC7u", OneOverKnotScale=1.0, ScaleOffsetTableEntries=0x3333,
+        KnotsControls=Values((0, 0x80 | 10, 64, 0x80 | 100), np.uint8))
+    z, w, x = [value * unit * 0.35355338 - 0.17677669 for value in (10, 64, 100)]
+    # Only c has its sign bit set, so y is the dropped component, negative because a has its sign bit set.
+    # The stored components follow it: a is z, b is w and c is x
+    expected = [x, -math.sqrt(1.0 - x * x - z * z - w * w), z, w]
+    assert np.allclose(curves.read_curve(data, 4).controls, [expected], atol=1e-6)
+
+def test_de_boor_quadratic():
+    curve = curves.Curve(2, [0.0, 1.0, 2.0, 3.0], [[0.0], [1.0], [4.0], [9.0]])
+    # Uniform quadratic: (1/2, 1/2, 0) of the span's controls at a knot, (1/8, 3/4, 1/8) halfway
+    samples = curve.evaluate([-1.0, 0.0, 1.0, 1.5, 2.0])
+    assert np.allclose(samples[:, 0], [0.0, 0.0, 0.5, 0.125 * 0 + 0.75 * 1 + 0.125 * 4, 0.5 * 1 + 0.5 * 4])
+
+def test_batched_evaluation_matches_single_curves():
+    curve_list = [
+        curves.Curve(2, [0.0, 1.0, 2.0, 3.0], [[0.0], [1.0], [4.0], [9.0]]),
+        curves.constant_curve([7.0]),
+        curves.Curve(1, [0.5, 2.5], [[1.0], [3.0]]),
+        curves.Curve(3, [0.0, 0.5, 1.0, 2.0, 4.0], [[1.0], [-1.0], [2.0], [0.0], [5.0]]),
+    ]
+    times = np.linspace(-0.5, 4.5, 23)
+    batched = curves.evaluate_curves(curve_list, times)
+    for curve, samples in zip(curve_list, batched):
+        assert np.allclose(curve.evaluate(times), samples)
+    assert np.allclose(batched[1], 7.0)
+    assert np.allclose(curves.evaluate_curves(curve_list[2:3], [0.0, 1.5, 3.0])[0], [[1.0], [2.0], [3.0]])
+
+def test_legacy_curve_layout():
+    curve = curves.read_curve({"Degree": 1, "Knots": Values([0.0, 1.0]), "Controls": Values([0, 0, 0, 2, 4, 6])}, 3)
+    assert np.allclose(curve.evaluate([0.5]), [[1, 2, 3]])
+    with pytest.raises(curves.CurveError):
+        curves.read_curve({"Degree": 1, "Knots": Values([0.0, 1.0]), "Controls": Values([0, 0, 0])}, 3)
+
+def test_unsupported_and_mismatched_curves():
+    with pytest.raises(curves.CurveError):
+        curves.read_curve({"CurveData": {"CurveDataHeader": {"Format": 42, "Degree": 0}}}, 3)
+    with pytest.raises(curves.CurveError):
+        curves.read_curve(curve_data("D3Constant32f", Controls=np.zeros(3, dtype=np.float32)), 4)
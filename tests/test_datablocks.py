@@ -0,0 +1,88 @@
+import os
+import types
+
+from io_scene_gr2 import datablocks
+
+class Object():
+    def __init__(self, name):
+        self.name = name
+
+    def as_pointer(self):
+        return id(self)
+
+class Material(dict):
+    """ID properties are read and written like a dict"""
+
+    def __init__(self, name):
+        super().__init__()
+        self.removed = False
+        self._name = name
+
+    @property
+    def name(self):
+        if self.removed:
+            raise ReferenceError("StructRNA of type Material has been removed")
+        return self._name
+
+def scene_context(objects):
+    return types.SimpleNamespace(scene=types.SimpleNamespace(objects=objects))
+
+def test_increment_string():
+    assert datablocks.increment_string("Body") == "Body_1"
+    assert datablocks.increment_string("Body_1") == "Body_2"
+    assert datablocks.increment_string("Body.009") == "Body.010"
+    assert datablocks.increment_string("Arm_2_Body_9") == "Arm_2_Body_10"
+
+def test_name_allocator_suffixes():
+    allocator = datablocks.NameAllocator(["Body", "Body_1", "Head"])
+    assert allocator.allocate("Hair") == "Hair"
+    assert allocator.allocate("Body") == "Body_2"
+    assert allocator.allocate("Body") == "Body_3"
+    # Names added later are skipped, the sequence continues where it stopped
+    allocator.add(["Body_4"])
+    assert allocator.allocate("Body") == "Body_5"
+    assert allocator.allocate("Hair") == "Hair_1"
+    allocator.release("Head")
+    assert allocator.allocate("Head") == "Head"
+
+def test_import_session_new_objects():
+    existing = Object("Camera")
+    objects = [existing]
+    context = scene_context(objects)
+    session = datablocks.ImportSession(context)
+    assert session.new_objects(context) == []
+    body, armature = Object("Body"), Object("Armature")
+    objects += [body, armature]
+    assert session.new_objects(context) == [body, armature]
+    # Each object is new only once
+    assert session.new_objects(context) == []
+    objects.remove(body)
+    session.forget(body)
+    objects.append(body)
+    assert session.new_objects(context) == [body]
+
+def test_texture_key():
+    textures = types.SimpleNamespace(textures=["/assets/a/../Body_BM.dds", None, "/assets/Body_NM.dds"])
+    same = types.SimpleNamespace(textures=["/assets/Body_BM.dds", "", "/assets/Body_NM.dds"])
+    assert datablocks.texture_key(textures, "Body") == datablocks.texture_key(same, "Other")
+    assert datablocks.texture_key(textures, "Body").startswith(os.path.normcase(os.path.normpath("/assets/Body_BM.dds")))
+    untextured = types.SimpleNamespace(textures=[None, "", None])
+    assert datablocks.texture_key(untextured, "Body") == "file:Body"
+    assert datablocks.texture_key(untextured, "Body") != datablocks.texture_key(untextured, "Head")
+
+def test_material_index_dedup():
+    saved = Material("Saved")
+    saved[datablocks.MaterialIndex.key_property] = "a|b"
+    duplicate = Material("Saved.001")
+    duplicate[datablocks.MaterialIndex.key_property] = "a|b"
+    index = datablocks.MaterialIndex([saved, duplicate, Material("Unkeyed")])
+    # Materials from the blend file are reused, the first one per key wins
+    assert index.get("a|b") is saved
+    assert index.get("c") is None
+    new = Material("New")
+    index.add("c", new)
+    assert new[datablocks.MaterialIndex.key_property] == "c"
+    assert index.get("c") is new
+    new.removed = True
+    assert index.get("c") is None
+    assert "c" not in index.materials
@@ -0,0 +1,80 @@
+import struct
+
+import numpy as np
+import pytest
+
+from io_scene_gr2 import dds
+
+RED, BLUE = 0xF800, 0x001F
+
+def header(width, height, fourcc=b"DXT1", mip_count=0):
+    data = bytearray(4 + dds.DDS_HEADER_SIZE)
+    data[:4] = dds.DDS_MAGIC
+    flags = dds.DDSD_MIPMAPCOUNT if mip_count > 0 else 0
+    struct.pack_into("<7I", data, 4, dds.DDS_HEADER_SIZE, flags, height, width, 0, 0, mip_count)
+    struct.pack_into("<II4s", data, 76, 32, dds.DDPF_FOURCC, fourcc)
+    return bytes(data)
+
+def bc1_block(c0, c1, indices):
+    bits = sum(index << (2 * i) for i, index in enumerate(indices))
+    return struct.pack("<HHI", c0, c1, bits)
+
+def bc3_block(a0, a1, alpha_indices, color):
+    bits = sum(index << (3 * i) for i, index in enumerate(alpha_indices))
+    return struct.pack("<BB", a0, a1) + bits.to_bytes(6, "little") + color
+
+def test_bc1_four_colors():
+    # Row by row: index 0, 1, 2, 3 in every row
+    block = bc1_block(RED, BLUE, [0, 1, 2, 3] * 4)
+    pixels = dds.DDSFile(header(4, 4) + block).decode(flip=False)
+    assert pixels.shape == (4, 4, 4)
+    expected = [[1, 0, 0, 1], [0, 0, 1, 1], [2 / 3, 0, 1 / 3, 1], [1 / 3, 0, 2 / 3, 1]]
+    assert np.allclose(pixels[0], expected)
+    assert np.allclose(pixels[3], expected)
+
+def test_bc1_transparent_black():
+    # c0 <= c1 selects three colors and transparent black
+    block = bc1_block(BLUE, RED, [0, 1, 2, 3] * 4)
+    pixels = dds.DDSFile(header(4, 4) + block).decode(flip=False)
+    assert np.allclose(pixels[0], [[0, 0, 1, 1], [1, 0, 0, 1], [0.5, 0, 0.5, 1], [0, 0, 0, 0]])
+
+def test_bc3_alpha():
+    color = bc1_block(RED, RED, [0] * 16)
+    eight = bc3_block(255, 0, [0, 1, 2, 7] * 4, color)
+    six = bc3_block(0, 255, [2, 5, 6, 7] * 4, color)
+    pixels = dds.DDSFile(header(8, 4, b"DXT5") + eight + six).decode(flip=False)
+    assert pixels.shape == (4, 8, 4)
+    assert np.allclose(pixels[0, :, 3], [1, 0, 6 / 7, 1 / 7, 0.2, 0.8, 0, 1])
+    # BC3 color blocks are always four-color
+    assert np.allclose(pixels[..., :3], [1, 0, 0])
+
+def test_block_layout_and_flip():
+    blocks = bc1_block(RED, RED, [0] * 16) + bc1_block(BLUE, BLUE, [0] * 16)
+    image = dds.DDSFile(header(4, 8) + blocks)
+    # The second block is the second block row, which is the bottom of the image
+    assert np.allclose(image.decode(flip=False)[4:, :, 2], 1)
+    assert np.allclose(image.decode()[:4, :, 2], 1)
+    # Images smaller than a block are cropped
+    assert dds.DDSFile(header(2, 3) + bc1_block(RED, RED, [0] * 16)).decode().shape == (3, 2, 4)
+
+def test_mip_levels(tmp_path):
+    levels = [bc1_block(RED, RED, [0] * 16) * 4, bc1_block(BLUE, BLUE, [0] * 16), bc1_block(0xFFFF, 0xFFFF, [0] * 16),
+        bc1_block(0, 0, [0] * 16)]
+    # The 1x1 level is cut off
+    image = dds.DDSFile(header(8, 8, mip_count=4) + b"".join(levels)[:-4])
+    assert [(mip.width, mip.height) for mip in image.levels] == [(8, 8), (4, 4), (2, 2)]
+    assert image.level_for_size(4) == 1
+    assert image.level_for_size(1) == 2
+    path = tmp_path / "a.dds"
+    path.write_bytes(header(8, 8, mip_count=4) + b"".join(levels))
+    preview = dds.load(str(path), level=1)
+    assert (preview.width, preview.height) == (4, 4)
+    assert np.allclose(preview.pixels.reshape(-1, 4), [0, 0, 1, 1])
+
+def test_errors():
+    with pytest.raises(dds.DDSError):
+        dds.DDSFile(b"PNG" + bytes(200))
+    with pytest.raises(dds.DDSError):
+        dds.DDSFile(header(4, 4, b"ATI2") + bytes(16))
+    with pytest.raises(dds.DDSError):
+        dds.DDSFile(header(4, 4) + bytes(4))
@@ -0,0 +1,205 @@
+import struct
+
+import numpy as np
+import pytest
+
+from io_scene_gr2 import granny
+
+MAGIC_32 = bytes.fromhex("b867b0caf86db10f84728c7e5e19001e")
+
+class SectionWriter():
+    """Builds one GR2 section, pointers are written as relocations to labels resolved at the end"""
+
+    def __init__(self):
+        self.data = bytearray()
+        self.labels = {}
+        self.pointers = []
+        self.strings = {}
+
+    def label(self, name):
+        self.labels[name] = len(self.data)
+
+    def pack(self, fmt, *values):
+        self.data += struct.pack("<" + fmt, *values)
+
+    def pointer(self, name):
+        if name is not None:
+            self.pointers.append((len(self.data), name))
+        self.pack("I", 0)
+
+    def string(self, text):
+        name = self.strings.setdefault(text, "str:" + text)
+        self.pointer(name)
+
+    def member(self, member_type, name, definition=None, array_size=0):
+        self.pack("I", member_type)
+        self.string(name)
+        self.pointer(definition)
+        self.pack("4I", array_size, 0, 0, 0)
+        self.pack("I", 0)
+
+    def end_type(self):
+        self.pack("8I", *([0] * 8))
+
+    def finish(self):
+        for text, name in self.strings.items():
+            self.label(name)
+            self.data += text.encode("utf-8") + b"\0"
+        while len(self.data) % 4 != 0:
+            self.data.append(0)
+        return bytes(self.data), [(offset, 0, self.labels[name]) for offset, name in self.pointers]
+
+def build_file(section, root_type="type:Root", root="root", compression=0):
+    data, relocations = section.finish()
+    info_size = 10 * 4 + 4 * 4
+    sections_offset = info_size
+    header_size = 0x20 + info_size + 44
+    relocation_table = b"".join(struct.pack("<3I", *r) for r in relocations)
+    data_offset = header_size + len(relocation_table)
+    total = data_offset + len(data)
+    header = MAGIC_32 + struct.pack("<2I", header_size, 0) + bytes(8)
+    header += struct.pack("<10I", 6, total, 0, sections_offset, 1,
+        0, section.labels[root_type], 0, section.labels[root], 0x80000037)
+    header += bytes(16)
+    header += struct.pack("<11I", compression, data_offset, len(data), len(data), 4, len(data), len(data),
+        header_size, len(relocations), 0, 0)
+    return header + relocation_table + data
+
+def sample_section():
+    w = SectionWriter()
+    w.label("type:Vertex")
+    w.member(granny.MEMBER_REAL32, "Position", array_size=3)
+    w.member(granny.MEMBER_NORMAL_UINT8, "BoneWeights", array_size=4)
+    w.member(granny.MEMBER_UINT8, "BoneIndices", array_size=4)
+    w.end_type()
+    w.label("type:Int16")
+    w.member(granny.MEMBER_UINT16, "Int16")
+    w.end_type()
+    w.label("type:Int32")
+    w.member(granny.MEMBER_INT32, "Int32")
+    w.end_type()
+    w.label("type:Bone")
+    w.member(granny.MEMBER_STRING, "Name")
+    w.member(granny.MEMBER_INT32, "ParentIndex")
+    w.member(granny.MEMBER_TRANSFORM, "LocalTransform")
+    w.end_type()
+    w.label("type:ArtToolInfo")
+    w.member(granny.MEMBER_REAL32, "UpVector", array_size=3)
+    w.end_type()
+    w.label("type:Root")
+    w.member(granny.MEMBER_STRING, "Name")
+    w.member(granny.MEMBER_REFERENCE_TO_ARRAY, "Vertices", "type:Vertex")
+    w.member(granny.MEMBER_REFERENCE_TO_ARRAY, "Indices", "type:Int32")
+    w.member(granny.MEMBER_REFERENCE_TO_ARRAY, "Indices16", "type:Int16")
+    w.member(granny.MEMBER_ARRAY_OF_REFERENCES, "Bones", "type:Bone")
+    w.member(granny.MEMBER_VARIANT_REFERENCE, "Extra")
+    w.member(granny.MEMBER_REAL32, "Scale")
+    w.member(granny.MEMBER_REFERENCE, "ArtToolInfo", "type:ArtToolInfo")
+    w.end_type()
+
+    w.label("root")
+    w.string("Model")
+    w.pack("i", 3)
+    w.pointer("vertices")
+    w.pack("i", 0)
+    w.pointer(None)
+    w.pack("i", 6)
+    w.pointer("indices16")
+    w.pack("i", 2)
+    w.pointer("bones")
+    w.pointer("type:Int32")
+    w.pointer("extra")
+    w.pack("f", 2.5)
+    w.pointer("art")
+
+    w.label("vertices")
+    for i in range(3):
+        w.pack("3f", i, i + 0.5, -i)
+        w.pack("4B", 255 - i, i, 0, 0)
+        w.pack("4B", 0, 1, 0, 0)
+    w.label("indices16")
+    w.pack("6H", 0, 1, 2, 2, 1, 0)
+    w.label("bones")
+    w.pointer("bone0")
+    w.pointer("bone1")
+    for index, (name, parent) in enumerate((("Bip01", -1), ("Bip01 Spine", 0))):
+        w.label("bone{}".format(index))
+        w.string(name)
+        w.pack("i", parent)
+        w.pack("I", 7)
+        w.pack("3f", 1.0, 2.0, 3.0 + index)
+        w.pack("4f", 0.0, 0.0, 0.0, 1.0)
+        w.pack("9f", 1, 0, 0, 0, 1, 0, 0, 0, 1)
+    w.label("extra")
+    w.pack("i", 42)
+    w.label("art")
+    w.pack("3f", 0.0, 1.0, 0.0)
+    return w
+
+def test_root_members():
+    gr2 = granny.GR2File(build_file(sample_section()))
+    root = gr2.root
+    assert root.keys() == ["Name", "Vertices", "Indices", "Indices16", "Bones", "Extra", "Scale", "ArtToolInfo"]
+    assert root["Name"] == "Model"
+    assert root["Scale"] == 2.5
+    assert root["Extra"]["Int32"] == 42
+    assert root.get("Missing") is None and "Scale" in root
+    assert root["Name"] is root["Name"]
+
+def test_inline_array_views():
+    root = granny.GR2File(build_file(sample_section())).root
+    vertices = root["Vertices"]
+    assert len(vertices) == 3
+    array = vertices.array
+    assert np.array_equal(array["Position"], [[0, 0.5, 0], [1, 1.5, -1], [2, 2.5, -2]])
+    assert np.array_equal(array["BoneWeights"][:, :2], [[255, 0], [254, 1], [253, 2]])
+    assert vertices[1]["BoneIndices"].tolist() == [0, 1, 0, 0]
+    assert vertices[-1]["Position"].tolist() == [2.0, 2.5, -2.0]
+    with pytest.raises(IndexError):
+        vertices[3]
+    with pytest.raises(granny.GR2Error):
+        vertices.values
+
+def test_triangle_indices_fall_back_to_16_bit():
+    root = granny.GR2File(build_file(sample_section())).root
+    assert len(root["Indices"]) == 0
+    assert root["Indices16"].values.tolist() == [0, 1, 2, 2, 1, 0]
+    assert granny.triangle_indices(root).tolist() == [0, 1, 2, 2, 1, 0]
+    assert granny.triangle_indices(None).tolist() == []
+
+def test_references_and_transforms():
+    root = granny.GR2File(build_file(sample_section())).root
+    bones = root["Bones"]
+    assert [b["Name"] for b in bones] == ["Bip01", "Bip01 Spine"]
+    assert [b["ParentIndex"] for b in bones] == [-1, 0]
+    transform = bones[1]["LocalTransform"]
+    assert transform["Flags"] == 7
+    assert transform["Position"] == (1.0, 2.0, 4.0)
+    assert transform["Orientation"] == (0.0, 0.0, 0.0, 1.0)
+    assert transform["ScaleShear"] == (1, 0, 0, 0, 1, 0, 0, 0, 1)
+    assert granny.up_axis(root) == "Y"
+
+def test_open_file_and_support(tmp_path):
+    path = tmp_path / "model.gr2"
+    path.write_bytes(build_file(sample_section()))
+    assert granny.is_supported(str(path))
+    with granny.open_file(str(path)) as gr2:
+        assert gr2.root["Name"] == "Model"
+
+def test_compressed_sections(tmp_path):
+    path = tmp_path / "compressed.gr2"
+    path.write_bytes(build_file(sample_section(), compression=2))
+    assert not granny.is_supported(str(path))
+    with granny.open_file(str(path)) as gr2:
+        assert [s.compression_name for s in gr2.compressed_sections()] == ["Oodle1"]
+        with pytest.raises(granny.GR2CompressionError):
+            gr2.root["Name"]
+
+def test_rejects_other_files(tmp_path):
+    with pytest.raises(granny.GR2Error):
+        granny.GR2File(b"\0" * 64)
+    with pytest.raises(granny.GR2Error):
+        granny.GR2File(b"\0" * 8)
+    path = tmp_path / "model.dae"
+    path.write_bytes(b"<COLLADA/>" * 8)
+    assert not granny.is_supported(str(path))
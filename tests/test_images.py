@@ -0,0 +1,93 @@
+import os
+import threading
+
+from io_scene_gr2 import images
+
+class Image():
+    def __init__(self, name, filepath):
+        self.name = name
+        self.filepath = filepath
+
+class RemovedImage():
+    filepath = "/assets/removed.dds"
+
+    @property
+    def name(self):
+        raise ReferenceError("StructRNA of type Image has been removed")
+
+def test_image_index_lookup():
+    index = images.ImageIndex()
+    body = Image("body", "/assets/Body_BM.dds")
+    pool = [body, Image("generated", "")]
+    assert index.find(pool, "/assets/Body_BM.dds") == (body, True)
+    assert index.find(pool, "/assets/sub/../Body_BM.dds") == (body, True)
+    # Same file name in another folder only matches by basename
+    assert index.find(pool, "/other/Body_BM.dds") == (body, False)
+    assert index.find(pool, "/assets/Head_BM.dds") == (None, False)
+
+def test_image_index_follows_the_collection():
+    index = images.ImageIndex()
+    pool = [Image("body", "/assets/Body_BM.dds")]
+    assert index.find(pool, "/assets/Head_BM.dds")[0] is None
+    head = Image("head", "/assets/Head_BM.dds")
+    pool.append(head)
+    assert index.find(pool, "/assets/Head_BM.dds") == (head, True)
+    # Repathed outside of the index
+    head.filepath = "/assets/Hair_BM.dds"
+    assert index.find(pool, "/assets/Head_BM.dds") == (None, False)
+    assert index.find(pool, "/assets/Hair_BM.dds") == (head, True)
+
+def test_image_index_drops_removed_images():
+    index = images.ImageIndex()
+    removed = RemovedImage()
+    index.loaded([removed], removed)
+    replacement = Image("removed", "/assets/removed.dds")
+    assert index.find([replacement], "/assets/removed.dds") == (replacement, True)
+
+def test_image_index_relink_and_loaded():
+    index = images.ImageIndex(abspath=lambda path: path.replace("//", "/blend/"))
+    pool = []
+    body = Image("body", "//textures/Body_BM.dds")
+    pool.append(body)
+    index.loaded(pool, body)
+    assert index.find(pool, "/blend/textures/Body_BM.dds") == (body, True)
+    index.relink(body, "/assets/Body_BM.dds")
+    assert body.filepath == "/assets/Body_BM.dds"
+    assert index.find(pool, "/assets/Body_BM.dds") == (body, True)
+
+def test_preloader_runs_on_worker_threads(tmp_path):
+    paths = []
+    for name in ("a", "b"):
+        path = tmp_path / (name + ".dds")
+        path.write_bytes(name.encode())
+        paths.append(str(path))
+    threads = set()
+    def loader(filepath):
+        threads.add(threading.get_ident())
+        return images.read_file(filepath)
+    preloader = images.ImagePreloader(2, loader)
+    try:
+        preloader.preload(paths + [str(tmp_path / "missing.dds"), "", None])
+        assert len(preloader.futures) == 2
+        assert preloader.take(os.path.join(str(tmp_path), ".", "a.dds")) == b"a"
+        # A texture is handed out once
+        assert preloader.take(paths[0]) is None
+        assert preloader.take(str(tmp_path / "missing.dds")) is None
+        assert threading.get_ident() not in threads
+        preloader.clear()
+        assert preloader.take(paths[1]) is None
+    finally:
+        preloader.shutdown()
+
+def test_preloader_reports_failures(tmp_path, capsys):
+    path = tmp_path / "broken.dds"
+    path.write_bytes(b"")
+    def loader(filepath):
+        raise ValueError("Not a DDS file")
+    preloader = images.ImagePreloader(1, loader)
+    try:
+        preloader.preload([str(path)])
+        assert preloader.take(str(path)) is None
+        assert "Not a DDS file" in capsys.readouterr().out
+    finally:
+        preloader.shutdown()
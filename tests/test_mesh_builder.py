@@ -0,0 +1,139 @@
+import numpy as np
+
+from io_scene_gr2 import mesh_builder
+
+widths = {"co": 3, "uv": 2}
+
+class Collection():
+    """Records foreach_set calls the way bpy_prop_collection stores them, as flat arrays"""
+
+    def __init__(self):
+        self.count = 0
+        self.values = {}
+
+    def add(self, count):
+        self.count += count
+
+    def __len__(self):
+        return self.count
+
+    def foreach_set(self, name, values):
+        values = np.asarray(values)
+        assert values.ndim == 1
+        assert len(values) == self.count * widths.get(name, 1), name
+        self.values[name] = values.copy()
+
+    def foreach_get(self, name, out):
+        out[:] = self.values.get(name, np.zeros(len(out)))
+
+class UVLayer():
+    def __init__(self, count):
+        self.data = Collection()
+        self.data.add(count)
+
+class UVLayers(list):
+    def __init__(self, mesh_data):
+        self.mesh_data = mesh_data
+
+    def new(self, name):
+        layer = UVLayer(len(self.mesh_data.loops))
+        self.append(layer)
+        return layer
+
+class Mesh():
+    def __init__(self):
+        self.vertices = Collection()
+        self.loops = Collection()
+        self.polygons = Collection()
+        self.uv_layers = UVLayers(self)
+        self.materials = []
+        self.use_auto_smooth = False
+        self.vertex_normals = None
+        self.loop_normals = None
+
+    def update(self, calc_edges=False):
+        pass
+
+    def validate(self, clean_customdata=True):
+        return False
+
+    def normals_split_custom_set_from_vertices(self, normals):
+        self.vertex_normals = np.asarray(normals)
+
+    def normals_split_custom_set(self, normals):
+        self.loop_normals = np.asarray(normals)
+
+positions = np.array([[0, 0, 0], [1, 0, 0], [1, 1, 0], [0, 1, 0]], dtype=np.float32)
+indices = np.array([0, 1, 2, 0, 2, 3])
+
+def test_fill_mesh_buffers():
+    uvs = np.array([[0, 0], [1, 0], [1, 0.25], [0, 0.75]], dtype=np.float32)
+    normals = np.tile([0, 0, 1], (4, 1))
+    mesh_data = mesh_builder.fill_mesh(Mesh(), positions, indices, normals=normals, uvs=uvs, material_indices=[2, 5])
+    assert len(mesh_data.vertices) == 4 and len(mesh_data.loops) == 6 and len(mesh_data.polygons) == 2
+    assert np.array_equal(mesh_data.vertices.values["co"], positions.ravel())
+    assert np.array_equal(mesh_data.loops.values["vertex_index"], indices)
+    assert np.array_equal(mesh_data.polygons.values["loop_start"], [0, 3])
+    assert np.array_equal(mesh_data.polygons.values["loop_total"], [3, 3])
+    assert np.array_equal(mesh_data.polygons.values["material_index"], [2, 5])
+    # Per-vertex UVs are spread to the corners and flipped vertically
+    loop_uvs = mesh_data.uv_layers[0].data.values["uv"].reshape(-1, 2)
+    assert np.allclose(loop_uvs[:, 0], uvs[indices, 0])
+    assert np.allclose(loop_uvs[:, 1], 1.0 - uvs[indices, 1])
+    assert mesh_data.polygons.values["use_smooth"].all()
+    assert mesh_data.use_auto_smooth
+    assert np.array_equal(mesh_data.vertex_normals, normals)
+
+def test_fill_mesh_loop_attributes():
+    loop_uvs = np.arange(12, dtype=np.float32).reshape(6, 2)
+    loop_normals = np.tile([1, 0, 0], (6, 1))
+    # A trailing partial triangle is dropped
+    mesh_data = mesh_builder.fill_mesh(Mesh(), positions, np.r_[indices, 1], flip_uv=False,
+        loop_uvs=loop_uvs, loop_normals=loop_normals)
+    assert len(mesh_data.loops) == 6
+    assert np.array_equal(mesh_data.uv_layers[0].data.values["uv"], loop_uvs.ravel())
+    assert np.array_equal(mesh_data.loop_normals, loop_normals)
+    assert "material_index" not in mesh_data.polygons.values
+
+def test_prepare_influences_limit_and_normalize():
+    groups = np.array([[0, 1, 2, 3, 4], [5, 6, -1, 7, 0]])
+    weights = np.array([[0.1, 0.5, 0.2, 0.05, 0.15], [0.5, 0.5, 0.9, 0.0, 0.0]])
+    vertices, groups, weights = mesh_builder.prepare_influences(*mesh_builder.flatten_influences(groups, weights),
+        max_influences=3)
+    # Vertex 0 keeps its 3 largest, vertex 1 loses the unbound and empty influences
+    assert list(zip(vertices.tolist(), groups.tolist())) == [(0, 1), (0, 2), (0, 4), (1, 5), (1, 6)]
+    assert np.allclose(weights, [0.5 / 0.85, 0.2 / 0.85, 0.15 / 0.85, 0.5, 0.5])
+    assert np.allclose(np.bincount(vertices, weights=weights), 1.0)
+
+def test_prepare_influences_without_normalize():
+    vertices, groups, weights = mesh_builder.prepare_influences([0, 0, 1], [0, 1, 1], [0.25, 0.25, 0.5], normalize=False)
+    assert np.allclose(weights, [0.25, 0.25, 0.5])
+
+def test_weight_groups():
+    runs = mesh_builder.weight_groups([3, 1, 2, 0, 4, 5], [1, 1, 1, 0, 1, 1], [0.5, 0.5, 0.25, 1.0, 0.501, 0.0])
+    # Float weights are kept as they are
+    assert runs == [(0, 1.0, [0]), (1, 0.25, [2]), (1, 0.5, [1, 3]), (1, 0.501, [4])]
+
+def test_weight_groups_steps():
+    runs = mesh_builder.weight_groups([3, 1, 2, 0, 4], [1, 1, 1, 0, 1], [0.5, 0.5, 0.25, 1.0, 0.501], steps=255)
+    assert runs == [(0, 1.0, [0]), (1, 64 / 255, [2]), (1, 128 / 255, [1, 3, 4])]
+
+def test_weight_groups_bounded_per_group():
+    rng = np.random.default_rng(0)
+    groups = rng.integers(0, 4, 10000)
+    levels = rng.integers(0, 256, 10000)
+    runs = mesh_builder.weight_groups(np.arange(10000), groups, levels.astype(np.float32) / 255.0, steps=255)
+    assert len(runs) <= 4 * 255
+    assert sum(len(run[2]) for run in runs) == np.count_nonzero(levels)
+    # Weights that round to zero are not written
+    assert mesh_builder.weight_groups([0, 1], [0, 0], [0.001, 0.0], steps=255) == []
+
+def test_geometry_hash():
+    def build(shift=0.0):
+        mesh_data = mesh_builder.fill_mesh(Mesh(), positions, indices, uvs=positions[:, :2] + shift)
+        mesh_data.polygons.values["material_index"] = np.zeros(2, dtype=np.int32)
+        return mesh_data
+    first, second, moved_uvs = build(), build(), build(0.5)
+    assert mesh_builder.geometry_hash(first, ["Bip01"]) == mesh_builder.geometry_hash(second, ["Bip01"])
+    assert mesh_builder.geometry_hash(first, ["Bip01"]) != mesh_builder.geometry_hash(moved_uvs, ["Bip01"])
+    assert mesh_builder.geometry_hash(first, ["Bip01"]) != mesh_builder.geometry_hash(first, ["Root"])
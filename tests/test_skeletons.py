@@ -0,0 +1,42 @@
+from io_scene_gr2 import skeletons
+
+def make_assets(root, names):
+    for race, gender in names:
+        race_dir = root / "Characters" / race
+        race_dir.mkdir(parents=True, exist_ok=True)
+        (race_dir / "{}_{}_Base.gr2".format(race, gender)).write_bytes(b"")
+
+def test_scan(tmp_path):
+    make_assets(tmp_path, [("Humans", "Male"), ("Humans", "Female"), ("Dwarves", "Male")])
+    (tmp_path / "Characters" / "Lizards").mkdir()
+    catalog = skeletons.SkeletonCatalog(["Humans", "Dwarves", "Lizards"])
+    catalog.refresh(str(tmp_path), background=False)
+    assert [item[0] for item in catalog.items] == ["Humans_Female", "Humans_Male", "Dwarves_Male"]
+    assert catalog.get("Dwarves_Male") == str(tmp_path / "Characters" / "Dwarves" / "Dwarves_Male_Base.gr2")
+    assert catalog.get("Lizards_Male") is None
+
+def test_match(tmp_path):
+    make_assets(tmp_path, [("Humans", "Male"), ("Humans", "Female"), ("Dwarves", "Male")])
+    catalog = skeletons.SkeletonCatalog(["Humans", "Dwarves"])
+    catalog.refresh(str(tmp_path), background=True)
+    catalog.wait()
+    human_male = catalog.get("Humans_Male")
+    assert catalog.match("Humans_Male_Body_Naked_A") == human_male
+    assert catalog.match("Humans_Hero_Male_Head") == human_male
+    assert catalog.match("Dwarves_Hero_Male_Torso") == catalog.get("Dwarves_Male")
+    assert catalog.match("Elves_Male_Body") is None
+    # Earlier catalog entries win when a name carries several
+    assert catalog.match("Dwarves_Male_Humans_Female") == catalog.get("Humans_Female")
+    # Names are matched literally
+    assert catalog.match("Humans.Male") is None
+
+def test_empty_catalog(tmp_path):
+    catalog = skeletons.SkeletonCatalog(["Humans"])
+    catalog.refresh(str(tmp_path / "missing"), background=False)
+    assert catalog.items == []
+    assert catalog.match("Humans_Male") is None
+
+def test_skeleton_hash():
+    bones = [("Root", None), ("Spine", "Root"), ("Head", "Spine")]
+    assert skeletons.skeleton_hash(bones) == skeletons.skeleton_hash(reversed(bones))
+    assert skeletons.skeleton_hash(bones) != skeletons.skeleton_hash([("Root", None), ("Spine", "Root"), ("Head", "Root")])
@@ -0,0 +1,47 @@
+import os
+
+from io_scene_gr2 import texture_index
+
+def touch(directory, *names):
+    for name in names:
+        (directory / name).write_bytes(b"")
+
+def set_mtime(directory, mtime_ns):
+    os.utime(str(directory), ns=(mtime_ns, mtime_ns))
+
+def test_prefix_lookup(tmp_path):
+    touch(tmp_path, "HUM_M_Body_B_BM.dds", "HUM_M_Body_A_BM.dds", "HUM_M_Body_A_NM.dds", "HUM_M_Head_BMA.dds",
+        "HUM_M_Body_A_PM.dds", "HUM_M_Body_A.dds", "notes.txt")
+    index = texture_index.TextureIndex()
+    directory = str(tmp_path)
+    # The first matching name in sorted order wins
+    assert index.find(directory, "HUM_M_Body", "BM") == os.path.join(directory, "HUM_M_Body_A_BM.dds")
+    assert index.find(directory, "HUM_M_Body_B", "BM") == os.path.join(directory, "HUM_M_Body_B_BM.dds")
+    assert index.find(directory, "HUM_M_Body", "NM") == os.path.join(directory, "HUM_M_Body_A_NM.dds")
+    # BMA files are found as BM
+    assert index.find(directory, "HUM_M_Head", "BM") == os.path.join(directory, "HUM_M_Head_BMA.dds")
+    assert index.find(directory, "HUM_M_Head", "BMA") == os.path.join(directory, "HUM_M_Head_BMA.dds")
+    assert index.find(directory, "HUM_M_Body", "MSKskin") is None
+    assert index.find(directory, "HUM_F", "BM") is None
+    assert index.find(str(tmp_path / "missing"), "HUM_M_Body", "BM") is None
+
+def test_directory_is_listed_once(tmp_path):
+    touch(tmp_path, "HUM_M_Body_BM.dds")
+    index = texture_index.TextureIndex()
+    entry = index.entry(str(tmp_path))
+    assert index.find(str(tmp_path), "HUM_M_Body", "BM") is not None
+    assert index.entry(str(tmp_path)) is entry
+    assert entry.matches == {("HUM_M_Body", "BM"): os.path.join(str(tmp_path), "HUM_M_Body_BM.dds")}
+
+def test_mtime_change_relists(tmp_path):
+    set_mtime(tmp_path, 1000000000)
+    index = texture_index.TextureIndex()
+    assert index.find(str(tmp_path), "HUM_M_Body", "BM") is None
+    touch(tmp_path, "HUM_M_Body_BM.dds")
+    # Same mtime, the memoized miss is kept
+    set_mtime(tmp_path, 1000000000)
+    assert index.find(str(tmp_path), "HUM_M_Body", "BM") is None
+    set_mtime(tmp_path, 2000000000)
+    assert index.find(str(tmp_path), "HUM_M_Body", "BM") == os.path.join(str(tmp_path), "HUM_M_Body_BM.dds")
+    index.clear()
+    assert index.directories == {}